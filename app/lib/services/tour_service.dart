@@ -93,7 +93,10 @@ class TourService {
   /// Get detailed information about a specific tour
   Future<TourModel?> getTourDetail(String slug) async {
     try {
-      final response = await _dioClient.dio.get('/tour/detail/$slug/');
+      final response = await _dioClient.dio.get(
+        '/tour/detail/$slug/',
+        queryParameters: {'expand': 'tour_plan,tour_lead'},
+      );
       
       if (response.statusCode == 200) {
         print('📋 Tour detail response: ${response.data}');
@@ -0,0 +1,195 @@
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+
+# Content types worth compressing; everything else passes through.
+COMPRESSIBLE_TYPES = ("application/json",)
+
+ETAG_RE = re.compile(r'((?:W/)?"[^"]*")')
+
+
+def _accepted_encodings(header):
+    """
+    {coding: q} from an Accept-Encoding header.
+    """
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _with_suffix(etag, suffix):
+    # '"abc"' -> '"abc-br"', 'W/"abc"' -> 'W/"abc-br"'
+    return f'{etag[:-1]}-{suffix}"'
+
+
+def _brotli_compressor():
+    return brotli.Compressor(
+        mode=brotli.MODE_TEXT,
+        quality=settings.RESPONSE_COMPRESSION_BROTLI_QUALITY,
+    )
+
+
+def brotli_compress(content):
+    compressor = _brotli_compressor()
+    return compressor.process(content) + compressor.finish()
+
+
+def brotli_compress_sequence(sequence):
+    # Flushed per chunk, like compress_sequence, so nothing is held back.
+    compressor = _brotli_compressor()
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def brotli_compress_async_sequence(sequence):
+    compressor = _brotli_compressor()
+    async for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def gzip_compress_async_sequence(sequence, max_random_bytes):
+    # Django's GZipMiddleware approach: each chunk a complete gzip member.
+    async for item in sequence:
+        yield compress_string(item, max_random_bytes=max_random_bytes)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli or gzip for JSON responses, picked from Accept-Encoding (brotli
+    only when the `brotli` package is installed).
+
+    Responses under RESPONSE_COMPRESSION_MIN_SIZE bytes are sent as is;
+    streaming responses are compressed chunk by chunk. A compressed
+    response's ETag gets the coding as a suffix ("abc" -> "abc-br"), so
+    each encoding is its own strong validator. On the way in, the suffix
+    for the coding this request would get is removed from If-None-Match,
+    so the views' condition() checks still see their own ETags, and any
+    304 repeats the suffix the client sent.
+    """
+
+    # Random gzip filename padding against BREACH, as in GZipMiddleware.
+    max_random_bytes = 100
+
+    def negotiate(self, request):
+        accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        wildcard = accepted.get("*", 0)
+        for coding in ("br", "gzip"):
+            if coding == "br" and brotli is None:
+                continue
+            if accepted.get(coding, wildcard) > 0:
+                return coding
+        return None
+
+    def process_request(self, request):
+        request.response_coding = self.negotiate(request)
+        request.response_coding_matched = self.strip_etag_suffix(
+            request, request.response_coding
+        )
+
+    def process_response(self, request, response):
+        coding = getattr(request, "response_coding", None)
+
+        if response.status_code == 304:
+            # No Content-Type on a 304; the suffix tells that the client's
+            # copy was one of our compressed responses.
+            if getattr(request, "response_coding_matched", False):
+                patch_vary_headers(response, ("Accept-Encoding",))
+                if response.has_header("ETag"):
+                    response.headers["ETag"] = _with_suffix(response["ETag"], coding)
+            return response
+
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if (
+            coding is None
+            or response.status_code != 200
+            or response.has_header("Content-Encoding")
+        ):
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, coding)
+            # The compressed size is unknown until the stream ends.
+            del response.headers["Content-Length"]
+        else:
+            if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+                return response
+            compressed = self.compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        if response.has_header("ETag"):
+            response.headers["ETag"] = _with_suffix(response["ETag"], coding)
+        response.headers["Content-Encoding"] = coding
+        return response
+
+    def compress(self, content, coding):
+        if coding == "br":
+            return brotli_compress(content)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def compress_stream(self, response, coding):
+        content = response.streaming_content
+        if response.is_async:
+            if coding == "br":
+                return brotli_compress_async_sequence(content)
+            return gzip_compress_async_sequence(content, self.max_random_bytes)
+        if coding == "br":
+            return brotli_compress_sequence(content)
+        return compress_sequence(content, max_random_bytes=self.max_random_bytes)
+
+    def strip_etag_suffix(self, request, coding):
+        """
+        Remove this request's coding suffix from If-None-Match; True if any
+        tag carried it.
+        """
+        header = request.META.get("HTTP_IF_NONE_MATCH")
+        if not header or coding is None:
+            return False
+
+        ending = f'-{coding}"'
+        matched = False
+
+        def strip(match):
+            nonlocal matched
+            tag = match.group(1)
+            if tag.endswith(ending):
+                matched = True
+                return tag[:-len(ending)] + '"'
+            return tag
+
+        request.META["HTTP_IF_NONE_MATCH"] = ETAG_RE.sub(strip, header)
+        return matched
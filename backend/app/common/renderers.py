@@ -0,0 +1,45 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed.
+
+    Strings, integers, UUIDs, datetimes, dates and times come out exactly
+    as JSONRenderer writes them, and anything else (Decimal, lazy strings,
+    querysets) goes through DRF's own encoder. Floats differ in two ways:
+    exponents are spelled the shortest way (1e16, not 1e+16; the same
+    value once parsed), and NaN and infinities render as null where the
+    strict JSONRenderer raises. Indented output, ASCII-only output,
+    non-compact separators and values orjson refuses fall back to
+    JSONRenderer, as does a missing orjson.
+    """
+    if orjson is not None:
+        options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same \u2028 / \u2029 escaping as JSONRenderer.
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
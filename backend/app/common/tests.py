@@ -1,3 +1,228 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from app.common import parsers, renderers
+from app.common.middleware import CompressionMiddleware, brotli
+from app.common.parsers import FastJSONParser
+from app.common.renderers import FastJSONRenderer
+from app.tours.models import Division, Stay, Tour, Transport
+
+
+PAYLOAD = {
+    "next": None,
+    "results": [
+        {
+            "id": uuid.UUID("3f1c2b9e-4d0e-4a52-9d1c-1f6e8c0b7a11"),
+            "title": "Sundarbans\u2028Explorer\u2029ঢাকা",
+            "upfront_payment": "499.99",
+            "rating": Decimal("4.50"),
+            "start": datetime.datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            "deadline": timezone.make_aware(datetime.datetime(2026, 1, 1, 12, 0), datetime.timezone(datetime.timedelta(hours=6))),
+            "day": datetime.date(2026, 1, 2),
+            "meeting_time": datetime.time(10, 30),
+            "label": gettext_lazy("Tour"),
+            "counts": {1: 2},
+            "time_left": {"days": 1, "hours": 2, "minutes": 3},
+            "is_booked": False,
+            "ratio": 0.1,
+        },
+    ],
+}
+
+
+@skipIf(renderers.orjson is None, "orjson is not installed")
+class FastJSONRendererTests(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD),
+        )
+
+    def test_indented_output_falls_back(self):
+        media_type = "application/json; indent=4"
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type),
+        )
+
+    def test_float_differences_from_json_renderer(self):
+        data = {"big": 1e16, "small": 1.5e-7, "nan": float("nan"), "inf": float("inf")}
+        self.assertEqual(
+            FastJSONRenderer().render(data),
+            b'{"big":1e16,"small":1.5e-7,"nan":null,"inf":null}',
+        )
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({"nan": float("nan")})
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render({"big": 1e16})),
+            json.loads(JSONRenderer().render({"big": 1e16})),
+        )
+
+    def test_unencodable_values_fall_back(self):
+        data = {"big": 2 ** 70}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_matches_json_parser(self):
+        body = FastJSONRenderer().render(PAYLOAD)
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+        for invalid in (b"{", b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(invalid))
+
+
+def sample_tour(slug="sample-tour"):
+    return Tour.objects.create(
+        title="Sample Tour",
+        slug=slug,
+        division=Division.objects.create(name=f"{slug} div"),
+        transport=Transport.objects.create(name="Bus"),
+        stay=Stay.objects.create(name="H"),
+        duration_days=1, duration_nights=0,
+        total_cost=100, upfront_payment=50,
+        start_datetime=timezone.now() + datetime.timedelta(days=5),
+        booking_deadline=timezone.now() - datetime.timedelta(days=1),
+        meeting_point="P", meeting_time="10:00",
+    )
+
+
+class BenchmarkJSONRendererCommandTests(TestCase):
+    def test_benchmark_command(self):
+        sample_tour()
+        out = io.StringIO()
+        call_command("benchmark_json_renderer", "--repeat", "2", stdout=out)
+        self.assertIn("FastJSONRenderer", out.getvalue())
+        self.assertIn("FastJSONParser", out.getvalue())
+
+
+class FastJSONFallbackTests(SimpleTestCase):
+    def test_missing_orjson_uses_the_stock_classes(self):
+        with mock.patch.object(renderers, "orjson", None), mock.patch.object(parsers, "orjson", None):
+            body = FastJSONRenderer().render(PAYLOAD)
+            self.assertEqual(body, JSONRenderer().render(PAYLOAD))
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": [1, 2]}')), {"a": [1, 2]})
+
+
+@skipIf(brotli is None, "brotli is not installed")
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = json.dumps([{"title": f"Tour {i}", "slug": f"tour-{i}"} for i in range(200)]).encode()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def respond(self, response, accept="gzip, br", **headers):
+        request = self.factory.get("/tour/list/", HTTP_ACCEPT_ENCODING=accept, **headers)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None, etag='"abc"'):
+        response = HttpResponse(body or self.body, content_type="application/json")
+        if etag:
+            response.headers["ETag"] = etag
+        return response
+
+    def test_negotiates_brotli_then_gzip(self):
+        response = self.respond(self.json_response())
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+        self.assertEqual(response["ETag"], '"abc-br"')
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+        response = self.respond(self.json_response(), accept="br;q=0, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response["ETag"], '"abc-gzip"')
+
+        response = self.respond(self.json_response(), accept="identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["ETag"], '"abc"')
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_SIZE=1024)
+    def test_small_and_non_json_responses_are_untouched(self):
+        response = self.respond(self.json_response(b'{"access": "token"}'))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.respond(HttpResponse(self.body, content_type="text/html"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_responses(self):
+        chunks = [self.body[i:i + 1000] for i in range(0, len(self.body), 1000)]
+        for accept, decompress in (("gzip", gzip.decompress), ("br", brotli.decompress)):
+            response = self.respond(
+                StreamingHttpResponse(iter(chunks), content_type="application/json"),
+                accept=accept,
+            )
+            self.assertEqual(response["Content-Encoding"], accept)
+            self.assertFalse(response.has_header("Content-Length"))
+            self.assertEqual(decompress(b"".join(response.streaming_content)), self.body)
+
+    def test_if_none_match_sees_the_views_etag(self):
+        seen = []
+
+        def view(request):
+            seen.append(request.META["HTTP_IF_NONE_MATCH"])
+            response = HttpResponseNotModified()
+            response.headers["ETag"] = '"abc"'
+            return response
+
+        request = self.factory.get(
+            "/tour/list/", HTTP_ACCEPT_ENCODING="br", HTTP_IF_NONE_MATCH='"old-gzip", "abc-br"'
+        )
+        response = CompressionMiddleware(view)(request)
+        self.assertEqual(seen, ['"old-gzip", "abc"'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"abc-br"')
+
+
+class CompressedTourResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tour = sample_tour()
+        self.urls = [
+            reverse('tour-list'),
+            reverse('tour-detail', kwargs={'slug': tour.slug}),
+        ]
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_SIZE=0)
+    def test_compressed_variants_have_their_own_etag(self):
+        for url in self.urls:
+            plain = self.client.get(url)
+            packed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(packed['Content-Encoding'], "gzip")
+            self.assertEqual(gzip.decompress(packed.content), plain.content)
+            self.assertEqual(packed['ETag'], plain['ETag'][:-1] + '-gzip"')
+
+            cached = self.client.get(
+                url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=packed['ETag']
+            )
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached['ETag'], packed['ETag'])
+
+            # A variant's ETag does not validate the other encoding.
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=packed['ETag'])
+            self.assertEqual(response.status_code, 200)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_compression", "--repeat", "2", stdout=out)
+        self.assertIn("gzip", out.getvalue())
+        self.assertIn("detail", out.getvalue())
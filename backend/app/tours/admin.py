@@ -1,3 +1,4 @@
+from django import forms
 from django.contrib import admin
 import nested_admin
 
@@ -11,9 +12,91 @@ from .models import (
     TourReview, 
     TourInclusion,
     TourBooking,
+    TourWaitlistEntry,
 )
-
-admin.site.register(TourBooking)
+from .services.booked import BOOKED_STATUSES
+from .services.bulk import bulk_transition
+from .services.reservations import lock_tour_seats, reserve_seats
+
+
+class TourBookingAdminForm(forms.ModelForm):
+    class Meta:
+        model = TourBooking
+        fields = "__all__"
+
+    def clean(self):
+        # The admin saves inside the same transaction, so the seats checked
+        # here stay locked until TourBookingAdmin.save_model takes them.
+        cleaned = super().clean()
+        tour, status = cleaned.get("tour"), cleaned.get("status")
+        if tour is None or status not in BOOKED_STATUSES:
+            return cleaned
+
+        held = 0
+        if self.instance.pk:
+            old = TourBooking.objects.filter(pk=self.instance.pk).values("tour_id", "status", "seats").first()
+            if old and old["tour_id"] == tour.pk and old["status"] in BOOKED_STATUSES:
+                held = old["seats"]
+
+        remaining = lock_tour_seats(tour.pk).seats_remaining
+        if cleaned.get("seats", 0) - held > remaining:
+            raise forms.ValidationError(
+                f"Only {max(remaining + held, 0)} seat(s) left on this tour."
+            )
+        return cleaned
+
+
+@admin.register(TourBooking)
+class TourBookingAdmin(admin.ModelAdmin):
+    form = TourBookingAdminForm
+    list_display = ("booking_reference", "tour", "user", "seats", "status")
+    list_filter = ("status",)
+    search_fields = ("booking_reference", "user__email")
+    actions = ("approve_bookings", "cancel_bookings", "refund_bookings")
+
+    def _bulk_transition(self, request, queryset, status, verb):
+        moved = bulk_transition(queryset, status)
+        skipped = queryset.count() - moved
+        message = f"{moved} booking(s) {verb}."
+        if skipped:
+            message += f" {skipped} skipped: not in a status that allows it."
+        self.message_user(request, message)
+
+    @admin.action(description="Approve selected pending bookings as paid")
+    def approve_bookings(self, request, queryset):
+        self._bulk_transition(request, queryset, "paid", "approved")
+
+    @admin.action(description="Cancel selected bookings")
+    def cancel_bookings(self, request, queryset):
+        self._bulk_transition(request, queryset, "cancelled", "cancelled")
+
+    @admin.action(description="Mark selected paid bookings as refunded")
+    def refund_bookings(self, request, queryset):
+        self._bulk_transition(request, queryset, "refunded", "refunded")
+
+    def save_model(self, request, obj, form, change):
+        # Seat-holding statuses only through the reservation service.
+        status = obj.status
+        if status not in BOOKED_STATUSES:
+            return super().save_model(request, obj, form, change)
+
+        if not change:
+            obj.status = "draft"
+            obj.save()
+            obj.status = status
+        changes = {
+            field: getattr(obj, field)
+            for field in form.changed_data
+            if field != "status"
+        }
+        reserve_seats(obj, status, **changes)
+
+
+@admin.register(TourWaitlistEntry)
+class TourWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ("tour", "user", "seats", "status", "joined_at", "offer_expires_at")
+    list_filter = ("status",)
+    search_fields = ("user__email", "tour__title")
 
 
 @admin.register(Division)
@@ -98,7 +181,7 @@ class TourAdmin(nested_admin.NestedModelAdmin):
             "fields": ("total_cost", "upfront_payment")
         }),
         ("Capacity", {
-            "fields": ("min_group_size", "max_capacity")
+            "fields": ("min_group_size", "max_capacity", "flash_sale", "waiting_room")
         }),
         ("Meeting Details", {
             "fields": ("meeting_point", "meeting_time", "tour_lead")
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ToursConfig(AppConfig):
     name = 'app.tours'
+
+    def ready(self):
+        import app.tours.signals
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+
+from app.common.middleware import CompressionMiddleware, brotli
+from app.tours.models import Tour
+from app.tours.views import TourDetailView, TourListView, TourLocationsView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compression ratio and CPU time per response for the tour endpoints, "
+        "for each coding CompressionMiddleware can pick."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Timed runs per coding; the best run is reported.",
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        tour = Tour.objects.filter(is_active=True).order_by("-created_at").first()
+
+        endpoints = [
+            ("list", TourListView, reverse("tour-list"), {}),
+            ("list, 100 per page", TourListView, reverse("tour-list") + "?page_size=100", {}),
+            ("locations", TourLocationsView, reverse("tour-locations"), {}),
+        ]
+        if tour is not None:
+            endpoints.append((
+                "detail",
+                TourDetailView,
+                reverse("tour-detail", kwargs={"slug": tour.slug}),
+                {"slug": tour.slug},
+            ))
+
+        codings = ["gzip"] + (["br"] if brotli is not None else [])
+        middleware = CompressionMiddleware(lambda request: None)
+
+        self.stdout.write(f"best of {options['repeat']} runs")
+        for label, view, url, kwargs in endpoints:
+            response = view.as_view()(factory.get(url), **kwargs)
+            body = response.render().content
+            self.stdout.write(f"{label} ({url}): {len(body):,} bytes")
+
+            for coding in codings:
+                compressed = middleware.compress(body, coding)
+                best = min(
+                    self._time(middleware.compress, body, coding)
+                    for _ in range(options["repeat"])
+                )
+                self.stdout.write(
+                    f"  {coding:<5} {len(compressed):>9,} bytes"
+                    f"  ratio {len(body) / len(compressed):>5.1f}x"
+                    f"  {best * 1000:>7.3f} ms"
+                )
+
+    @staticmethod
+    def _time(compress, body, coding):
+        start = time.perf_counter()
+        compress(body, coding)
+        return time.perf_counter() - start
@@ -0,0 +1,79 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from app.common.parsers import FastJSONParser
+from app.common.renderers import FastJSONRenderer, orjson
+from app.tours.models import Tour
+from app.tours.services.listing import TOUR_LIST_VALUES, serialize_tour_rows
+from app.tours.services.reference import reference_data
+from app.tours.services.stats import stats_annotations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer/JSONParser with the orjson-backed classes "
+        "on a tour list payload."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            help="Tours in the payload (newest first).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Timed runs per class; the best run is reported.",
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                "orjson is not installed; the fast classes fall back to DRF's."
+            ))
+
+        reference_data()
+        rows = list(
+            Tour.objects
+            .filter(is_active=True)
+            .annotate(**stats_annotations())
+            .order_by("-created_at", "-id")
+            .values(*TOUR_LIST_VALUES)[:options["page_size"]]
+        )
+        if not rows:
+            self.stdout.write(self.style.WARNING("No active tours to render."))
+            return
+
+        payload = {"next": None, "results": serialize_tour_rows(rows, {})}
+        body = JSONRenderer().render(payload)
+
+        runs = [
+            ("JSONRenderer", lambda: JSONRenderer().render(payload)),
+            ("FastJSONRenderer", lambda: FastJSONRenderer().render(payload)),
+            ("JSONParser", lambda: JSONParser().parse(io.BytesIO(body))),
+            ("FastJSONParser", lambda: FastJSONParser().parse(io.BytesIO(body))),
+        ]
+
+        self.stdout.write(
+            f"{len(rows)} tours, {len(body):,} bytes, best of {options['repeat']} runs"
+        )
+        for label, run in runs:
+            best = min(self._time(run) for _ in range(options["repeat"]))
+            self.stdout.write(
+                f"  {label:<18} {best * 1000:>8.3f} ms"
+                f"  {len(body) / best / 1_000_000:>8.1f} MB/s"
+            )
+
+    @staticmethod
+    def _time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
@@ -0,0 +1,77 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.tours.services import similar
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the similar-tours encoding and top-N cosine search on synthetic "
+        "tours (no database access)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tours",
+            type=int,
+            default=10_000,
+            help="Synthetic tours to encode.",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=settings.TOUR_SIMILAR_COUNT,
+            help="Neighbours per tour.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Timed runs; the best run is reported.",
+        )
+
+    def handle(self, *args, **options):
+        if similar.np is None:
+            raise CommandError("NumPy is not installed.")
+
+        rng = random.Random(0)
+        divisions = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(8)]
+        districts = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(64)]
+        transports = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(5)]
+        stays = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(12)]
+        rows = [
+            (
+                uuid.uuid4(),
+                rng.choice(divisions),
+                rng.choice(districts + [None]),
+                rng.choice(transports),
+                rng.choice(stays),
+                rng.randint(1, 10),
+                Decimal(rng.randint(2_000, 200_000)),
+                rng.randint(1, 12),
+            )
+            for _ in range(options["tours"])
+        ]
+
+        timings = {"encode": [], "neighbours": []}
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            _, matrix = similar.encode_tours(rows)
+            encoded = time.perf_counter()
+            similar.nearest_neighbours(matrix, options["count"])
+            timings["encode"].append(encoded - start)
+            timings["neighbours"].append(time.perf_counter() - encoded)
+
+        self.stdout.write(
+            f"{len(rows):,} tours, {matrix.shape[1]} features, "
+            f"top {options['count']}, best of {options['repeat']} runs"
+        )
+        for label, runs in timings.items():
+            self.stdout.write(f"  {label:<12} {min(runs) * 1000:>9.1f} ms")
+        total = min(e + n for e, n in zip(timings["encode"], timings["neighbours"]))
+        self.stdout.write(f"  {'total':<12} {total * 1000:>9.1f} ms")
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from app.tours.models import Tour, TourImage
+from app.tours.serializers import TourListSerializer
+from app.tours.services.listing import TOUR_LIST_VALUES, serialize_tour_rows
+from app.tours.services.reference import reference_data
+from app.tours.services.stats import stats_annotations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare TourListSerializer with the values() fast path on one page of "
+        "active tours, in rows per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            help="Tours per page (newest first).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Timed runs per path; the best run is reported.",
+        )
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        context = {"gallery_preview_size": TourListSerializer.gallery_preview_size}
+        qs = (
+            Tour.objects
+            .filter(is_active=True)
+            .annotate(**stats_annotations())
+            .order_by("-created_at", "-id")
+        )
+        preview = Prefetch(
+            "images",
+            queryset=TourImage.objects.all()[:context["gallery_preview_size"]],
+            to_attr="gallery_preview",
+        )
+
+        def fetch_instances():
+            return list(qs.prefetch_related(preview)[:page_size])
+
+        def fetch_rows():
+            return list(qs.values(*TOUR_LIST_VALUES)[:page_size])
+
+        def serializer(tours):
+            return TourListSerializer(tours, many=True, context=context).data
+
+        def fast(rows):
+            return serialize_tour_rows(rows, context)
+
+        reference_data()  # a warm process
+        rows = len(fetch_rows())
+        if not rows:
+            self.stdout.write(self.style.WARNING("No active tours to serialize."))
+            return
+
+        instances, values = fetch_instances(), fetch_rows()
+        results = [
+            ("serializer, end to end", lambda: serializer(fetch_instances())),
+            ("fast path, end to end", lambda: fast(fetch_rows())),
+            ("serializer, serialize only", lambda: serializer(instances)),
+            ("fast path, serialize only", lambda: fast(values)),
+        ]
+
+        self.stdout.write(f"{rows} tours, best of {options['repeat']} runs")
+        for label, run in results:
+            best = min(self._time(run) for _ in range(options["repeat"]))
+            self.stdout.write(f"  {label:<28} {rows / best:>12,.0f} rows/s")
+
+    @staticmethod
+    def _time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
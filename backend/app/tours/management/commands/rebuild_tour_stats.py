@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.tours.services.stats import rebuild_all_tour_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the TourStats counters for every tour from bookings, waitlist offers and reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of stats rows written per bulk query.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_all_tour_stats(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} tours."))
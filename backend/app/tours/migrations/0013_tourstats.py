@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-17 20:18
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_tour_stats(apps, schema_editor):
+    Tour = apps.get_model("tours", "Tour")
+    TourBooking = apps.get_model("tours", "TourBooking")
+    TourReview = apps.get_model("tours", "TourReview")
+    TourStats = apps.get_model("tours", "TourStats")
+
+    counters = {
+        tour_id: {"confirmed_seats": 0, "pending_seats": 0, "review_count": 0, "rating_sum": 0}
+        for tour_id in Tour.objects.values_list("pk", flat=True)
+    }
+    bookings = TourBooking.objects.values("tour_id").annotate(
+        confirmed_seats=Sum("seats", filter=Q(status="paid")),
+        pending_seats=Sum("seats", filter=Q(status="pending")),
+    )
+    for row in bookings:
+        counters[row["tour_id"]]["confirmed_seats"] = row["confirmed_seats"] or 0
+        counters[row["tour_id"]]["pending_seats"] = row["pending_seats"] or 0
+
+    reviews = TourReview.objects.values("tour_id").annotate(
+        review_count=Count("id"),
+        rating_sum=Sum("rating"),
+    )
+    for row in reviews:
+        counters[row["tour_id"]]["review_count"] = row["review_count"]
+        counters[row["tour_id"]]["rating_sum"] = row["rating_sum"] or 0
+
+    TourStats.objects.bulk_create(
+        [TourStats(tour_id=tour_id, **values) for tour_id, values in counters.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0012_tourimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('confirmed_seats', models.IntegerField(default=0)),
+                ('pending_seats', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('tour', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='tours.tour')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_tour_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-17 20:20
+
+from django.db import migrations, models
+
+
+def backfill_sort_keys(apps, schema_editor):
+    TourStats = apps.get_model("tours", "TourStats")
+
+    rows = list(TourStats.objects.select_related("tour"))
+    for stats in rows:
+        stats.seats_remaining = (
+            stats.tour.max_capacity - stats.confirmed_seats - stats.pending_seats
+        )
+        stats.rating_avg = (
+            stats.rating_sum / stats.review_count if stats.review_count else 0.0
+        )
+    TourStats.objects.bulk_update(rows, ["seats_remaining", "rating_avg"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guides', '0001_initial'),
+        ('tours', '0013_tourstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tourstats',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tourstats',
+            name='seats_remaining',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='tour_active_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', 'start_datetime', 'id'], name='tour_active_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', 'upfront_payment', 'id'], name='tour_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourstats',
+            index=models.Index(fields=['seats_remaining', 'tour'], name='tourstats_seats_left_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourstats',
+            index=models.Index(fields=['-rating_avg', '-tour'], name='tourstats_rating_idx'),
+        ),
+    ]
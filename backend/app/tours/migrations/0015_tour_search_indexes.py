@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guides', '0001_initial'),
+        ('tours', '0014_tourstats_sort_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['division', 'start_datetime'], name='tour_active_division_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['district', 'start_datetime'], name='tour_active_district_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['upazila', 'start_datetime'], name='tour_active_upazila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['transport', 'stay', 'duration_days'], name='tour_active_logistics_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['duration_days', 'upfront_payment'], name='tour_active_duration_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-17 20:27
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+
+def backfill_search_documents(apps, schema_editor):
+    Tour = apps.get_model("tours", "Tour")
+    TourDay = apps.get_model("tours", "TourDay")
+    TourDayActivity = apps.get_model("tours", "TourDayActivity")
+
+    itinerary = {}
+    for tour_id, title, subtitle in TourDay.objects.values_list("tour_id", "title", "subtitle"):
+        itinerary.setdefault(tour_id, []).extend([title, subtitle])
+    for tour_id, title in TourDayActivity.objects.values_list("day__tour_id", "title"):
+        itinerary.setdefault(tour_id, []).append(title)
+
+    tours = Tour.objects.values_list(
+        "pk", "title", "meeting_point", "division__name", "district__name", "upazila__name"
+    )
+    for pk, title, meeting_point, division, district, upazila in tours:
+        texts = {
+            "A": [title],
+            "B": [division, district, upazila, meeting_point],
+            "C": itinerary.get(pk, []),
+        }
+        document = None
+        for weight, parts in texts.items():
+            text = " ".join(part for part in parts if part)
+            vector = SearchVector(Value(text), weight=weight, config="english")
+            document = vector if document is None else document + vector
+        Tour.objects.filter(pk=pk).update(search_document=document)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guides', '0001_initial'),
+        ('tours', '0015_tour_search_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='tour',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tour',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='tour_search_document_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='tour_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
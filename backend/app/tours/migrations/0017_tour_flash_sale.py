@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0016_tour_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='flash_sale',
+            field=models.BooleanField(default=False, help_text='Confirms take seats from a Redis counter (high-demand launches)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0017_tour_flash_sale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='waiting_room',
+            field=models.BooleanField(default=False, help_text='Admit users to join and confirm through a queue (high-demand launches)'),
+        ),
+    ]
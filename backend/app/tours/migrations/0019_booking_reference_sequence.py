@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0018_tour_waiting_room'),
+    ]
+
+    operations = [
+        # Blocks of booking reference counters (app.tours.services.references);
+        # the increment is references.BLOCK_SIZE.
+        migrations.RunSQL(
+            "CREATE SEQUENCE tours_booking_reference_seq "
+            "INCREMENT BY 100 MINVALUE 0 START WITH 0",
+            reverse_sql="DROP SEQUENCE tours_booking_reference_seq",
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-17 21:04
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0020_tourbooking_status_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tourstats',
+            name='held_seats',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TourWaitlistEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seats', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('accepted', 'Accepted'), ('expired', 'Offer Expired'), ('left', 'Left')], default='waiting', max_length=20)),
+                ('joined_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('offer_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='tours.tour')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tour_waitlist', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tour', 'status', 'joined_at'], name='waitlist_fifo_idx'), models.Index(fields=['status', 'offer_expires_at'], name='waitlist_offer_expiry_idx')],
+                'unique_together': {('tour', 'user')},
+            },
+        ),
+    ]
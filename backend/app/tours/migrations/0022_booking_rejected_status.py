@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0021_tourwaitlistentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tourbooking',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('pending', 'Pending Approval'), ('paid', 'Paid'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded'), ('rejected', 'Rejected')], default='draft', max_length=20),
+        ),
+    ]
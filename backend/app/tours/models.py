@@ -1,6 +1,9 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.utils import timezone
 
 from cloudinary.models import CloudinaryField
 
@@ -10,7 +13,6 @@ from app.common.models import BaseModel
 from app.tours.location.models import *
 from app.tours.feedback.models import *
 
-import uuid
 
 User = get_user_model()
 
@@ -62,6 +64,14 @@ class Tour(BaseModel):
     # Capacity
     min_group_size = models.IntegerField(default=12)
     max_capacity = models.IntegerField(default=16)
+    flash_sale = models.BooleanField(
+        default=False,
+        help_text="Confirms take seats from a Redis counter (high-demand launches)"
+    )
+    waiting_room = models.BooleanField(
+        default=False,
+        help_text="Admit users to join and confirm through a queue (high-demand launches)"
+    )
 
     start_datetime = models.DateTimeField(
         help_text="When the tour starts"
@@ -82,9 +92,49 @@ class Tour(BaseModel):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Weighted full-text document (title, locations, meeting point,
+    # itinerary). Maintained by app.tours.services.search, never built
+    # at query time.
+    search_document = SearchVectorField(null=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination sort orders (see app.tours.pagination).
+            models.Index(fields=["is_active", "-created_at", "-id"], name="tour_active_newest_idx"),
+            models.Index(fields=["is_active", "start_datetime", "id"], name="tour_active_start_idx"),
+            models.Index(fields=["is_active", "upfront_payment", "id"], name="tour_active_price_idx"),
+            # Search filters (see app.tours.services.search); partial on is_active.
+            models.Index(
+                fields=["division", "start_datetime"],
+                condition=models.Q(is_active=True),
+                name="tour_active_division_idx",
+            ),
+            models.Index(
+                fields=["district", "start_datetime"],
+                condition=models.Q(is_active=True),
+                name="tour_active_district_idx",
+            ),
+            models.Index(
+                fields=["upazila", "start_datetime"],
+                condition=models.Q(is_active=True),
+                name="tour_active_upazila_idx",
+            ),
+            models.Index(
+                fields=["transport", "stay", "duration_days"],
+                condition=models.Q(is_active=True),
+                name="tour_active_logistics_idx",
+            ),
+            models.Index(
+                fields=["duration_days", "upfront_payment"],
+                condition=models.Q(is_active=True),
+                name="tour_active_duration_idx",
+            ),
+            GinIndex(fields=["search_document"], name="tour_search_document_idx"),
+            # Typo-tolerant fallback for text search (pg_trgm).
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="tour_title_trgm_idx"),
+        ]
     
     def __str__(self):
         return self.title
@@ -214,6 +264,8 @@ class TourBooking(BaseModel):
         ("paid", "Paid"),
         ("cancelled", "Cancelled"),
         ("refunded", "Refunded"),
+        # A flash-sale confirm that lost its seats when it was written.
+        ("rejected", "Rejected"),
     )
 
     tour = models.ForeignKey(
@@ -248,16 +300,20 @@ class TourBooking(BaseModel):
 
     class Meta:
         unique_together = ("tour", "user")
+        indexes = [
+            # Stale draft sweep (see app.tours.services.drafts).
+            models.Index(fields=["status", "created_at"], name="booking_status_created_idx"),
+        ]
 
-    def generate_reference(self):
-        prefix = self.tour.get_reference_prefix()
+    def save(self, *args, **kwargs):
+        # Keep the row write and its TourStats update (post_save) in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-        while True:
-            unique_part = str(uuid.uuid4().int)[:6]
-            ref = f"{prefix}-{unique_part}"
+    def generate_reference(self):
+        from app.tours.services.references import allocate_reference
 
-            if not TourBooking.objects.filter(booking_reference=ref).exists():
-                return ref
+        return allocate_reference(self.tour.get_reference_prefix())
 
     def __str__(self):
         return f"{self.booking_reference or 'NO-REF'} | {self.user.email}"
@@ -281,5 +337,95 @@ class TourReview(BaseModel):
     class Meta:
         unique_together = ("tour", "user")
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.rating}⭐ - {self.tour.title}"
+
+
+class TourWaitlistEntry(BaseModel):
+    """
+    A user waiting for seats on a full tour. Served first come, first
+    served by app.tours.services.waitlist; an offer holds its seats
+    (TourStats.held_seats) until it is accepted or times out.
+    """
+    STATUS_CHOICES = (
+        ("waiting", "Waiting"),
+        ("offered", "Offered"),
+        ("accepted", "Accepted"),
+        ("expired", "Offer Expired"),
+        ("left", "Left"),
+    )
+
+    tour = models.ForeignKey(
+        Tour,
+        on_delete=models.CASCADE,
+        related_name="waitlist"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="tour_waitlist"
+    )
+
+    seats = models.PositiveIntegerField(default=1)
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default="waiting"
+    )
+
+    # Place in line; reset when the user joins again.
+    joined_at = models.DateTimeField(default=timezone.now)
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("tour", "user")
+        indexes = [
+            models.Index(fields=["tour", "status", "joined_at"], name="waitlist_fifo_idx"),
+            models.Index(fields=["status", "offer_expires_at"], name="waitlist_offer_expiry_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the row write and its TourStats update (post_save) in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user.email} | {self.tour.title} ({self.status})"
+
+
+class TourStats(BaseModel):
+    """
+    Denormalized per-tour counters, kept in sync by app.tours.signals.
+    Rebuild from scratch with `manage.py rebuild_tour_stats`.
+    """
+    tour = models.OneToOneField(
+        Tour,
+        on_delete=models.CASCADE,
+        related_name="stats"
+    )
+
+    confirmed_seats = models.IntegerField(default=0)
+    pending_seats = models.IntegerField(default=0)
+    # Offered to waitlisted users and not yet taken.
+    held_seats = models.IntegerField(default=0)
+
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    # Derived sort keys for the tour list, maintained with the counters.
+    seats_remaining = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["seats_remaining", "tour"], name="tourstats_seats_left_idx"),
+            models.Index(fields=["-rating_avg", "-tour"], name="tourstats_rating_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.tour.title}"
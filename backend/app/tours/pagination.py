@@ -0,0 +1,184 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TourKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a fixed set of tour sort orders.
+
+    The cursor holds the sort key of the last row on the page, so the next
+    page is an index range scan starting right after it: no OFFSET and no
+    COUNT(*). Every ordering ends in `id` to make the key unique, and each
+    one is backed by an index on Tour or TourStats. The cursor also names
+    its sort, so it is only accepted back with that sort.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    sort_query_param = "sort"
+    default_sort = "newest"
+    invalid_cursor_message = "Invalid cursor"
+
+    sorts = {
+        "newest": ("-created_at", "-id"),
+        "starting_soon": ("start_datetime", "id"),
+        "price_low": ("upfront_payment", "id"),
+        "almost_full": ("stats__seats_remaining", "id"),
+        "top_rated": ("-stats__rating_avg", "-id"),
+    }
+
+    def get_sort(self, request):
+        sort = request.query_params.get(self.sort_query_param)
+        return sort if sort in self.sorts else self.default_sort
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.sort = self.get_sort(request)
+        ordering = self.sorts[self.sort]
+
+        keys = [field.lstrip("-") for field in ordering]
+        queryset = queryset.annotate(
+            **{f"_cursor_{i}": F(key) for i, key in enumerate(keys)}
+        ).order_by(*ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            position = self.cursor_values(queryset.model, ordering, position)
+            queryset = queryset.filter(self.keyset_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        self.next_position = None
+        if self.has_next:
+            last = results[-1]
+            # Model instances, or dicts from a values() queryset.
+            get = last.get if isinstance(last, dict) else last.__dict__.get
+            self.next_position = [get(f"_cursor_{i}") for i in range(len(ordering))]
+        return results
+
+    def cursor_values(self, model, ordering, position):
+        """
+        The cursor's values converted by the fields they sort on; a cursor
+        that does not fit `ordering` is a 404 rather than a database error.
+        """
+        if len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        values = []
+        for key, value in zip(ordering, position):
+            *path, name = key.lstrip("-").split(LOOKUP_SEP)
+            related = model
+            for part in path:
+                related = related._meta.get_field(part).related_model
+            try:
+                value = related._meta.get_field(name).to_python(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def keyset_filter(self, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`:
+
+            a > x OR (a = x AND b > y) ...
+
+        plus a redundant `a >= x` so the planner can seek on the leading
+        index column.
+        """
+        lookups = []
+        for field in ordering:
+            name = field.lstrip("-")
+            lookups.append((name, "lt" if field.startswith("-") else "gt"))
+
+        first_name, first_op = lookups[0]
+        condition = Q(**{f"{first_name}__{first_op}e": position[0]})
+
+        after = Q()
+        for i, (name, op) in enumerate(lookups):
+            equal = {lookups[j][0]: position[j] for j in range(i)}
+            after |= Q(**equal, **{f"{name}__{op}": position[i]})
+
+        return condition & after
+
+    def encode_cursor(self, position):
+        values = []
+        for value in position:
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, (Decimal, UUID)):
+                value = str(value)
+            values.append(value)
+
+        payload = json.dumps(
+            {"sort": self.sort, "position": values}, separators=(",", ":")
+        ).encode()
+        token = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(cursor, dict) or cursor.get("sort") != self.sort:
+            raise NotFound(self.invalid_cursor_message)
+        position = cursor.get("position")
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
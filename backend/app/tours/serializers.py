@@ -2,20 +2,98 @@ from rest_framework import serializers
 
 from django.utils.timezone import now
 from django.utils import timezone
-from django.db.models import Count
 
 from app.guides.models import TourGuide
 
-from .models import Tour, TourImage, TourDayActivity, TourDay, TourInclusion, TourBooking
+from .models import Tour, TourImage, TourDayActivity, TourDay, TourInclusion, TourBooking, TourWaitlistEntry
+from .services.images import image_variants
+from .services.reference import reference_data
+from .services import waitlist
 
 
-class TourListSerializer(serializers.ModelSerializer):
+def _reference(serializer, **ids):
+    """
+    The reference snapshot for this response, fetched once per root
+    serializer (list items share its context).
+    """
+    context = serializer.context
+    snapshot = context.get("reference_data")
+    if snapshot is None or not snapshot.has(**ids):
+        snapshot = context["reference_data"] = reference_data(**ids)
+    return snapshot
+
+
+# Both read TourStats.seats_remaining (the seats_remaining annotation), so
+# seats held for waitlist offers are not shown as free.
+def spots_remaining(seats_remaining):
+    return max(seats_remaining or 0, 0)
+
+
+def progress_percent(max_capacity, seats_remaining):
+    if max_capacity == 0:
+        return 0
+    taken = max_capacity - spots_remaining(seats_remaining)
+    return int((taken / max_capacity) * 100)
+
+
+def time_left(deadline, now):
+    if not deadline:
+        return None
+
+    if timezone.is_naive(deadline):
+        deadline = timezone.make_aware(deadline)
+
+    delta = deadline - now
+
+    if delta.total_seconds() <= 0:
+        return None
+
+    total_seconds = int(delta.total_seconds())
+
+    days = total_seconds // 86400
+    hours = (total_seconds % 86400) // 3600
+    minutes = (total_seconds % 3600) // 60
+
+    return {
+        "days": days,
+        "hours": hours,
+        "minutes": minutes,
+    }
+
+
+def _location_text(serializer, obj):
+    return _reference(
+        serializer,
+        divisions=obj.division_id,
+        districts=obj.district_id,
+        upazilas=obj.upazila_id,
+    ).location_text(obj.division_id, obj.district_id, obj.upazila_id)
+
+
+class SparseFieldsMixin:
+    """
+    Builds only the fields named in context["fields"] (see
+    services.fieldsets); without it, every field but Meta.expandable_fields.
+    """
+
+    def get_field_names(self, declared_fields, info):
+        names = super().get_field_names(declared_fields, info)
+        selected = self.context.get("fields")
+        if selected is None:
+            expandable = getattr(self.Meta, "expandable_fields", ())
+            return [name for name in names if name not in expandable]
+        return [name for name in names if name in selected]
+
+
+class TourListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     duration_text = serializers.ReadOnlyField()
     spots_remaining = serializers.SerializerMethodField()
     featured_image = serializers.SerializerMethodField()
+    featured_image_variants = serializers.SerializerMethodField()
     location_text = serializers.SerializerMethodField()
     time_left = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     joined_count = serializers.IntegerField(read_only=True)
     progress_percent = serializers.SerializerMethodField()
@@ -36,7 +114,9 @@ class TourListSerializer(serializers.ModelSerializer):
             "title",
             "slug",
             "featured_image",
+            "featured_image_variants",
             "images",
+            "image_variants",
             "time_left",
             "location_text",
             "duration_text",
@@ -58,19 +138,38 @@ class TourListSerializer(serializers.ModelSerializer):
         ]
 
     def get_spots_remaining(self, obj):
-        joined = obj.joined_count or 0
-        return max(obj.max_capacity - joined, 0)
+        return spots_remaining(obj.seats_remaining)
+
+    # Cards show a short strip of the gallery; the detail has all of it.
+    gallery_preview_size = 4
 
     def get_featured_image(self, obj):
         if obj.featured_image:
             return obj.featured_image.url
         return None
 
-    def get_images(self, obj):
+    def get_featured_image_variants(self, obj):
+        return image_variants(obj.featured_image, ("card",))
+
+    def _gallery_preview(self, obj):
+        # TourListView prefetches at most this many images per tour.
+        size = self.context.get("gallery_preview_size", self.gallery_preview_size)
+        if size <= 0:
+            return []
         try:
-            return [img.image.url for img in obj.images.all() if img.image]
+            images = getattr(obj, "gallery_preview", None)
+            if images is None:
+                images = obj.images.all()
+            images = [img.image for img in images if img.image]
         except Exception:
             return []
+        return images[:size]
+
+    def get_images(self, obj):
+        return [image.url for image in self._gallery_preview(obj)]
+
+    def get_image_variants(self, obj):
+        return [image_variants(image, ("card",)) for image in self._gallery_preview(obj)]
 
     def get_location_text(self, obj):
         """
@@ -79,53 +178,18 @@ class TourListSerializer(serializers.ModelSerializer):
         - 'Khulna, Bagerhat'
         - 'Khulna, Bagerhat, Mongla'
         """
-        parts = [obj.division.name]
-
-        if obj.district:
-            parts.append(obj.district.name)
-
-        if obj.upazila:
-            parts.append(obj.upazila.name)
-
-        return ", ".join(parts)
+        return _location_text(self, obj)
     
 
     def get_time_left(self, obj):
-        if not obj.booking_deadline:
-            return None
-
-        now_time = timezone.now()
-
-        deadline = obj.booking_deadline
-        if timezone.is_naive(deadline):
-            deadline = timezone.make_aware(deadline)
-
-        delta = deadline - now_time
-
-        if delta.total_seconds() <= 0:
-            return None
-
-        total_seconds = int(delta.total_seconds())
-
-        days = total_seconds // 86400
-        hours = (total_seconds % 86400) // 3600
-        minutes = (total_seconds % 3600) // 60
-
-        return {
-            "days": days,
-            "hours": hours,
-            "minutes": minutes,
-        }
+        return time_left(obj.booking_deadline, timezone.now())
         
 
     def get_progress_percent(self, obj):
-        joined = obj.joined_count or 0
-        if obj.max_capacity == 0:
-            return 0
-        return int((joined / obj.max_capacity) * 100)
+        return progress_percent(obj.max_capacity, obj.seats_remaining)
 
     def get_is_booked(self, obj):
-        return getattr(obj, "is_booked", False)
+        return obj.pk in self.context.get("booked_tour_ids", ())
 
 
 class TourDayActivitySerializer(serializers.ModelSerializer):
@@ -180,10 +244,12 @@ class TourGuideSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
-class TourDetailSerializer(serializers.ModelSerializer):
+class TourDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     duration_text = serializers.ReadOnlyField()
     featured_image = serializers.SerializerMethodField()
+    featured_image_variants = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     location_text = serializers.SerializerMethodField()
     time_left = serializers.SerializerMethodField()
 
@@ -214,6 +280,7 @@ class TourDetailSerializer(serializers.ModelSerializer):
     transport = serializers.SerializerMethodField()
     stay = serializers.SerializerMethodField()
 
+    similar_tours = serializers.SerializerMethodField()
 
     class Meta:
         model = Tour
@@ -222,7 +289,9 @@ class TourDetailSerializer(serializers.ModelSerializer):
             "title",
             "slug",
             "featured_image",
+            "featured_image_variants",
             "images",
+            "image_variants",
 
             # location & timing
             "location_text",
@@ -263,110 +332,150 @@ class TourDetailSerializer(serializers.ModelSerializer):
             "tour_plan",
             "included",
             "not_included",
+            "similar_tours",
 
             # meta
             "is_active",
             "created_at",
             "updated_at",
         ]
+        # Nested blocks sent only with ?expand=.
+        expandable_fields = ("tour_lead", "tour_plan")
 
     def get_featured_image(self, obj):
         return obj.featured_image.url if obj.featured_image else None
 
+    def get_featured_image_variants(self, obj):
+        return image_variants(obj.featured_image, ("card", "hero"))
+
     def get_images(self, obj):
         try:
             return [img.image.url for img in obj.images.all() if img.image]
         except Exception:
             return []
 
+    def get_image_variants(self, obj):
+        try:
+            images = [img.image for img in obj.images.all() if img.image]
+        except Exception:
+            return []
+        return [image_variants(image, ("card", "gallery")) for image in images]
+
     def get_location_text(self, obj):
-        parts = [obj.division.name]
-        if obj.district:
-            parts.append(obj.district.name) 
-        if obj.upazila:
-            parts.append(obj.upazila.name)
-        return ", ".join(parts)
+        return _location_text(self, obj)
 
     def get_spots_remaining(self, obj):
-        joined = obj.joined_count or 0
-        return max(obj.max_capacity - joined, 0)
+        return spots_remaining(obj.seats_remaining)
 
     def get_progress_percent(self, obj):
-        joined = obj.joined_count or 0
-        if obj.max_capacity == 0:
-            return 0
-        return int((joined / obj.max_capacity) * 100)
+        return progress_percent(obj.max_capacity, obj.seats_remaining)
 
     
     def get_time_left(self, obj):
-        if not obj.booking_deadline:
-            return None
-
-        now_time = timezone.now()
-
-        deadline = obj.booking_deadline
-        if timezone.is_naive(deadline):
-            deadline = timezone.make_aware(deadline)
-
-        delta = deadline - now_time
-
-        if delta.total_seconds() <= 0:
-            return None
-
-        total_seconds = int(delta.total_seconds())
-
-        days = total_seconds // 86400
-        hours = (total_seconds % 86400) // 3600
-        minutes = (total_seconds % 3600) // 60
+        return time_left(obj.booking_deadline, timezone.now())
 
-        return {
-            "days": days,
-            "hours": hours,
-            "minutes": minutes,
-        }
 
+    def _inclusions(self, obj, is_included):
+        # Split the prefetched list in Python instead of filtering per call.
+        return TourInclusionSerializer(
+            [item for item in obj.inclusions.all() if item.is_included == is_included],
+            many=True,
+        ).data
 
     def get_included(self, obj):
-        qs = obj.inclusions.filter(is_included=True)
-        return TourInclusionSerializer(qs, many=True).data
+        return self._inclusions(obj, True)
 
     def get_not_included(self, obj):
-        qs = obj.inclusions.filter(is_included=False)
-        return TourInclusionSerializer(qs, many=True).data
+        return self._inclusions(obj, False)
 
     def get_transport(self, obj):
+        reference = _reference(self, transports=obj.transport_id)
         return {
-            "name": obj.transport.name,
+            "name": reference.name("transports", obj.transport_id),
             "rating": obj.transport_rating,
         }
 
     def get_stay(self, obj):
+        reference = _reference(self, stays=obj.stay_id)
         return {
-            "name": obj.stay.name,
+            "name": reference.name("stays", obj.stay_id),
             "rating": obj.stay_rating,
         }
 
     def get_is_booked(self, obj):
-        return getattr(obj, "is_booked", False)
+        return obj.pk in self.context.get("booked_tour_ids", ())
+
+    def get_similar_tours(self, obj):
+        # Precomputed by the build_similar_tours task; services.similar
+        # imports this module.
+        from .services.similar import similar_tours
+        return similar_tours(obj.pk)
 
     def get_tour_lead(self, obj):
-        if not obj.tour_lead:
+        guide = obj.tour_lead
+        if not guide:
             return None
 
-        guide = (
-            obj.tour_lead.__class__.objects
-            .filter(pk=obj.tour_lead.pk)
-            .annotate(
-                tours_completed=Count("tours", distinct=True)
-            )
-            .select_related("user")
-            .first()
-        )
-
+        # Count comes from the main query (TourDetailView); user and profile
+        # are select_related there too.
+        guide.tours_completed = getattr(obj, "tour_lead_tours_completed", None) or 0
         return TourGuideSerializer(guide).data
 
 
 
+class TourLiveSerializer(TourDetailSerializer):
+    """
+    The per-request part of a tour detail payload: counters, time_left, the
+    requesting user's is_booked and the latest similar tours. Merged over
+    the cached payload.
+    """
+
+    class Meta(TourDetailSerializer.Meta):
+        fields = [
+            "time_left",
+            "joined_count",
+            "spots_remaining",
+            "progress_percent",
+            "rating",
+            "rating_count",
+            "is_booked",
+            "similar_tours",
+        ]
+
+
+class TourSearchParamsSerializer(serializers.Serializer):
+    """
+    Query parameters accepted by TourSearchView. Id filters may be repeated
+    (`?division=<id>&division=<id>`) and match any of the given values.
+    """
+    division = serializers.ListField(child=serializers.UUIDField(), required=False)
+    district = serializers.ListField(child=serializers.UUIDField(), required=False)
+    upazila = serializers.ListField(child=serializers.UUIDField(), required=False)
+    transport = serializers.ListField(child=serializers.UUIDField(), required=False)
+    stay = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    start_after = serializers.DateTimeField(required=False)
+    start_before = serializers.DateTimeField(required=False)
+
+    min_days = serializers.IntegerField(min_value=1, required=False)
+    max_days = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        for low, high in (
+            ("min_price", "max_price"),
+            ("start_after", "start_before"),
+            ("min_days", "max_days"),
+        ):
+            if low in attrs and high in attrs and attrs[low] > attrs[high]:
+                raise serializers.ValidationError(
+                    {high: f"Must be greater than or equal to {low}."}
+                )
+        return attrs
+
+
 class JoinTourSerializer(serializers.Serializer):
     full_name = serializers.CharField(required=False)
     mobile_number = serializers.CharField(required=False)
@@ -374,6 +483,22 @@ class JoinTourSerializer(serializers.Serializer):
     emergency_contact_relationship = serializers.CharField(required=False)
 
 
+class WaitlistJoinSerializer(serializers.Serializer):
+    seats = serializers.IntegerField(min_value=1, default=1)
+
+
+class TourWaitlistSerializer(serializers.ModelSerializer):
+    # From the cached position map (services.waitlist), not a COUNT.
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TourWaitlistEntry
+        fields = ["status", "seats", "position", "joined_at", "offer_expires_at"]
+
+    def get_position(self, obj):
+        return waitlist.position(obj)
+
+
 
 class MyTourSerializer(serializers.ModelSerializer):
     tour_title = serializers.CharField(source="tour.title")
@@ -0,0 +1,41 @@
+from app.tours.models import TourBooking
+from app.tours.services.cache import (
+    booked_version,
+    get_cached_booked_tours,
+    set_cached_booked_tours,
+)
+from app.tours.services.stats import CONFIRMED_STATUS, PENDING_STATUS
+
+
+# Bookings that make a tour show as booked for its user.
+BOOKED_STATUSES = (PENDING_STATUS, CONFIRMED_STATUS)
+
+
+def booked_tours(user):
+    """
+    (tour_ids, updated_at) for `user`: the frozenset of tours they hold a
+    pending or paid booking for, and the latest change to any of their
+    bookings (None if they have none).
+
+    Cached per user under a version that is bumped when one of their
+    bookings changes; a miss costs one small query.
+    """
+    if not user.is_authenticated:
+        return frozenset(), None
+
+    # Version first, so rows read after a concurrent bump are never stored
+    # under the older version.
+    version = booked_version(user.pk)
+    booked = get_cached_booked_tours(user.pk, version)
+    if booked is None:
+        rows = list(
+            TourBooking.objects
+            .filter(user=user)
+            .values_list("tour_id", "status", "updated_at")
+        )
+        booked = (
+            frozenset(tour_id for tour_id, status, _ in rows if status in BOOKED_STATUSES),
+            max((updated_at for *_, updated_at in rows), default=None),
+        )
+        set_cached_booked_tours(user.pk, version, booked)
+    return booked
@@ -0,0 +1,92 @@
+"""
+Bulk booking status changes for the admin's approve, cancel and refund
+actions.
+
+bulk_transition() moves every selected booking that may make the move
+with one UPDATE, so the per-row booking signals do not run. What they
+would have done is done once per call instead: each affected tour's
+counters are recomputed once, under the seat locks taken in tour order
+like reserve_seats() takes them, and after commit the users' booked sets
+are invalidated, tours that got seats back are queued for waitlist
+promotion, one task emails every user, and one more tells the team about
+the paid bookings that were cancelled and are due a refund.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.tours.models import TourBooking
+from app.tours.services.cache import invalidate_booked_tours
+from app.tours.services.reservations import lock_tour_seats
+from app.tours.services.stats import CONFIRMED_STATUS, PENDING_STATUS, refresh_tour_stats
+from app.tours.services.waitlist import RELEASED_BOOKING_STATUSES
+from app.tours.tasks import (
+    promote_waitlist,
+    send_booking_refunds_due_email_task,
+    send_booking_status_emails_task,
+)
+
+
+CANCELLED_STATUS = "cancelled"
+REFUNDED_STATUS = "refunded"
+
+# Target status: (statuses a booking may move from, timestamp to stamp).
+TRANSITIONS = {
+    CONFIRMED_STATUS: ((PENDING_STATUS,), "paid_at"),
+    CANCELLED_STATUS: ((PENDING_STATUS, CONFIRMED_STATUS), None),
+    REFUNDED_STATUS: ((CONFIRMED_STATUS, CANCELLED_STATUS), None),
+}
+
+
+def bulk_transition(queryset, status):
+    """
+    Move the bookings in `queryset` to `status`; those that cannot make
+    the move are left alone. Only paid bookings, or cancelled ones that
+    were paid, can be refunded. Returns the number of bookings moved.
+    """
+    from_statuses, stamp = TRANSITIONS[status]
+    allowed = Q(status__in=from_statuses)
+    if status == REFUNDED_STATUS:
+        # A cancelled booking is only refundable if it had been paid.
+        allowed = Q(status=CONFIRMED_STATUS) | Q(status=CANCELLED_STATUS, paid_at__isnull=False)
+    eligible = queryset.filter(allowed)
+
+    with transaction.atomic():
+        tour_ids = sorted(set(eligible.values_list("tour_id", flat=True)), key=str)
+        for tour_id in tour_ids:
+            lock_tour_seats(tour_id)
+
+        rows = list(
+            TourBooking.objects
+            .filter(allowed, pk__in=eligible.values("pk"))
+            .select_for_update()
+            .values_list("pk", "tour_id", "user_id", "status")
+        )
+        if not rows:
+            return 0
+
+        now = timezone.now()
+        changes = {"status": status, "updated_at": now}
+        if stamp:
+            changes[stamp] = now
+        booking_ids = [str(pk) for pk, _, _, _ in rows]
+        TourBooking.objects.filter(pk__in=booking_ids).update(**changes)
+
+        touched = {str(tour_id) for _, tour_id, _, _ in rows}
+        for tour_id in touched:
+            refresh_tour_stats(tour_id)
+
+        user_ids = [user_id for _, _, user_id, _ in rows]
+        transaction.on_commit(lambda: invalidate_booked_tours(*user_ids))
+        if status in RELEASED_BOOKING_STATUSES:
+            for tour_id in touched:
+                transaction.on_commit(lambda tour_id=tour_id: promote_waitlist.delay(tour_id))
+        transaction.on_commit(lambda: send_booking_status_emails_task.delay(booking_ids))
+        if status == CANCELLED_STATUS:
+            # Read before the UPDATE: the bookings that had been paid.
+            refund_ids = [str(pk) for pk, _, _, old in rows if old == CONFIRMED_STATUS]
+            if refund_ids:
+                transaction.on_commit(
+                    lambda: send_booking_refunds_due_email_task.delay(refund_ids)
+                )
+    return len(rows)
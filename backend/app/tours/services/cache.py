@@ -0,0 +1,215 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Bumped when shared reference data (locations, transport, stay, guides)
+# changes; every cached detail payload embeds it in its key.
+CATALOG_VERSION_KEY = "tours:catalog-version"
+# Bumped only when locations, transports or stays change; guards the
+# process-local reference snapshot (services/reference.py).
+REFERENCE_VERSION_KEY = "tours:reference-version"
+# Bumped whenever any tour's content changes; part of the list ETag.
+LIST_VERSION_KEY = "tours:list-version"
+DETAIL_VERSION_KEY = "tours:detail-version:{slug}"
+# One payload per ?fields= / ?expand= selection (services.fieldsets).
+DETAIL_PAYLOAD_KEY = "tours:detail:{slug}:{catalog}:{version}:{fields}"
+# Tour list pages without the per-user is_booked, shared by every user.
+LIST_PAGE_KEY = "tours:list-page:{key}"
+# A user's booked tour ids; bumped when any of their bookings changes.
+BOOKED_VERSION_KEY = "tours:booked-version:{user}"
+BOOKED_TOURS_KEY = "tours:booked:{user}:{version}"
+# Home feed section rankings (services/feed.py), rebuilt on a schedule.
+FEED_KEY = "tours:feed"
+# One list item per tour without its live fields; orphaned by any tour edit.
+TOUR_CARD_KEY = "tours:card:{id}:{catalog}:{list}"
+# A tour's "you may also like" ids (services/similar.py), rebuilt on a schedule.
+SIMILAR_TOURS_KEY = "tours:similar:{id}"
+# A tour's {user id: position} among waiting users; bumped on every change.
+WAITLIST_VERSION_KEY = "tours:waitlist-version:{tour}"
+WAITLIST_POSITIONS_KEY = "tours:waitlist:{tour}:{version}"
+
+
+def _new_version():
+    # Time-based so a lost version key never restarts at a value an old
+    # payload was stored under.
+    return time.time_ns()
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def _versions(*keys):
+    # One cache round trip; missing keys are initialised on the spot.
+    versions = cache.get_many(keys)
+
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+
+    return tuple(versions[key] for key in keys)
+
+
+def catalog_versions():
+    """
+    Current (catalog, list) version pair.
+    """
+    return _versions(CATALOG_VERSION_KEY, LIST_VERSION_KEY)
+
+
+def detail_versions(slug):
+    """
+    Current (catalog, tour) version pair for a slug.
+    """
+    return _versions(CATALOG_VERSION_KEY, DETAIL_VERSION_KEY.format(slug=slug))
+
+
+def reference_version():
+    return _versions(REFERENCE_VERSION_KEY)[0]
+
+
+def _payload_key(slug, versions, fields):
+    catalog, version = versions
+    digest = hashlib.md5(
+        ",".join(sorted(fields)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return DETAIL_PAYLOAD_KEY.format(
+        slug=slug, catalog=catalog, version=version, fields=digest
+    )
+
+
+def get_cached_detail(slug, versions, fields):
+    return cache.get(_payload_key(slug, versions, fields))
+
+
+def set_cached_detail(slug, versions, fields, payload):
+    cache.set(
+        _payload_key(slug, versions, fields),
+        payload,
+        timeout=settings.TOUR_DETAIL_CACHE_TIMEOUT,
+    )
+
+
+def get_cached_list_page(key):
+    return cache.get(LIST_PAGE_KEY.format(key=key))
+
+
+def set_cached_list_page(key, payload):
+    cache.set(
+        LIST_PAGE_KEY.format(key=key),
+        payload,
+        timeout=settings.TOUR_LIST_CACHE_TIMEOUT,
+    )
+
+
+def get_cached_feed():
+    return cache.get(FEED_KEY)
+
+
+def set_cached_feed(feed):
+    cache.set(FEED_KEY, feed, timeout=settings.TOUR_FEED_CACHE_TIMEOUT)
+
+
+def _card_key(tour_id, versions):
+    catalog, list_version = versions
+    return TOUR_CARD_KEY.format(id=tour_id, catalog=catalog, list=list_version)
+
+
+def get_cached_cards(tour_ids, versions):
+    """
+    {tour id: card} for the ids found in the cache, in one round trip.
+    """
+    keys = {_card_key(tour_id, versions): tour_id for tour_id in tour_ids}
+    return {keys[key]: card for key, card in cache.get_many(keys).items()}
+
+
+def set_cached_cards(cards, versions):
+    cache.set_many(
+        {_card_key(tour_id, versions): card for tour_id, card in cards.items()},
+        timeout=settings.TOUR_DETAIL_CACHE_TIMEOUT,
+    )
+
+
+def get_cached_similar(tour_id):
+    return cache.get(SIMILAR_TOURS_KEY.format(id=tour_id))
+
+
+def set_cached_similar(neighbours):
+    cache.set_many(
+        {SIMILAR_TOURS_KEY.format(id=tour_id): ids for tour_id, ids in neighbours.items()},
+        timeout=settings.TOUR_SIMILAR_CACHE_TIMEOUT,
+    )
+
+
+def booked_version(user_id):
+    return _versions(BOOKED_VERSION_KEY.format(user=user_id))[0]
+
+
+def get_cached_booked_tours(user_id, version):
+    return cache.get(BOOKED_TOURS_KEY.format(user=user_id, version=version))
+
+
+def set_cached_booked_tours(user_id, version, booked):
+    cache.set(
+        BOOKED_TOURS_KEY.format(user=user_id, version=version),
+        booked,
+        timeout=settings.TOUR_DETAIL_CACHE_TIMEOUT,
+    )
+
+
+def waitlist_version(tour_id):
+    return _versions(WAITLIST_VERSION_KEY.format(tour=tour_id))[0]
+
+
+def get_cached_waitlist(tour_id, version):
+    return cache.get(WAITLIST_POSITIONS_KEY.format(tour=tour_id, version=version))
+
+
+def set_cached_waitlist(tour_id, version, positions):
+    cache.set(
+        WAITLIST_POSITIONS_KEY.format(tour=tour_id, version=version),
+        positions,
+        timeout=settings.TOUR_DETAIL_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_waitlist(tour_id):
+    _bump(WAITLIST_VERSION_KEY.format(tour=tour_id))
+
+
+def invalidate_booked_tours(*user_ids):
+    for user_id in set(user_ids):
+        _bump(BOOKED_VERSION_KEY.format(user=user_id))
+
+
+def invalidate_tour_detail(*slugs):
+    """
+    Orphan the cached detail payloads of the given tours.
+    """
+    for slug in set(slugs):
+        if slug:
+            _bump(DETAIL_VERSION_KEY.format(slug=slug))
+    _bump(LIST_VERSION_KEY)
+
+
+def invalidate_catalog():
+    """
+    Orphan every cached detail payload at once.
+    """
+    _bump(CATALOG_VERSION_KEY)
+
+
+def invalidate_reference_data():
+    """
+    Reload every process's reference snapshot; location, transport and stay
+    names are also part of the cached detail payloads.
+    """
+    _bump(REFERENCE_VERSION_KEY)
+    _bump(CATALOG_VERSION_KEY)
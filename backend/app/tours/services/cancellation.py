@@ -0,0 +1,56 @@
+"""
+Booking cancellation by the booking's own user.
+
+cancel_booking() moves a pending or paid booking to cancelled under the
+tour's seat lock, taken before the booking row as in reserve_seats(). The
+booking signals release its seats in TourStats, bump the user's booked
+set and queue the waitlist promoter, all in the same transaction. The
+emails and the refund notice are queued after commit, so nothing slow
+runs while the lock is held.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from app.tours.models import TourBooking
+from app.tours.services.reservations import BookingStateConflict, lock_tour_seats
+from app.tours.services.stats import CONFIRMED_STATUS, PENDING_STATUS
+from app.tours.tasks import (
+    send_booking_cancelled_email_task,
+    send_booking_refund_due_email_task,
+)
+
+
+CANCELLED_STATUS = "cancelled"
+CANCELLABLE_STATUSES = (PENDING_STATUS, CONFIRMED_STATUS)
+
+
+class TourAlreadyStarted(Exception):
+    """
+    Bookings cannot be cancelled once their tour has started.
+    """
+
+
+def cancel_booking(booking):
+    """
+    Cancel `booking` and give its seats back. Raises BookingStateConflict
+    when it is not pending or paid, and TourAlreadyStarted when its tour
+    has begun. Returns (booking, refund_due).
+    """
+    if booking.tour.start_datetime <= timezone.now():
+        raise TourAlreadyStarted()
+
+    with transaction.atomic():
+        lock_tour_seats(booking.tour_id)
+        booking = TourBooking.objects.select_for_update().get(pk=booking.pk)
+        if booking.status not in CANCELLABLE_STATUSES:
+            raise BookingStateConflict(booking.status)
+
+        refund_due = booking.status == CONFIRMED_STATUS
+        booking.status = CANCELLED_STATUS
+        booking.save()
+
+        booking_id = str(booking.pk)
+        transaction.on_commit(lambda: send_booking_cancelled_email_task.delay(booking_id, refund_due))
+        if refund_due:
+            transaction.on_commit(lambda: send_booking_refund_due_email_task.delay(booking_id))
+    return booking, refund_due
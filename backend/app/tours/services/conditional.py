@@ -0,0 +1,188 @@
+"""
+Cheap ETag / Last-Modified validators for the tour list and detail views.
+
+Each validator is built from cache version counters plus one small
+aggregate query, so answering 304 Not Modified never runs the serializer.
+Payloads include time_left (minute resolution), so while a booking
+deadline is still ahead the current minute is part of the validator.
+
+The list has an ETag only: tours leaving it (deactivated or deleted) and
+cache version bumps move no timestamp, so a Last-Modified built from
+updated_at would answer 304 to a changed list.
+"""
+import hashlib
+
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from app.tours.models import Tour
+from app.tours.services.booked import booked_tours
+from app.tours.services.cache import catalog_versions, detail_versions
+from app.tours.services.fieldsets import EXPAND_PARAM, FIELDS_PARAM
+from app.tours.services.reference import reference_data
+from app.tours.services.similar import similar_tour_ids
+from app.tours.services.stats import stats_annotations
+
+
+def _minute_start(now):
+    return now.replace(second=0, microsecond=0)
+
+
+def _etag(*parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False)
+    return digest.hexdigest()
+
+
+def _last_modified(*timestamps):
+    return max((ts for ts in timestamps if ts is not None), default=None)
+
+
+def _user_key(request):
+    user = request.user
+    return user.pk if user.is_authenticated else None
+
+
+def _memoize(request, name, compute):
+    validators = request.__dict__.setdefault("_tour_validators", {})
+    if name not in validators:
+        validators[name] = compute()
+    return validators[name]
+
+
+def get_booked_tours(request):
+    """
+    The requesting user's (booked tour ids, bookings updated_at); see
+    services.booked.booked_tours.
+    """
+    return _memoize(request, "booked", lambda: booked_tours(request.user))
+
+
+def _list_state(request):
+    # Everything the list payload depends on except the user: versions, one
+    # aggregate over active tours and, while a deadline is ahead, the minute.
+    def compute():
+        now = timezone.now()
+        tours = Tour.objects.filter(is_active=True).aggregate(
+            count=Count("pk"),
+            updated_at=Max("updated_at"),
+            stats_updated_at=Max("stats__updated_at"),
+            deadline=Max("booking_deadline"),
+        )
+        minute = None
+        if tours["deadline"] and tours["deadline"] > now:
+            minute = _minute_start(now)
+        return catalog_versions(), tours, minute
+
+    return _memoize(request, "list-state", compute)
+
+
+def shared_list_key(request):
+    """
+    Cache key for the user-independent list page at `request`'s URL.
+    """
+    # Absolute URI: the page embeds absolute `next` links.
+    return _etag(request.build_absolute_uri(), *_list_state(request))
+
+
+def tour_list_validator(request):
+    """
+    ETag for the tour list at `request`'s URL.
+    """
+    def compute():
+        tour_ids, bookings_updated_at = get_booked_tours(request)
+        return _etag(
+            shared_list_key(request),
+            _user_key(request),
+            sorted(map(str, tour_ids)),
+            bookings_updated_at,
+        )
+
+    return _memoize(request, "list", compute)
+
+
+def get_live_tour(request, slug):
+    """
+    The detail view's per-request row: counters and deadline, plus the
+    timestamps the validators need. Memoized on the request so the
+    validators and the cached-payload overlay share one query.
+    """
+    def compute():
+        return (
+            Tour.objects
+            .filter(slug=slug, is_active=True)
+            .only("id", "slug", "max_capacity", "booking_deadline", "updated_at")
+            .annotate(
+                **stats_annotations(),
+                stats_updated_at=F("stats__updated_at"),
+            )
+            .first()
+        )
+
+    return _memoize(request, f"live:{slug}", compute)
+
+
+def tour_detail_validators(request, slug):
+    """
+    (etag, last_modified) for one tour's detail; (None, None) if it is not
+    served, so the view can produce the 404 itself.
+    """
+    def compute():
+        tour = get_live_tour(request, slug)
+        if tour is None:
+            return None, None
+
+        now = timezone.now()
+        minute = None
+        if tour.booking_deadline > now:
+            minute = _minute_start(now)
+
+        tour_ids, bookings_updated_at = get_booked_tours(request)
+        etag = _etag(
+            slug,
+            # The ?fields= / ?expand= selection, as sent.
+            request.GET.getlist(FIELDS_PARAM),
+            request.GET.getlist(EXPAND_PARAM),
+            _user_key(request),
+            detail_versions(slug),
+            tour.pk,
+            tour.updated_at,
+            tour.stats_updated_at,
+            bookings_updated_at,
+            tour.pk in tour_ids,
+            # Re-ranked by the build_similar_tours task; neighbours drop
+            # out as soon as they are deactivated.
+            similar_tour_ids(tour.pk),
+            minute,
+        )
+        last_modified = _last_modified(
+            tour.updated_at,
+            tour.stats_updated_at,
+            bookings_updated_at,
+            minute,
+        )
+        return etag, last_modified
+
+    return _memoize(request, f"detail:{slug}", compute)
+
+
+def get_reference_data(request):
+    """
+    The reference snapshot, shared by the locations ETag and the view.
+    """
+    return _memoize(request, "reference", reference_data)
+
+
+def tour_list_etag(request, *args, **kwargs):
+    return tour_list_validator(request)
+
+
+def tour_detail_etag(request, slug, *args, **kwargs):
+    return tour_detail_validators(request, slug)[0]
+
+
+def tour_detail_last_modified(request, slug, *args, **kwargs):
+    return tour_detail_validators(request, slug)[1]
+
+
+def tour_locations_etag(request, *args, **kwargs):
+    return _etag("locations", get_reference_data(request).version)
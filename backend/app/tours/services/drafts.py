@@ -0,0 +1,59 @@
+"""
+Stale draft sweep.
+
+JoinTourView creates a draft booking for everyone who opens the booking
+flow; drafts nobody confirmed within DRAFT_BOOKING_TTL are deleted by the
+expire_stale_drafts task, a batch per transaction, oldest first along
+booking_status_created_idx. Drafts hold no seats, and the deletes go
+through the booking signals like any other, so TourStats and the users'
+booked sets stay consistent; a flash-sale hold on a swept draft is given
+back by the reconciler.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from app.tours.models import TourBooking
+
+
+DRAFT_STATUS = "draft"
+
+
+def expire_stale_drafts(ttl=None, batch_size=None, max_batches=None):
+    """
+    Delete drafts created more than `ttl` seconds ago, `batch_size` rows
+    per transaction and at most `max_batches` batches per call. Drafts
+    locked by a confirm in progress are skipped. Returns the sweep's
+    metrics: rows swept, batches run and drafts still stale after it.
+    """
+    ttl = ttl or settings.DRAFT_BOOKING_TTL
+    batch_size = batch_size or settings.DRAFT_SWEEP_BATCH_SIZE
+    max_batches = max_batches or settings.DRAFT_SWEEP_MAX_BATCHES
+
+    stale = TourBooking.objects.filter(
+        status=DRAFT_STATUS,
+        created_at__lt=timezone.now() - timedelta(seconds=ttl),
+    )
+    swept = batches = 0
+    while batches < max_batches:
+        with transaction.atomic():
+            batch = list(
+                stale.order_by("created_at")
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            deleted, _ = stale.filter(pk__in=batch).delete()
+        swept += deleted
+        batches += 1
+        if len(batch) < batch_size:
+            break
+
+    return {
+        "swept": swept,
+        "batches": batches,
+        "remaining": stale.count(),
+    }
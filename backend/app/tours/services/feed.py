@@ -0,0 +1,166 @@
+"""
+Home feed: several ranked tour sections in one response.
+
+build_feed() ranks each section with one indexed query and caches the id
+lists; the build_tour_feed task runs it on a schedule (CELERY_BEAT_SCHEDULE).
+At request time feed_payload() reads those lists, hydrates the tours from
+the per-tour card cache and overlays counters, time_left and is_booked
+from one row per tour, the way the detail view overlays its live part.
+Nothing is aggregated per request.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from app.tours.models import Tour
+from app.tours.serializers import TourListSerializer
+from app.tours.services.cache import (
+    catalog_versions,
+    get_cached_cards,
+    get_cached_feed,
+    set_cached_cards,
+    set_cached_feed,
+)
+from app.tours.services.fieldsets import stats_annotations_for
+from app.tours.services.listing import list_values, serialize_tour_rows
+
+
+# (key, title) in display order.
+FEED_SECTIONS = (
+    ("starting_soon", "Starting soon"),
+    ("almost_full", "Almost full"),
+    ("top_rated", "Top rated"),
+    ("new", "New"),
+    ("closing_soon", "Booking closes in 48 hours"),
+)
+
+CLOSING_SOON_WINDOW = timedelta(hours=48)
+
+# List fields that change without a tour edit; read fresh per request.
+LIVE_FIELDS = frozenset({
+    "id",
+    "time_left",
+    "joined_count",
+    "spots_remaining",
+    "progress_percent",
+    "rating",
+    "rating_count",
+    "is_booked",
+})
+CARD_FIELDS = frozenset(TourListSerializer.Meta.fields) - LIVE_FIELDS | {"id"}
+
+
+def section_querysets(now):
+    """
+    {section key: ordered queryset}; only tours still open for booking.
+    Each ordering matches a TourKeysetPagination sort or its index.
+    """
+    bookable = Tour.objects.filter(is_active=True, booking_deadline__gt=now)
+    return {
+        "starting_soon": (
+            bookable.filter(start_datetime__gt=now).order_by("start_datetime", "id")
+        ),
+        "almost_full": (
+            bookable.filter(stats__seats_remaining__gt=0)
+            .order_by("stats__seats_remaining", "id")
+        ),
+        "top_rated": (
+            bookable.filter(stats__review_count__gt=0)
+            .order_by("-stats__rating_avg", "-id")
+        ),
+        "new": bookable.order_by("-created_at", "-id"),
+        "closing_soon": (
+            bookable.filter(booking_deadline__lte=now + CLOSING_SOON_WINDOW)
+            .order_by("booking_deadline", "id")
+        ),
+    }
+
+
+def build_feed(size=None):
+    """
+    Rank every section and cache the id lists. Returns the cached feed.
+    """
+    size = size or settings.TOUR_FEED_SECTION_SIZE
+    now = timezone.now()
+    feed = {
+        "built_at": now,
+        "sections": {
+            key: [str(pk) for pk in qs.values_list("pk", flat=True)[:size]]
+            for key, qs in section_querysets(now).items()
+        },
+    }
+    set_cached_feed(feed)
+    return feed
+
+
+def tour_cards(tour_ids):
+    """
+    {tour id: list item without its LIVE_FIELDS}, from the card cache; the
+    misses are built together and cached.
+    """
+    versions = catalog_versions()
+    cards = get_cached_cards(tour_ids, versions)
+
+    missing = [pk for pk in tour_ids if pk not in cards]
+    if missing:
+        rows = (
+            Tour.objects
+            .filter(pk__in=missing)
+            .values(*list_values(CARD_FIELDS))
+        )
+        built = {
+            card["id"]: card
+            for card in serialize_tour_rows(list(rows), {"fields": CARD_FIELDS})
+        }
+        set_cached_cards(built, versions)
+        cards.update(built)
+    return cards
+
+
+def live_cards(tour_ids, booked_tour_ids):
+    """
+    {tour id: LIVE_FIELDS} for the tours still open for booking.
+    """
+    rows = (
+        Tour.objects
+        .filter(pk__in=tour_ids, is_active=True, booking_deadline__gt=timezone.now())
+        .annotate(**stats_annotations_for(LIVE_FIELDS))
+        .values(*list_values(LIVE_FIELDS))
+    )
+    context = {"fields": LIVE_FIELDS, "booked_tour_ids": booked_tour_ids}
+    return {item["id"]: item for item in serialize_tour_rows(list(rows), context)}
+
+
+def feed_payload(booked_tour_ids=()):
+    """
+    The feed response: each section's tours, in rank order, as the tour
+    list renders them. Builds the feed if the task has not run yet.
+    """
+    feed = get_cached_feed() or build_feed()
+    tour_ids = list(dict.fromkeys(
+        pk for ids in feed["sections"].values() for pk in ids
+    ))
+
+    live = live_cards(tour_ids, booked_tour_ids)
+    cards = tour_cards([pk for pk in tour_ids if pk in live])
+    fields = TourListSerializer.Meta.fields
+
+    def hydrate(pk):
+        merged = {**cards[pk], **live[pk]}
+        return {name: merged[name] for name in fields}
+
+    return {
+        "built_at": feed["built_at"],
+        "sections": [
+            {
+                "key": key,
+                "title": title,
+                "results": [
+                    hydrate(pk) for pk in feed["sections"].get(key, ())
+                    if pk in live and pk in cards
+                ],
+            }
+            for key, title in FEED_SECTIONS
+        ],
+    }
@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets for the tour endpoints.
+
+`?fields=title,slug` limits each item to the named fields (`id` is always
+included). `?expand=tour_plan,tour_lead` adds the serializer's opt-in
+blocks (Meta.expandable_fields), which are left out unless asked for;
+naming one in `fields` expands it too. Views read the selection to skip
+the annotations, joins and prefetches that only unrequested fields need.
+"""
+from rest_framework.exceptions import ValidationError
+
+from app.tours.services.stats import stats_annotations
+
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+# stats_annotations() each serializer field reads.
+STATS_FIELDS = {
+    "joined_count": ("joined_count",),
+    "spots_remaining": ("seats_remaining",),
+    "progress_percent": ("seats_remaining",),
+    "rating": ("rating_avg",),
+    "rating_count": ("rating_count",),
+}
+
+
+def _names(request, param):
+    # Comma-separated, and the parameter may be repeated.
+    return [
+        name.strip()
+        for value in request.query_params.getlist(param)
+        for name in value.split(",")
+        if name.strip()
+    ]
+
+
+def default_fields(serializer_class):
+    meta = serializer_class.Meta
+    return frozenset(meta.fields) - frozenset(getattr(meta, "expandable_fields", ()))
+
+
+def field_selection(request, serializer_class):
+    """
+    Frozenset of serializer_class field names to render for `request`.
+    Unknown names are a 400.
+    """
+    meta = serializer_class.Meta
+    expandable = frozenset(getattr(meta, "expandable_fields", ()))
+    fields = _names(request, FIELDS_PARAM)
+    expand = _names(request, EXPAND_PARAM)
+
+    errors = {}
+    unknown = [name for name in fields if name not in meta.fields]
+    if unknown:
+        errors[FIELDS_PARAM] = f"Unknown field(s): {', '.join(unknown)}."
+    unknown = [name for name in expand if name not in expandable]
+    if unknown:
+        errors[EXPAND_PARAM] = f"Cannot expand: {', '.join(unknown)}."
+    if errors:
+        raise ValidationError(errors)
+
+    if fields:
+        selected = frozenset(fields) | {"id"}
+    else:
+        selected = default_fields(serializer_class)
+    return selected | frozenset(expand)
+
+
+def wants(fields, *names):
+    """
+    True if any of `names` is selected.
+    """
+    return not fields.isdisjoint(names)
+
+
+def stats_annotations_for(fields):
+    """
+    The stats_annotations() the selected fields read; empty when none do,
+    so the TourStats join is skipped.
+    """
+    names = {name for field in fields for name in STATS_FIELDS.get(field, ())}
+    if not names:
+        return {}
+    return stats_annotations(*sorted(names))
@@ -0,0 +1,359 @@
+"""
+Flash-sale seat counters, for tour launches that sell out in seconds.
+
+On a tour with flash_sale set, confirms do not queue on the tour's
+TourStats row lock (services.reservations). Instead they take seats
+from a counter in Redis. A Lua script checks the counter, decrements it
+and records a hold for the booking in one server-side step. The
+reconcile_flash_sales task then writes the holds to Postgres through
+reserve_seats(), one short transaction per booking, so the booking turns
+pending a few seconds after the confirm answered.
+
+Counters are rebuilt from Postgres, never trusted over it:
+- a missing counter (first confirm, Redis restart, reset()) is loaded
+  from TourStats.seats_remaining less the holds still waiting;
+- once a tour has no holds, every reconcile run overwrites its counter
+  with TourStats.seats_remaining, which takes in cancellations and
+  capacity edits.
+Holds lost with Redis leave their bookings as drafts, which the user can
+confirm again. A hold Postgres has no seats for (the counter ran ahead of
+it) marks its booking rejected and emails the user, who was already told
+the booking is pending.
+
+LocalSeatStore is the same store in process memory: for tests, and for
+running without Redis (FLASH_SALE_REDIS_URL empty) in a single process.
+"""
+import json
+import threading
+import time
+from itertools import islice
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from app.tours.models import Tour, TourBooking
+from app.tours.services.reservations import (
+    REJECTED_STATUS,
+    BookingStateConflict,
+    SeatsUnavailable,
+    reserve_seats,
+    seats_available,
+)
+from app.tours.services.stats import PENDING_STATUS
+
+
+# reserve() outcomes.
+RESERVED = "reserved"
+DUPLICATE = "duplicate"
+SOLD_OUT = "sold_out"
+NOT_LOADED = "not_loaded"
+
+RECONCILE_LOCK_KEY = "tours:flash:reconcile"
+
+
+# KEYS: counter, holds, pending tours. ARGV: tour id, booking id, seats, hold.
+RESERVE_SCRIPT = """
+local left = redis.call('GET', KEYS[1])
+if redis.call('HEXISTS', KEYS[2], ARGV[2]) == 1 then
+    return {'duplicate', tonumber(left or 0)}
+end
+if not left then
+    return {'not_loaded', 0}
+end
+local seats = tonumber(ARGV[3])
+if seats > tonumber(left) then
+    return {'sold_out', tonumber(left)}
+end
+left = redis.call('DECRBY', KEYS[1], seats)
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[4])
+redis.call('SADD', KEYS[3], ARGV[1])
+return {'reserved', left}
+"""
+
+# KEYS: counter, holds. ARGV: seats_remaining in Postgres.
+LOAD_SCRIPT = """
+local left = redis.call('GET', KEYS[1])
+if left then
+    return tonumber(left)
+end
+left = tonumber(ARGV[1])
+for _, hold in ipairs(redis.call('HVALS', KEYS[2])) do
+    left = left - cjson.decode(hold)['seats']
+end
+redis.call('SET', KEYS[1], left)
+return left
+"""
+
+# KEYS: counter, holds. ARGV: booking id, seats to give back.
+SETTLE_SCRIPT = """
+if redis.call('HDEL', KEYS[2], ARGV[1]) == 1
+        and tonumber(ARGV[2]) > 0
+        and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+# KEYS: counter, holds, pending tours. ARGV: tour id, seats_remaining.
+SYNC_SCRIPT = """
+if redis.call('HLEN', KEYS[2]) > 0 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('SREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+class RedisSeatStore:
+    """
+    Seat counters and holds in Redis; every read-modify-write is one script.
+    """
+
+    pending_key = "flash:pending"
+
+    def __init__(self, client):
+        self.client = client
+        self._reserve = client.register_script(RESERVE_SCRIPT)
+        self._load = client.register_script(LOAD_SCRIPT)
+        self._settle = client.register_script(SETTLE_SCRIPT)
+        self._sync = client.register_script(SYNC_SCRIPT)
+
+    def _keys(self, tour_id):
+        return [f"flash:{tour_id}:seats", f"flash:{tour_id}:holds"]
+
+    def reserve(self, tour_id, booking_id, hold):
+        outcome, left = self._reserve(
+            keys=self._keys(tour_id) + [self.pending_key],
+            args=[str(tour_id), str(booking_id), hold["seats"], json.dumps(hold)],
+        )
+        return outcome.decode(), left
+
+    def load(self, tour_id, seats_remaining):
+        return self._load(keys=self._keys(tour_id), args=[seats_remaining])
+
+    def holds(self, tour_id, limit):
+        _, holds_key = self._keys(tour_id)
+        page = islice(self.client.hscan_iter(holds_key, count=limit), limit)
+        return [(booking_id.decode(), json.loads(hold)) for booking_id, hold in page]
+
+    def settle(self, tour_id, booking_id, seats_returned=0):
+        self._settle(keys=self._keys(tour_id), args=[str(booking_id), seats_returned])
+
+    def sync(self, tour_id, seats_remaining):
+        return bool(self._sync(
+            keys=self._keys(tour_id) + [self.pending_key],
+            args=[str(tour_id), seats_remaining],
+        ))
+
+    def pending_tours(self):
+        return {tour_id.decode() for tour_id in self.client.smembers(self.pending_key)}
+
+    def seats_left(self, tour_id):
+        left = self.client.get(self._keys(tour_id)[0])
+        return None if left is None else int(left)
+
+    def reset(self, tour_id):
+        self.client.delete(self._keys(tour_id)[0])
+
+
+class LocalSeatStore:
+    """
+    RedisSeatStore's behaviour in process memory, one lock for all tours.
+    Only correct while every confirm runs in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seats = {}
+        self._holds = {}
+
+    def reserve(self, tour_id, booking_id, hold):
+        tour_id, booking_id = str(tour_id), str(booking_id)
+        with self._lock:
+            left = self._seats.get(tour_id)
+            if booking_id in self._holds.get(tour_id, {}):
+                return DUPLICATE, left or 0
+            if left is None:
+                return NOT_LOADED, 0
+            if hold["seats"] > left:
+                return SOLD_OUT, left
+            self._seats[tour_id] = left - hold["seats"]
+            self._holds.setdefault(tour_id, {})[booking_id] = dict(hold)
+            return RESERVED, self._seats[tour_id]
+
+    def load(self, tour_id, seats_remaining):
+        tour_id = str(tour_id)
+        with self._lock:
+            if tour_id not in self._seats:
+                held = sum(h["seats"] for h in self._holds.get(tour_id, {}).values())
+                self._seats[tour_id] = seats_remaining - held
+            return self._seats[tour_id]
+
+    def holds(self, tour_id, limit):
+        with self._lock:
+            return list(self._holds.get(str(tour_id), {}).items())[:limit]
+
+    def settle(self, tour_id, booking_id, seats_returned=0):
+        tour_id = str(tour_id)
+        with self._lock:
+            held = self._holds.get(tour_id, {}).pop(str(booking_id), None)
+            if held is not None and seats_returned and tour_id in self._seats:
+                self._seats[tour_id] += seats_returned
+
+    def sync(self, tour_id, seats_remaining):
+        tour_id = str(tour_id)
+        with self._lock:
+            if self._holds.get(tour_id):
+                return False
+            self._holds.pop(tour_id, None)
+            self._seats[tour_id] = seats_remaining
+            return True
+
+    def pending_tours(self):
+        with self._lock:
+            return {tour_id for tour_id, holds in self._holds.items() if holds}
+
+    def seats_left(self, tour_id):
+        with self._lock:
+            return self._seats.get(str(tour_id))
+
+    def reset(self, tour_id):
+        with self._lock:
+            self._seats.pop(str(tour_id), None)
+
+
+_local_store = LocalSeatStore()
+_redis_stores = {}
+
+
+def seat_store():
+    """
+    The store for FLASH_SALE_REDIS_URL; the process-local one when unset.
+    """
+    url = settings.FLASH_SALE_REDIS_URL
+    if not url:
+        return _local_store
+    if url not in _redis_stores:
+        if redis is None:
+            raise ImproperlyConfigured("FLASH_SALE_REDIS_URL needs the redis package.")
+        _redis_stores[url] = RedisSeatStore(redis.Redis.from_url(url))
+    return _redis_stores[url]
+
+
+def hold_seats(booking, reference, confirmed_at):
+    """
+    Take the draft booking's seats from the tour's counter and queue the
+    confirm for the reconciler. Raises SeatsUnavailable when the counter
+    is short and BookingStateConflict when the booking is already held.
+    Returns the seats left on the counter.
+    """
+    store = seat_store()
+    hold = {
+        "seats": booking.seats,
+        "reference": reference,
+        "confirmed_at": confirmed_at.isoformat(),
+    }
+    outcome, left = store.reserve(booking.tour_id, booking.pk, hold)
+    if outcome == NOT_LOADED:
+        store.load(booking.tour_id, seats_available(booking.tour_id))
+        outcome, left = store.reserve(booking.tour_id, booking.pk, hold)
+
+    if outcome == SOLD_OUT:
+        raise SeatsUnavailable(left)
+    if outcome == DUPLICATE:
+        raise BookingStateConflict(PENDING_STATUS)
+    return left
+
+
+def _reject(booking_id):
+    """
+    Mark a draft whose hold found no seats in Postgres as rejected, and
+    tell the user after commit.
+    """
+    from app.tours.tasks import send_booking_rejected_email_task
+
+    with transaction.atomic():
+        booking = (
+            TourBooking.objects.select_for_update()
+            .filter(pk=booking_id, status="draft")
+            .first()
+        )
+        if booking is None:
+            return
+        booking.status = REJECTED_STATUS
+        booking.save()
+        transaction.on_commit(lambda: send_booking_rejected_email_task.delay(str(booking_id)))
+
+
+def reconcile_tour(tour_id, batch_size=None):
+    """
+    Write up to `batch_size` of the tour's holds to Postgres, then re-sync
+    its counter if none are left. Returns the number of holds settled.
+    """
+    store = seat_store()
+    holds = store.holds(tour_id, batch_size or settings.FLASH_SALE_RECONCILE_BATCH_SIZE)
+    for booking_id, hold in holds:
+        # Seats go back to the counter unless Postgres took them, or had
+        # fewer than the counter thought (the next sync corrects that).
+        returned = hold["seats"]
+        booking = TourBooking.objects.filter(pk=booking_id, tour_id=tour_id).first()
+        if booking is not None:
+            confirmed_at = parse_datetime(hold["confirmed_at"])
+            try:
+                reserve_seats(
+                    booking,
+                    PENDING_STATUS,
+                    from_statuses=("draft",),
+                    booking_reference=hold["reference"],
+                    accepted_terms_at=confirmed_at,
+                    confirmed_at=confirmed_at,
+                )
+                returned = 0
+            except SeatsUnavailable:
+                returned = 0
+                _reject(booking_id)
+            except BookingStateConflict:
+                pass
+        store.settle(tour_id, booking_id, returned)
+
+    if not store.holds(tour_id, 1):
+        store.sync(tour_id, seats_available(tour_id))
+    return len(holds)
+
+
+def reconcile_flash_sales():
+    """
+    Drain the holds of every tour that has some, and re-sync the counters
+    of all flash-sale tours. Runs for at most FLASH_SALE_RECONCILE_INTERVAL
+    seconds; a run still going makes the next one a no-op. Returns the
+    number of holds settled.
+    """
+    budget = settings.FLASH_SALE_RECONCILE_INTERVAL
+    if not cache.add(RECONCILE_LOCK_KEY, 1, budget * 2):
+        return 0
+
+    try:
+        deadline = time.monotonic() + budget
+        store = seat_store()
+        flash_tours = {
+            str(pk) for pk in Tour.objects.filter(flash_sale=True).values_list("pk", flat=True)
+        }
+        settled = 0
+        for tour_id in store.pending_tours() | flash_tours:
+            while time.monotonic() < deadline:
+                done = reconcile_tour(tour_id)
+                settled += done
+                if not done:
+                    break
+        return settled
+    finally:
+        cache.delete(RECONCILE_LOCK_KEY)
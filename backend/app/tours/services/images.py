@@ -0,0 +1,99 @@
+"""
+Named, resized Cloudinary delivery URLs for tour images.
+
+Each variant comes with a srcset (1x and 2x widths) so clients can pick
+the smallest file that fills the slot. URLs depend only on the image's
+public id and the variant, so they are built once per process and
+memoized.
+"""
+from functools import lru_cache
+
+from cloudinary import CloudinaryResource
+
+
+# Variant name -> transformation; height None keeps the aspect ratio.
+IMAGE_VARIANTS = {
+    "card": {"width": 480, "height": 360, "crop": "fill"},
+    "gallery": {"width": 1080, "height": None, "crop": "limit"},
+    "hero": {"width": 1600, "height": 900, "crop": "fill"},
+}
+
+# Pixel densities listed in each srcset.
+SRCSET_DENSITIES = (1, 2)
+
+
+def _resize_options(spec, density):
+    options = {
+        "width": spec["width"] * density,
+        "crop": spec["crop"],
+        "quality": "auto",
+        "fetch_format": "auto",
+    }
+    if spec["height"]:
+        options["height"] = spec["height"] * density
+    return options
+
+
+def _resource(public_id, version, format, type, resource_type):
+    return CloudinaryResource(
+        public_id,
+        format=format,
+        version=version,
+        type=type,
+        resource_type=resource_type,
+    )
+
+
+def _key(image):
+    return (
+        image.public_id,
+        image.version,
+        image.format,
+        image.type,
+        image.resource_type,
+    )
+
+
+@lru_cache(maxsize=8192)
+def _url(*key):
+    return _resource(*key).url
+
+
+@lru_cache(maxsize=8192)
+def _variants(public_id, version, format, type, resource_type, names):
+    resource = _resource(public_id, version, format, type, resource_type)
+
+    variants = {}
+    for name in names:
+        spec = IMAGE_VARIANTS[name]
+        urls = [
+            (resource.build_url(**_resize_options(spec, density)), spec["width"] * density)
+            for density in SRCSET_DENSITIES
+        ]
+        variants[name] = {
+            "url": urls[0][0],
+            "width": spec["width"],
+            "height": spec["height"],
+            "srcset": ", ".join(f"{url} {width}w" for url, width in urls),
+        }
+    return variants
+
+
+def image_variants(image, names):
+    """
+    {name: {"url", "width", "height", "srcset"}} for a CloudinaryField
+    value, or None if there is no image. The returned dicts are shared
+    between calls and must not be mutated.
+    """
+    if not image or not getattr(image, "public_id", None):
+        return None
+    return _variants(*_key(image), tuple(names))
+
+
+def image_url(image):
+    """
+    Memoized `image.url` for a CloudinaryField value (None if empty).
+    """
+    if not image or not getattr(image, "public_id", None):
+        return None
+    return _url(*_key(image))
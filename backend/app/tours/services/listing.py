@@ -0,0 +1,195 @@
+"""
+Fast serialization path for the tour list.
+
+TourListView reads its page with values() and builds each item here with
+plain dict construction: locations come from the reference snapshot,
+gallery previews from one windowed query and image URLs from the
+memoized builders in services.images. The output is byte-for-byte what
+TourListSerializer renders for the same rows (see TourFastListTests);
+keep both in step when fields change.
+"""
+from functools import lru_cache
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from app.tours.models import TourImage
+from app.tours.serializers import (
+    TourListSerializer,
+    progress_percent,
+    spots_remaining,
+    time_left,
+)
+from app.tours.services.images import image_url, image_variants
+from app.tours.services.reference import reference_data
+
+
+# Columns read for each list row; annotations come from stats_annotations().
+TOUR_LIST_VALUES = (
+    "id",
+    "title",
+    "slug",
+    "featured_image",
+    "division_id",
+    "district_id",
+    "upazila_id",
+    "duration_days",
+    "duration_nights",
+    "min_group_size",
+    "max_capacity",
+    "upfront_payment",
+    "total_cost",
+    "booking_deadline",
+    "joined_count",
+    "seats_remaining",
+    "rating_avg",
+    "rating_count",
+)
+
+
+# TOUR_LIST_VALUES each TourListSerializer field reads.
+FIELD_VALUES = {
+    "id": ("id",),
+    "title": ("title",),
+    "slug": ("slug",),
+    "featured_image": ("featured_image",),
+    "featured_image_variants": ("featured_image",),
+    "images": (),
+    "image_variants": (),
+    "time_left": ("booking_deadline",),
+    "location_text": ("division_id", "district_id", "upazila_id"),
+    "duration_text": ("duration_days", "duration_nights"),
+    "joined_count": ("joined_count",),
+    "spots_remaining": ("seats_remaining",),
+    "progress_percent": ("max_capacity", "seats_remaining"),
+    "min_group_size": ("min_group_size",),
+    "max_capacity": ("max_capacity",),
+    "upfront_payment": ("upfront_payment",),
+    "total_cost": ("total_cost",),
+    "rating": ("rating_avg",),
+    "rating_count": ("rating_count",),
+    "is_booked": (),
+}
+
+
+def list_values(fields):
+    """
+    The TOUR_LIST_VALUES (in order) that the selected fields read; `id` is
+    always among them.
+    """
+    needed = {"id"}
+    for field in fields:
+        needed.update(FIELD_VALUES[field])
+    return tuple(value for value in TOUR_LIST_VALUES if value in needed)
+
+
+@lru_cache(maxsize=None)
+def _decimal_fields():
+    # The serializer's own DecimalFields, so rounding and string coercion
+    # follow REST_FRAMEWORK settings exactly.
+    fields = TourListSerializer().fields
+    return fields["upfront_payment"], fields["total_cost"], fields["rating"]
+
+
+def gallery_previews(tour_ids, size):
+    """
+    {tour_id: [image, ...]} with at most `size` images per tour, in one
+    query numbering each tour's images with ROW_NUMBER().
+    """
+    previews = {tour_id: [] for tour_id in tour_ids}
+    if size <= 0 or not previews:
+        return previews
+
+    rows = (
+        TourImage.objects
+        .filter(tour_id__in=previews)
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("tour_id"),
+                order_by=TourImage._meta.ordering,
+            )
+        )
+        .filter(position__lte=size)
+        .order_by("tour_id", "position")
+        .values_list("tour_id", "image")
+    )
+    for tour_id, image in rows:
+        previews[tour_id].append(image)
+    return previews
+
+
+def _reference_for(rows):
+    snapshot = reference_data()
+    for row in rows:
+        ids = {
+            "divisions": row["division_id"],
+            "districts": row["district_id"],
+            "upazilas": row["upazila_id"],
+        }
+        if not snapshot.has(**ids):
+            snapshot = reference_data(**ids)
+    return snapshot
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def serialize_tour_rows(rows, context):
+    """
+    TourListSerializer(many=True) output for TOUR_LIST_VALUES rows.
+    `context` is the view's serializer context; with context["fields"],
+    only those fields are built (rows need just list_values(fields)).
+    """
+    fields = context.get("fields")
+    names = [
+        name for name in TourListSerializer.Meta.fields
+        if fields is None or name in fields
+    ]
+    price_field, cost_field, rating_field = _decimal_fields()
+    size = context.get("gallery_preview_size", TourListSerializer.gallery_preview_size)
+    booked = context.get("booked_tour_ids", ())
+    now = timezone.now()
+
+    previews = {}
+    if "images" in names or "image_variants" in names:
+        previews = gallery_previews([row["id"] for row in rows], size)
+        previews = {
+            tour_id: [image for image in images if image][:size]
+            for tour_id, images in previews.items()
+        }
+    reference = _reference_for(rows) if "location_text" in names else None
+
+    def decimal(field, value):
+        return None if value is None else field.to_representation(value)
+
+    builders = {
+        "id": lambda row: str(row["id"]),
+        "title": lambda row: row["title"],
+        "slug": lambda row: row["slug"],
+        "featured_image": lambda row: image_url(row["featured_image"]),
+        "featured_image_variants": lambda row: image_variants(row["featured_image"], ("card",)),
+        "images": lambda row: [image_url(image) for image in previews[row["id"]]],
+        "image_variants": lambda row: [
+            image_variants(image, ("card",)) for image in previews[row["id"]]
+        ],
+        "time_left": lambda row: time_left(row["booking_deadline"], now),
+        "location_text": lambda row: reference.location_text(
+            row["division_id"], row["district_id"], row["upazila_id"]
+        ),
+        "duration_text": lambda row: f"{row['duration_days']} Days, {row['duration_nights']} Nights",
+        "joined_count": lambda row: _int(row["joined_count"]),
+        "spots_remaining": lambda row: spots_remaining(row["seats_remaining"]),
+        "progress_percent": lambda row: progress_percent(row["max_capacity"], row["seats_remaining"]),
+        "min_group_size": lambda row: row["min_group_size"],
+        "max_capacity": lambda row: row["max_capacity"],
+        "upfront_payment": lambda row: decimal(price_field, row["upfront_payment"]),
+        "total_cost": lambda row: decimal(cost_field, row["total_cost"]),
+        "rating": lambda row: decimal(rating_field, row["rating_avg"]),
+        "rating_count": lambda row: _int(row["rating_count"]),
+        "is_booked": lambda row: row["id"] in booked,
+    }
+    build = [(name, builders[name]) for name in names]
+    return [{name: field(row) for name, field in build} for row in rows]
@@ -0,0 +1,129 @@
+"""
+Process-local snapshot of the small reference tables: divisions, districts,
+upazilas, transports and stays.
+
+Serializers resolve names by id from the snapshot instead of joining these
+tables into every tour query. Each process keeps one snapshot and reloads
+it when the shared version in the cache (REFERENCE_VERSION_KEY) moves.
+"""
+import threading
+from functools import cached_property
+
+from app.tours.models import District, Division, Stay, Transport, Upazila
+from app.tours.services.cache import reference_version
+
+
+class ReferenceData:
+    """
+    Rows of every reference table keyed by id, as loaded at `version`.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        # The version is read before the rows, so a snapshot is never older
+        # than the version it is stored under.
+        self.divisions = self._load(Division, "name", "is_active")
+        self.districts = self._load(District, "name", "is_active", "division_id")
+        self.upazilas = self._load(Upazila, "name", "is_active", "district_id")
+        self.transports = self._load(Transport, "name", "icon", "is_active")
+        self.stays = self._load(Stay, "name", "icon", "is_active")
+
+    @staticmethod
+    def _load(model, *fields):
+        return {
+            row["id"]: row
+            for row in model.objects.order_by("name").values("id", *fields)
+        }
+
+    def has(self, **ids):
+        """
+        True if every given id is known, e.g. has(districts=tour.district_id).
+        """
+        return all(
+            value is None or value in getattr(self, table)
+            for table, value in ids.items()
+        )
+
+    def name(self, table, pk):
+        row = getattr(self, table).get(pk)
+        return row["name"] if row else None
+
+    def location_text(self, division_id, district_id=None, upazila_id=None):
+        """
+        'Khulna', 'Khulna, Bagerhat' or 'Khulna, Bagerhat, Mongla'.
+        """
+        parts = [
+            self.name("divisions", division_id),
+            self.name("districts", district_id),
+            self.name("upazilas", upazila_id),
+        ]
+        return ", ".join(part for part in parts if part)
+
+    @cached_property
+    def tree(self):
+        """
+        Active locations as a division > district > upazila hierarchy, plus
+        active transports and stays; built once per snapshot.
+        """
+        upazilas = {}
+        for row in self.upazilas.values():
+            if row["is_active"]:
+                upazilas.setdefault(row["district_id"], []).append(
+                    {"id": row["id"], "name": row["name"]}
+                )
+
+        districts = {}
+        for row in self.districts.values():
+            if row["is_active"]:
+                districts.setdefault(row["division_id"], []).append({
+                    "id": row["id"],
+                    "name": row["name"],
+                    "upazilas": upazilas.get(row["id"], []),
+                })
+
+        return {
+            "divisions": [
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "districts": districts.get(row["id"], []),
+                }
+                for row in self.divisions.values()
+                if row["is_active"]
+            ],
+            "transports": [
+                {"id": row["id"], "name": row["name"], "icon": row["icon"]}
+                for row in self.transports.values()
+                if row["is_active"]
+            ],
+            "stays": [
+                {"id": row["id"], "name": row["name"], "icon": row["icon"]}
+                for row in self.stays.values()
+                if row["is_active"]
+            ],
+        }
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def reference_data(**ids):
+    """
+    The current snapshot: one cache read, and five small queries only when
+    the version has moved. Passing ids (see ReferenceData.has) also reloads
+    a snapshot that predates them, for rows committed moments before their
+    version bump lands.
+    """
+    global _snapshot
+
+    version = reference_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version and snapshot.has(**ids):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != version or not snapshot.has(**ids):
+            snapshot = _snapshot = ReferenceData(version)
+    return snapshot
@@ -0,0 +1,96 @@
+"""
+Booking references ("SUN-48213907"): unique without probing the table,
+and not guessable from one another.
+
+Each process takes blocks of BLOCK_SIZE counter values from a Postgres
+sequence, one nextval() per block, and hands them out under a lock. A
+counter becomes the reference's eight digits through a keyed Feistel
+permutation of [0, 10**8): distinct counters always give distinct
+digits, whatever the prefix, and consecutive bookings give unrelated
+ones to anyone without BOOKING_REFERENCE_KEY.
+"""
+import hashlib
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+
+SEQUENCE = "tours_booking_reference_seq"
+# The sequence's INCREMENT BY (migration 0019); each nextval() is a block.
+BLOCK_SIZE = 100
+
+DIGITS = 8
+HALF = 10 ** (DIGITS // 2)
+ROUNDS = 6
+
+
+@lru_cache(maxsize=1)
+def _round_tables(key):
+    """
+    One random table of HALF values per Feistel round, derived from `key`.
+    """
+    stream = hashlib.shake_256(f"tours.booking-reference:{key}".encode()).digest(
+        ROUNDS * HALF * 4
+    )
+    values = memoryview(stream).cast("I")
+    return [
+        [value % HALF for value in values[i * HALF:(i + 1) * HALF]]
+        for i in range(ROUNDS)
+    ]
+
+
+def scramble(counter):
+    """
+    The counter's place in a keyed permutation of [0, 10**DIGITS).
+    """
+    if not 0 <= counter < HALF * HALF:
+        raise OverflowError("Booking reference space is exhausted.")
+    left, right = divmod(counter, HALF)
+    for table in _round_tables(settings.BOOKING_REFERENCE_KEY):
+        left, right = right, (left + table[right]) % HALF
+    return left * HALF + right
+
+
+def _sequence_block():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s)", [SEQUENCE])
+        return cursor.fetchone()[0]
+
+
+class CounterBlocks:
+    """
+    Counters handed out from blocks of `block_size`; `fetch_block()`
+    returns the first counter of a block nobody else has. A forked child
+    drops the block it inherited, so it cannot hand out its parent's
+    counters.
+    """
+
+    def __init__(self, fetch_block, block_size):
+        self.fetch_block = fetch_block
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def next(self):
+        with self._lock:
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next = self.fetch_block()
+                self._end = self._next + self.block_size
+                self._pid = os.getpid()
+            counter = self._next
+            self._next += 1
+            return counter
+
+
+_counters = CounterBlocks(_sequence_block, BLOCK_SIZE)
+
+
+def allocate_reference(prefix):
+    """
+    A new booking reference under `prefix`.
+    """
+    return f"{prefix}-{scramble(_counters.next()):0{DIGITS}d}"
@@ -0,0 +1,104 @@
+"""
+Seat reservations: the only way a TourBooking enters a seat-holding status.
+
+reserve_seats() locks the tour's TourStats row (SELECT ... FOR UPDATE),
+checks seats_remaining and saves the booking in the same transaction; the
+booking's post_save signal then moves the counters while the lock is
+still held. Concurrent confirms for one tour queue on that row instead of
+overselling it. Every caller takes the stats row before the booking row,
+so two reservations can never wait on each other in opposite order.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from app.tours.models import TourBooking, TourStats
+from app.tours.services.booked import BOOKED_STATUSES
+from app.tours.services.stats import CONFIRMED_STATUS, refresh_tour_stats
+
+
+# A booking whose confirm was accepted but found no seats when written.
+REJECTED_STATUS = "rejected"
+
+
+class SeatsUnavailable(Exception):
+    """
+    The tour cannot take the booking's seats.
+    """
+
+    def __init__(self, seats_remaining):
+        self.seats_remaining = max(seats_remaining, 0)
+        super().__init__(f"Only {self.seats_remaining} seat(s) left.")
+
+
+class BookingStateConflict(Exception):
+    """
+    The booking is no longer in a status the caller may move it from.
+    """
+
+    def __init__(self, status):
+        self.status = status
+        super().__init__(f"Booking is {status}.")
+
+
+def lock_tour_seats(tour_id):
+    """
+    The tour's TourStats row, locked until the surrounding transaction ends.
+    """
+    stats = TourStats.objects.select_for_update().filter(tour_id=tour_id).first()
+    if stats is None:
+        refresh_tour_stats(tour_id)
+        stats = TourStats.objects.select_for_update().get(tour_id=tour_id)
+    return stats
+
+
+def seats_available(tour_id):
+    """
+    Unlocked seats_remaining, for early "tour is full" answers; only
+    reserve_seats() decides. A tour without a stats row yet gets one.
+    """
+    remaining = (
+        TourStats.objects
+        .filter(tour_id=tour_id)
+        .values_list("seats_remaining", flat=True)
+        .first()
+    )
+    if remaining is None:
+        stats = refresh_tour_stats(tour_id)
+        remaining = stats.seats_remaining if stats else 0
+    return remaining
+
+
+def reserve_seats(booking, status, from_statuses=None, **changes):
+    """
+    Move `booking` to `status` (pending or paid), applying `changes` to its
+    fields, if the tour still has room for its seats. A booking moved to
+    paid without a paid_at is stamped with the current time.
+
+    Seats the booking already holds count towards it, so pending -> paid
+    never fails on capacity. Raises SeatsUnavailable when the tour is full
+    and BookingStateConflict when the booking has meanwhile left
+    `from_statuses`. Returns the saved booking, freshly loaded.
+    """
+    if status not in BOOKED_STATUSES:
+        raise ValueError(f"{status!r} does not hold seats.")
+
+    with transaction.atomic():
+        stats = lock_tour_seats(booking.tour_id)
+        # Reloaded under lock: the copy the caller has may predate a
+        # concurrent confirm, and the stats signal diffs against it.
+        booking = TourBooking.objects.select_for_update().get(pk=booking.pk)
+        if from_statuses is not None and booking.status not in from_statuses:
+            raise BookingStateConflict(booking.status)
+
+        held = booking.seats if booking.status in BOOKED_STATUSES else 0
+        seats = changes.get("seats", booking.seats)
+        if seats - held > stats.seats_remaining:
+            raise SeatsUnavailable(stats.seats_remaining + held)
+
+        for field, value in changes.items():
+            setattr(booking, field, value)
+        booking.status = status
+        if status == CONFIRMED_STATUS and booking.paid_at is None:
+            booking.paid_at = timezone.now()
+        booking.save()
+    return booking
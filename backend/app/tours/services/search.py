@@ -0,0 +1,264 @@
+from collections import Counter, defaultdict
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Value
+
+from app.tours.models import Tour, TourDay, TourDayActivity
+
+
+# Text search configuration used for both documents and queries.
+SEARCH_CONFIG = "english"
+
+
+# Facet name -> (grouped id column, label column).
+ID_FACETS = {
+    "division": ("division_id", "division__name"),
+    "district": ("district_id", "district__name"),
+    "upazila": ("upazila_id", "upazila__name"),
+    "transport": ("transport_id", "transport__name"),
+    "stay": ("stay_id", "stay__name"),
+}
+
+
+def _range_filters(params):
+    """
+    Filters that are not facets; always applied in SQL.
+    """
+    filters = {}
+    if "min_price" in params:
+        filters["upfront_payment__gte"] = params["min_price"]
+    if "max_price" in params:
+        filters["upfront_payment__lte"] = params["max_price"]
+    if "start_after" in params:
+        filters["start_datetime__gte"] = params["start_after"]
+    if "start_before" in params:
+        filters["start_datetime__lte"] = params["start_before"]
+    return filters
+
+
+def _facet_filters(params):
+    filters = {}
+    for name, (column, _) in ID_FACETS.items():
+        if params.get(name):
+            filters[f"{column}__in"] = params[name]
+    if "min_days" in params:
+        filters["duration_days__gte"] = params["min_days"]
+    if "max_days" in params:
+        filters["duration_days__lte"] = params["max_days"]
+    return filters
+
+
+def filter_tours(qs, params):
+    """
+    Apply validated TourSearchParamsSerializer data to a Tour queryset.
+    """
+    return qs.filter(**_range_filters(params), **_facet_filters(params))
+
+
+def _facet_predicates(params):
+    predicates = {}
+    for name, (column, _) in ID_FACETS.items():
+        selected = set(params.get(name) or ())
+        if selected:
+            predicates[name] = (
+                lambda row, column=column, selected=selected: row[column] in selected
+            )
+
+    low, high = params.get("min_days"), params.get("max_days")
+    if low is not None or high is not None:
+        predicates["duration_days"] = lambda row: (
+            (low is None or row["duration_days"] >= low)
+            and (high is None or row["duration_days"] <= high)
+        )
+    return predicates
+
+
+def tour_facets(qs, params):
+    """
+    Facet counts for a search, from one grouped query.
+
+    Tours are grouped by every facet column at once; each facet is then
+    rolled up in Python with all *other* facet filters applied, so picking
+    a division still shows the counts for the other divisions.
+    """
+    columns = ["duration_days"]
+    for column, label in ID_FACETS.values():
+        columns += [column, label]
+
+    rows = list(
+        qs.filter(**_range_filters(params))
+        .values(*columns)
+        .annotate(
+            count=Count("pk"),
+            min_price=Min("upfront_payment"),
+            max_price=Max("upfront_payment"),
+        )
+        .order_by()
+    )
+
+    predicates = _facet_predicates(params)
+
+    def matching(excluded):
+        return [
+            row for row in rows
+            if all(test(row) for name, test in predicates.items() if name != excluded)
+        ]
+
+    facets = {}
+    for name, (column, label) in ID_FACETS.items():
+        counts = Counter()
+        labels = {}
+        for row in matching(name):
+            if row[column] is None:
+                continue
+            counts[row[column]] += row["count"]
+            labels[row[column]] = row[label]
+        facets[name] = [
+            {"id": value, "name": labels[value], "count": count}
+            for value, count in sorted(
+                counts.items(), key=lambda item: (-item[1], labels[item[0]])
+            )
+        ]
+
+    durations = Counter()
+    for row in matching("duration_days"):
+        durations[row["duration_days"]] += row["count"]
+    facets["duration_days"] = [
+        {"value": value, "count": count}
+        for value, count in sorted(durations.items())
+    ]
+
+    selected = matching(None)
+    low = min((row["min_price"] for row in selected), default=None)
+    high = max((row["max_price"] for row in selected), default=None)
+    # Decimals as strings, like upfront_payment in the tour payloads.
+    facets["price"] = {
+        "min": format(low, ".2f") if low is not None else None,
+        "max": format(high, ".2f") if high is not None else None,
+    }
+    return facets
+
+
+def _document_texts(tour_ids):
+    """
+    Weighted text for each tour: A = title, B = locations and meeting point,
+    C = itinerary day titles, subtitles and activities.
+    """
+    texts = {}
+    tours = Tour.objects.filter(pk__in=tour_ids).values(
+        "pk",
+        "title",
+        "meeting_point",
+        "division__name",
+        "district__name",
+        "upazila__name",
+    )
+    for tour in tours:
+        texts[tour["pk"]] = {
+            "A": [tour["title"]],
+            "B": [
+                tour["division__name"],
+                tour["district__name"],
+                tour["upazila__name"],
+                tour["meeting_point"],
+            ],
+            "C": [],
+        }
+
+    days = TourDay.objects.filter(tour_id__in=texts).values_list(
+        "tour_id", "title", "subtitle"
+    )
+    for tour_id, title, subtitle in days:
+        texts[tour_id]["C"] += [title, subtitle]
+
+    activities = TourDayActivity.objects.filter(day__tour_id__in=texts).values_list(
+        "day__tour_id", "title"
+    )
+    for tour_id, title in activities:
+        texts[tour_id]["C"].append(title)
+
+    return {
+        tour_id: {
+            weight: " ".join(part for part in parts if part)
+            for weight, parts in weights.items()
+        }
+        for tour_id, weights in texts.items()
+    }
+
+
+def refresh_search_documents(tour_ids):
+    """
+    Rebuild the stored search_document of the given tours.
+    """
+    for tour_id, texts in _document_texts(set(tour_ids)).items():
+        document = None
+        for weight, text in texts.items():
+            vector = SearchVector(Value(text), weight=weight, config=SEARCH_CONFIG)
+            document = vector if document is None else document + vector
+        # update() leaves updated_at alone: the document is not tour content.
+        Tour.objects.filter(pk=tour_id).update(search_document=document)
+
+
+def _flush_search_refresh():
+    pending = transaction.get_connection().__dict__.get("_tour_search_pending")
+    if not pending:
+        return
+
+    tour_ids = set(pending["tours"])
+    if pending["days"]:
+        tour_ids.update(
+            TourDay.objects.filter(pk__in=pending["days"])
+            .values_list("tour_id", flat=True)
+        )
+    pending["tours"].clear()
+    pending["days"].clear()
+
+    if tour_ids:
+        refresh_search_documents(tour_ids)
+
+
+def schedule_search_refresh(tour_ids=(), day_ids=()):
+    """
+    Refresh search documents once the current transaction commits.
+
+    Calls made within one transaction (e.g. an admin save with itinerary
+    inlines) are collected, and the first commit callback refreshes them
+    all; the rest find nothing left to do.
+    """
+    # Stored on the thread's own connection, next to its on_commit queue.
+    pending = transaction.get_connection().__dict__.setdefault(
+        "_tour_search_pending", defaultdict(set)
+    )
+    pending["tours"].update(tour_ids)
+    pending["days"].update(day_ids)
+    transaction.on_commit(_flush_search_refresh)
+
+
+def search_tours(qs, text, limit):
+    """
+    Ranked full-text matches for `text`; falls back to trigram similarity
+    on the title when nothing matches (typos, partial words).
+
+    Returns (tours, mode) where mode is "fulltext" or "trigram".
+    """
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    matches = list(
+        qs.filter(search_document=query)
+        .annotate(rank=SearchRank(F("search_document"), query))
+        .order_by("-rank", "-created_at")[:limit]
+    )
+    if matches:
+        return matches, "fulltext"
+
+    similar = list(
+        qs.filter(title__trigram_word_similar=text)
+        .annotate(similarity=TrigramWordSimilarity(text, "title"))
+        .order_by("-similarity", "-created_at")[:limit]
+    )
+    return similar, "trigram"
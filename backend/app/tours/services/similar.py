@@ -0,0 +1,170 @@
+"""
+"You may also like" neighbours for the tour detail.
+
+The build_similar_tours task encodes every active tour as a feature vector
+(division and district one-hot, transport, stay, duration, log price and
+start month), finds each tour's top-N cosine neighbours with blocked
+matrix products and caches the id lists per tour. The detail only reads
+that list, drops tours deactivated since, and hydrates it from the card
+cache (services.feed).
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from django.conf import settings
+
+from app.tours.models import Tour
+from app.tours.services.cache import get_cached_similar, set_cached_similar
+from app.tours.services.feed import tour_cards
+
+
+# Columns encoded for each tour, in encode_tours() row order.
+FEATURE_VALUES = (
+    "id",
+    "division_id",
+    "district_id",
+    "transport_id",
+    "stay_id",
+    "duration_days",
+    "total_cost",
+    "start_datetime__month",
+)
+
+# Relative weight of each feature block in the cosine similarity.
+FEATURE_WEIGHTS = {
+    "division": 1.0,
+    "district": 1.0,
+    "transport": 0.5,
+    "stay": 0.5,
+    "duration": 1.0,
+    "price": 1.0,
+    "month": 0.5,
+}
+
+# Rows of the similarity matrix computed at once; bounds memory to
+# BLOCK_SIZE x tours floats. Small blocks stay in cache while they are
+# partitioned, which is most of the run time.
+BLOCK_SIZE = 256
+
+
+def _one_hot(values, weight):
+    """
+    One column per distinct non-null value; a null row stays all zeros.
+    """
+    present = [value for value in dict.fromkeys(values) if value is not None]
+    columns = {value: i for i, value in enumerate(present)}
+    rows = [i for i, value in enumerate(values) if value is not None]
+    block = np.zeros((len(values), len(columns)), dtype=np.float32)
+    block[rows, [columns[values[i]] for i in rows]] = weight
+    return block
+
+
+def _standardized(values, weight):
+    column = np.asarray(values, dtype=np.float32)
+    spread = column.std()
+    column = (column - column.mean()) / (spread if spread else 1.0)
+    return (weight * column)[:, None]
+
+
+def encode_tours(rows):
+    """
+    (ids, unit-length feature matrix) for FEATURE_VALUES rows.
+    """
+    ids, divisions, districts, transports, stays, days, costs, months = zip(*rows)
+    month = 2 * np.pi * (np.asarray(months, dtype=np.float32) - 1) / 12
+    w = FEATURE_WEIGHTS
+
+    matrix = np.hstack([
+        _one_hot(divisions, w["division"]),
+        _one_hot(districts, w["district"]),
+        _one_hot(transports, w["transport"]),
+        _one_hot(stays, w["stay"]),
+        _standardized(days, w["duration"]),
+        _standardized(np.log1p(np.asarray(costs, dtype=np.float64)), w["price"]),
+        # A point on a circle, so December sits next to January.
+        w["month"] * np.column_stack([np.cos(month), np.sin(month)]).astype(np.float32),
+    ])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return list(ids), matrix
+
+
+def nearest_neighbours(matrix, count):
+    """
+    (tours, count) indices of each row's most cosine-similar other rows,
+    best first. `matrix` rows must be unit length.
+    """
+    total = len(matrix)
+    count = min(count, total - 1)
+    if count <= 0:
+        return np.empty((total, 0), dtype=np.intp)
+
+    neighbours = np.empty((total, count), dtype=np.intp)
+    for start in range(0, total, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, total)
+        scores = matrix[start:stop] @ matrix.T
+        # A tour is not its own neighbour.
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        # The `count` best end up last; partitioning in place of a negated
+        # copy saves a pass over the block.
+        top = np.argpartition(scores, total - count, axis=1)[:, total - count:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbours[start:stop] = np.take_along_axis(top, order, axis=1)
+    return neighbours
+
+
+def build_similar_tours(count=None):
+    """
+    Recompute and cache every active tour's neighbours. Returns the number
+    of tours encoded (0 without NumPy).
+    """
+    if np is None:
+        return 0
+
+    count = count or settings.TOUR_SIMILAR_COUNT
+    rows = list(
+        Tour.objects
+        .filter(is_active=True)
+        .order_by("id")
+        .values_list(*FEATURE_VALUES)
+    )
+    if not rows:
+        return 0
+
+    ids, matrix = encode_tours(rows)
+    neighbours = nearest_neighbours(matrix, count)
+    set_cached_similar({
+        str(tour_id): [str(ids[i]) for i in row]
+        for tour_id, row in zip(ids, neighbours.tolist())
+    })
+    return len(ids)
+
+
+def similar_tour_ids(tour_id):
+    """
+    The tour's cached neighbour ids, best first, without the tours
+    deactivated since the last build.
+    """
+    ids = get_cached_similar(str(tour_id)) or []
+    if not ids:
+        return []
+    active = {
+        str(pk)
+        for pk in Tour.objects.filter(pk__in=ids, is_active=True).values_list("pk", flat=True)
+    }
+    return [pk for pk in ids if pk in active]
+
+
+def similar_tours(tour_id):
+    """
+    The tour's active neighbours as list cards (no live fields), best first.
+    """
+    ids = similar_tour_ids(tour_id)
+    if not ids:
+        return []
+    cards = tour_cards(ids)
+    return [cards[pk] for pk in ids if pk in cards]
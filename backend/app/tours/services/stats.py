@@ -0,0 +1,271 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from app.tours.models import Tour, TourBooking, TourReview, TourStats, TourWaitlistEntry
+
+
+# Booking statuses that hold seats on a tour.
+CONFIRMED_STATUS = "paid"
+PENDING_STATUS = "pending"
+# Waitlist entry status that holds seats until the offer is taken.
+OFFERED_STATUS = "offered"
+
+# Counters that take seats off a tour's max_capacity.
+SEAT_FIELDS = ("confirmed_seats", "pending_seats", "held_seats")
+
+
+def booking_counters(status, seats):
+    """
+    Counter contribution of a single booking in the given state.
+    """
+    return {
+        "confirmed_seats": seats if status == CONFIRMED_STATUS else 0,
+        "pending_seats": seats if status == PENDING_STATUS else 0,
+    }
+
+
+def waitlist_counters(status, seats):
+    """
+    Counter contribution of a single waitlist entry in the given state.
+    """
+    return {"held_seats": seats if status == OFFERED_STATUS else 0}
+
+
+def review_counters(rating):
+    return {
+        "review_count": 1,
+        "rating_sum": rating,
+    }
+
+
+def rating_average(rating_sum, review_count):
+    """
+    SQL expression for the stored rating average; 0 when there are no reviews.
+    """
+    return Coalesce(
+        Cast(rating_sum, FloatField()) / NullIf(review_count, 0),
+        0.0,
+    )
+
+
+def apply_stats_delta(tour_id, **deltas):
+    """
+    Add `deltas` to the tour's counters with a single conditional UPDATE.
+
+    The derived sort keys (seats_remaining, rating_avg) are updated in the
+    same statement. Falls back to a full recompute when the stats row does
+    not exist yet.
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    # QuerySet.update() skips auto_now; conditional GET validators read it.
+    updates["updated_at"] = timezone.now()
+
+    seats = sum(deltas.get(field, 0) for field in SEAT_FIELDS)
+    if seats:
+        updates["seats_remaining"] = F("seats_remaining") - seats
+
+    if "review_count" in deltas or "rating_sum" in deltas:
+        updates["rating_avg"] = rating_average(
+            F("rating_sum") + deltas.get("rating_sum", 0),
+            F("review_count") + deltas.get("review_count", 0),
+        )
+
+    with transaction.atomic():
+        updated = TourStats.objects.filter(tour_id=tour_id).update(**updates)
+        if not updated:
+            refresh_tour_stats(tour_id)
+
+
+def sync_tour_capacity(tour):
+    """
+    Re-derive seats_remaining after the tour's max_capacity was saved.
+    """
+    TourStats.objects.filter(tour_id=tour.pk).update(
+        seats_remaining=(
+            tour.max_capacity
+            - F("confirmed_seats") - F("pending_seats") - F("held_seats")
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def _derived_fields(values, max_capacity):
+    values["seats_remaining"] = max_capacity - sum(
+        values[field] for field in SEAT_FIELDS
+    )
+    values["rating_avg"] = (
+        values["rating_sum"] / values["review_count"]
+        if values["review_count"] else 0.0
+    )
+    return values
+
+
+def _booking_aggregates():
+    return {
+        "confirmed_seats": Coalesce(
+            Sum("seats", filter=Q(status=CONFIRMED_STATUS)), 0
+        ),
+        "pending_seats": Coalesce(
+            Sum("seats", filter=Q(status=PENDING_STATUS)), 0
+        ),
+    }
+
+
+def _waitlist_aggregates():
+    return {
+        "held_seats": Coalesce(
+            Sum("seats", filter=Q(status=OFFERED_STATUS)), 0
+        ),
+    }
+
+
+def _review_aggregates():
+    return {
+        "review_count": Count("id"),
+        "rating_sum": Coalesce(Sum("rating"), 0),
+    }
+
+
+def refresh_tour_stats(tour_id):
+    """
+    Recompute one tour's counters from its bookings, waitlist offers and
+    reviews.
+    """
+    max_capacity = (
+        Tour.objects.filter(pk=tour_id)
+        .values_list("max_capacity", flat=True)
+        .first()
+    )
+    if max_capacity is None:
+        # The tour is being deleted; its stats row goes with it.
+        return None
+
+    values = TourBooking.objects.filter(tour_id=tour_id).aggregate(
+        **_booking_aggregates()
+    )
+    values.update(
+        TourWaitlistEntry.objects.filter(tour_id=tour_id).aggregate(
+            **_waitlist_aggregates()
+        )
+    )
+    values.update(
+        TourReview.objects.filter(tour_id=tour_id).aggregate(
+            **_review_aggregates()
+        )
+    )
+
+    stats, _ = TourStats.objects.update_or_create(
+        tour_id=tour_id,
+        defaults=_derived_fields(values, max_capacity),
+    )
+    return stats
+
+
+@transaction.atomic
+def rebuild_all_tour_stats(batch_size=500):
+    """
+    Recompute counters for every tour with one grouped query per source.
+
+    Returns the number of stats rows written.
+    """
+    capacities = dict(Tour.objects.values_list("pk", "max_capacity"))
+    counters = {
+        tour_id: {
+            "confirmed_seats": 0,
+            "pending_seats": 0,
+            "held_seats": 0,
+            "review_count": 0,
+            "rating_sum": 0,
+        }
+        for tour_id in capacities
+    }
+
+    bookings = (
+        TourBooking.objects
+        .values("tour_id")
+        .annotate(**_booking_aggregates())
+    )
+    for row in bookings:
+        counters[row.pop("tour_id")].update(row)
+
+    offers = (
+        TourWaitlistEntry.objects
+        .values("tour_id")
+        .annotate(**_waitlist_aggregates())
+    )
+    for row in offers:
+        counters[row.pop("tour_id")].update(row)
+
+    reviews = (
+        TourReview.objects
+        .values("tour_id")
+        .annotate(**_review_aggregates())
+    )
+    for row in reviews:
+        counters[row.pop("tour_id")].update(row)
+
+    existing = {
+        stats.tour_id: stats
+        for stats in TourStats.objects.select_for_update()
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for tour_id, values in counters.items():
+        _derived_fields(values, capacities[tour_id])
+        values["updated_at"] = now
+        stats = existing.get(tour_id)
+        if stats is None:
+            to_create.append(TourStats(tour_id=tour_id, **values))
+            continue
+        for field, value in values.items():
+            setattr(stats, field, value)
+        to_update.append(stats)
+
+    TourStats.objects.bulk_create(to_create, batch_size=batch_size)
+    TourStats.objects.bulk_update(
+        to_update,
+        [
+            "confirmed_seats",
+            "pending_seats",
+            "held_seats",
+            "review_count",
+            "rating_sum",
+            "seats_remaining",
+            "rating_avg",
+            "updated_at",
+        ],
+        batch_size=batch_size,
+    )
+    return len(to_create) + len(to_update)
+
+
+def stats_annotations(*names):
+    """
+    Tour annotations read straight from the joined TourStats row; only the
+    named ones when `names` are given.
+
+    Replaces per-request Sum/Avg/Count over bookings and reviews.
+    """
+    annotations = {
+        "joined_count": Coalesce(
+            F("stats__confirmed_seats") + F("stats__pending_seats"), 0
+        ),
+        # Free seats after confirmed, pending and waitlist-held ones.
+        "seats_remaining": Coalesce(F("stats__seats_remaining"), F("max_capacity")),
+        "rating_count": Coalesce(F("stats__review_count"), 0),
+        "rating_avg": (
+            Cast("stats__rating_sum", FloatField())
+            / NullIf("stats__review_count", 0)
+        ),
+    }
+    if not names:
+        return annotations
+    return {name: annotations[name] for name in names}
@@ -0,0 +1,130 @@
+"""
+Waiting room for tours with waiting_room set: admission to the booking
+flow (join and confirm) at WAITING_ROOM_ADMIT_RATE users per second.
+
+join() hands the user a signed queue token holding their place in line,
+taken from a per-tour counter in the cache. The admit_waiting_rooms task
+moves each tour's "admitted up to" mark forward at the admission rate,
+but never past the last place handed out, so a quiet queue does not bank
+admissions for the next spike. poll() compares the token's place with
+that mark and, once it is passed, returns an admission pass that join and
+confirm require. Tokens and passes are signed, and the queue state is in
+the cache, so polling reads no database row.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+
+TOKEN_SALT = "tours.waiting-room.token"
+PASS_SALT = "tours.waiting-room.pass"
+PASS_HEADER = "X-Admission-Pass"
+
+TAIL_KEY = "tours:waiting-room:{tour_id}:tail"
+HEAD_KEY = "tours:waiting-room:{tour_id}:head"
+PLACE_KEY = "tours:waiting-room:{tour_id}:user:{user_id}"
+
+# A place in line is kept this long; the counters themselves do not expire.
+PLACE_TIMEOUT = 24 * 60 * 60
+
+# Bounds for the poll_after hint, in seconds.
+MIN_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 30
+
+
+def _place(tour_id, user_id):
+    """
+    The user's place in the tour's queue; one per user, so re-joining (or
+    a second device) does not send them to the back.
+    """
+    place_key = PLACE_KEY.format(tour_id=tour_id, user_id=user_id)
+    place = cache.get(place_key)
+    if place is None:
+        tail_key = TAIL_KEY.format(tour_id=tour_id)
+        cache.add(tail_key, 0, None)
+        place = cache.incr(tail_key)
+        if not cache.add(place_key, place, PLACE_TIMEOUT):
+            # A concurrent join for the same user got there first.
+            place = cache.get(place_key, place)
+    return place
+
+
+def admitted_until(tour_id):
+    """
+    The highest place admitted so far.
+    """
+    head = cache.get(HEAD_KEY.format(tour_id=tour_id))
+    return int(head[0]) if head else 0
+
+
+def join(tour_id, user_id):
+    """
+    The user's queue token; poll() it for admission.
+    """
+    token = signing.dumps(
+        {"tour": str(tour_id), "user": str(user_id), "place": _place(tour_id, user_id)},
+        salt=TOKEN_SALT,
+    )
+    return {"token": token, **poll(token)}
+
+
+def poll(token):
+    """
+    Where the token stands: admitted with a pass, or the users ahead and
+    a wait estimate. Raises signing.BadSignature for a forged or expired
+    token.
+    """
+    queued = signing.loads(token, salt=TOKEN_SALT, max_age=PLACE_TIMEOUT)
+    ahead = queued["place"] - admitted_until(queued["tour"]) - 1
+    if ahead < 0:
+        admission = signing.dumps(
+            {"tour": queued["tour"], "user": queued["user"]}, salt=PASS_SALT
+        )
+        return {"admitted": True, "pass": admission}
+
+    rate = settings.WAITING_ROOM_ADMIT_RATE
+    wait = -(-(ahead + 1) // rate)
+    return {
+        "admitted": False,
+        "ahead": ahead,
+        "estimated_wait": wait,
+        "poll_after": min(max(wait // 2, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL),
+    }
+
+
+def is_admitted(request, tour):
+    """
+    Whether the request carries a current admission pass for the tour.
+    """
+    admission = request.headers.get(PASS_HEADER)
+    if not admission:
+        return False
+    try:
+        granted = signing.loads(
+            admission, salt=PASS_SALT, max_age=settings.WAITING_ROOM_PASS_TTL
+        )
+    except signing.BadSignature:
+        return False
+    return granted == {"tour": str(tour.pk), "user": str(request.user.pk)}
+
+
+def admit(tour_id, now=None):
+    """
+    Move the tour's admission mark forward by the time since the last run
+    at WAITING_ROOM_ADMIT_RATE, up to the last place handed out. Only the
+    admit_waiting_rooms task calls this, on a one-process queue
+    (CELERY_TASK_ROUTES), so the update needs no lock.
+    Returns the mark.
+    """
+    now = time.time() if now is None else now
+    tail = cache.get(TAIL_KEY.format(tour_id=tour_id)) or 0
+    head_key = HEAD_KEY.format(tour_id=tour_id)
+    head, last_run = cache.get(head_key) or (0.0, now)
+
+    # A stalled beat does not release a backlog of admissions at once.
+    elapsed = min(max(now - last_run, 0), 2 * settings.WAITING_ROOM_ADMIT_INTERVAL)
+    head = min(head + elapsed * settings.WAITING_ROOM_ADMIT_RATE, tail)
+    cache.set(head_key, (head, now), None)
+    return int(head)
@@ -0,0 +1,190 @@
+"""
+Waitlist for full tours.
+
+Users queue with join(); entries are served in joined_at order. When a
+booking is cancelled, refunded or deleted, an offer runs out or a user
+leaves, the booking signals queue the promote_waitlist task, which offers
+the free seats to the next waiting users and holds them for
+WAITLIST_OFFER_TTL (TourStats.held_seats). accept() turns an offer into
+a pending booking under the tour's seat lock, so the held seats cannot be
+taken in between. The promote_waitlists beat task catches offers that
+ran out and anything a missed task left behind.
+
+Positions come from a per-tour {user id: position} map cached under a
+version bumped by every entry change, so polling costs two cache reads.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.tours.models import TourBooking, TourWaitlistEntry
+from app.tours.services.booked import BOOKED_STATUSES
+from app.tours.services.cache import (
+    get_cached_waitlist,
+    set_cached_waitlist,
+    waitlist_version,
+)
+from app.tours.services.reservations import (
+    REJECTED_STATUS,
+    BookingStateConflict,
+    lock_tour_seats,
+    reserve_seats,
+    seats_available,
+)
+from app.tours.services.stats import OFFERED_STATUS, PENDING_STATUS
+
+
+WAITING_STATUS = "waiting"
+ACCEPTED_STATUS = "accepted"
+EXPIRED_STATUS = "expired"
+LEFT_STATUS = "left"
+
+# Entries still in the queue.
+OPEN_ENTRY_STATUSES = (WAITING_STATUS, OFFERED_STATUS)
+
+# Statuses that free seats for the waitlist when a row enters them.
+RELEASED_BOOKING_STATUSES = ("cancelled", "refunded")
+RELEASED_ENTRY_STATUSES = (EXPIRED_STATUS, LEFT_STATUS)
+
+
+def join(tour, user, seats):
+    """
+    Put the user at the back of the tour's waitlist, or keep their place
+    if they are already waiting. Raises BookingStateConflict when they
+    already hold seats on the tour or an offer for them.
+    """
+    if TourBooking.objects.filter(
+        tour=tour, user=user, status__in=BOOKED_STATUSES
+    ).exists():
+        raise BookingStateConflict(PENDING_STATUS)
+
+    with transaction.atomic():
+        entry, created = (
+            TourWaitlistEntry.objects
+            .select_for_update()
+            .get_or_create(tour=tour, user=user, defaults={"seats": seats})
+        )
+        if created:
+            return entry
+        if entry.status == OFFERED_STATUS:
+            raise BookingStateConflict(entry.status)
+        if entry.status != WAITING_STATUS:
+            entry.status = WAITING_STATUS
+            entry.joined_at = timezone.now()
+            entry.offer_expires_at = None
+        entry.seats = seats
+        entry.save()
+    return entry
+
+
+def leave(entry):
+    """
+    Take the user off the waitlist, giving back an offer they hold.
+    """
+    entry.status = LEFT_STATUS
+    entry.offer_expires_at = None
+    entry.save()
+
+
+def position(entry):
+    """
+    1-based place among the tour's waiting users; None once not waiting.
+    """
+    if entry.status != WAITING_STATUS:
+        return None
+
+    version = waitlist_version(entry.tour_id)
+    positions = get_cached_waitlist(entry.tour_id, version)
+    if positions is None:
+        user_ids = (
+            TourWaitlistEntry.objects
+            .filter(tour_id=entry.tour_id, status=WAITING_STATUS)
+            .order_by("joined_at", "id")
+            .values_list("user_id", flat=True)
+        )
+        positions = {str(user_id): i for i, user_id in enumerate(user_ids, 1)}
+        set_cached_waitlist(entry.tour_id, version, positions)
+    return positions.get(str(entry.user_id))
+
+
+def promote(tour_id, now=None):
+    """
+    Expire the tour's lapsed offers, then offer the free seats to waiting
+    users in order. Strictly first come, first served: the first entry
+    that does not fit stops the round. Returns the entries offered.
+    """
+    now = now or timezone.now()
+    offered = []
+    with transaction.atomic():
+        lock_tour_seats(tour_id)
+        entries = TourWaitlistEntry.objects.select_for_update().filter(tour_id=tour_id)
+
+        for entry in entries.filter(status=OFFERED_STATUS, offer_expires_at__lte=now):
+            entry.status = EXPIRED_STATUS
+            entry.save()
+
+        # Read after the expiries: their post_save gave the seats back.
+        free = seats_available(tour_id)
+        waiting = entries.filter(status=WAITING_STATUS).order_by("joined_at", "id")
+        for entry in waiting[:max(free, 0)]:
+            if entry.seats > free:
+                break
+            entry.status = OFFERED_STATUS
+            entry.offer_expires_at = now + timedelta(seconds=settings.WAITLIST_OFFER_TTL)
+            entry.save()
+            free -= entry.seats
+            offered.append(entry)
+    return offered
+
+
+def tours_to_promote(now=None):
+    """
+    Tours with a lapsed offer, or with waiting users and free seats.
+    """
+    now = now or timezone.now()
+    lapsed = Q(status=OFFERED_STATUS, offer_expires_at__lte=now)
+    waiting = Q(status=WAITING_STATUS, tour__stats__seats_remaining__gt=0)
+    return set(
+        TourWaitlistEntry.objects
+        .filter(lapsed | waiting)
+        .values_list("tour_id", flat=True)
+        .distinct()
+    )
+
+
+def accept(entry, now=None):
+    """
+    Turn the user's offer into a pending booking for the offered seats.
+    Raises BookingStateConflict when there is no live offer, and
+    SeatsUnavailable only if the capacity was cut below the held seats.
+    Returns the booking.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lock_tour_seats(entry.tour_id)
+        entry = TourWaitlistEntry.objects.select_for_update().get(pk=entry.pk)
+        if entry.status != OFFERED_STATUS or entry.offer_expires_at <= now:
+            raise BookingStateConflict(entry.status)
+
+        # Releases the held seats; the lock keeps them for this booking.
+        entry.status = ACCEPTED_STATUS
+        entry.offer_expires_at = None
+        entry.save()
+
+        booking, _ = TourBooking.objects.get_or_create(
+            tour_id=entry.tour_id,
+            user_id=entry.user_id,
+            defaults={"status": "draft", "seats": entry.seats},
+        )
+        return reserve_seats(
+            booking,
+            PENDING_STATUS,
+            from_statuses=("draft", REJECTED_STATUS) + RELEASED_BOOKING_STATUSES,
+            seats=entry.seats,
+            booking_reference=booking.booking_reference or booking.generate_reference(),
+            accepted_terms_at=now,
+            confirmed_at=now,
+        )
@@ -0,0 +1,312 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from app.accounts.models import UserProfile
+from app.guides.models import TourGuide
+from app.tours.models import (
+    District,
+    Division,
+    Stay,
+    StayReview,
+    Tour,
+    TourBooking,
+    TourDay,
+    TourDayActivity,
+    TourImage,
+    TourInclusion,
+    TourReview,
+    TourWaitlistEntry,
+    Transport,
+    TransportReview,
+    Upazila,
+)
+from app.tours.services.cache import (
+    invalidate_booked_tours,
+    invalidate_catalog,
+    invalidate_reference_data,
+    invalidate_tour_detail,
+    invalidate_waitlist,
+)
+from app.tours.services.booked import BOOKED_STATUSES
+from app.tours.services.search import schedule_search_refresh
+from app.tours.services.stats import (
+    apply_stats_delta,
+    booking_counters,
+    refresh_tour_stats,
+    review_counters,
+    sync_tour_capacity,
+    waitlist_counters,
+)
+from app.tours.services.waitlist import (
+    OPEN_ENTRY_STATUSES,
+    RELEASED_BOOKING_STATUSES,
+    RELEASED_ENTRY_STATUSES,
+    leave as leave_waitlist,
+)
+from app.tours.tasks import promote_waitlist
+
+User = get_user_model()
+
+
+# Bookings and reviews remember the counters they contributed when loaded,
+# so post_save can apply the difference instead of re-aggregating the tour.
+STATS_SOURCES = {
+    TourBooking: (("status", "seats"), booking_counters),
+    TourReview: (("rating",), review_counters),
+    TourWaitlistEntry: (("status", "seats"), waitlist_counters),
+}
+
+
+def _loaded_state(instance):
+    fields, to_counters = STATS_SOURCES[type(instance)]
+    values = [instance.__dict__.get(field) for field in ("tour_id",) + fields]
+    if any(value is None for value in values):
+        # New or deferred instance; nothing reliable to diff against.
+        return None
+    return values[0], to_counters(*values[1:])
+
+
+def _negate(counters):
+    return {field: -value for field, value in counters.items()}
+
+
+def _is_tour_deletion(origin):
+    model = getattr(origin, "model", type(origin))
+    return model is Tour
+
+
+@receiver(post_save, sender=Tour)
+def create_tour_stats(sender, instance, created, **kwargs):
+    if created:
+        refresh_tour_stats(instance.pk)
+    else:
+        sync_tour_capacity(instance)
+
+
+@receiver(post_init, sender=TourBooking)
+@receiver(post_init, sender=TourReview)
+@receiver(post_init, sender=TourWaitlistEntry)
+def remember_stats_state(sender, instance, **kwargs):
+    instance._stats_state = _loaded_state(instance)
+
+
+@receiver(post_save, sender=TourBooking)
+@receiver(post_save, sender=TourReview)
+@receiver(post_save, sender=TourWaitlistEntry)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    old_state = None if created else instance._stats_state
+    new_state = _loaded_state(instance)
+
+    if not created and old_state is None:
+        refresh_tour_stats(instance.tour_id)
+    else:
+        new_tour_id, new = new_state
+        if old_state is None:
+            apply_stats_delta(new_tour_id, **new)
+        else:
+            old_tour_id, old = old_state
+            if old_tour_id == new_tour_id:
+                apply_stats_delta(
+                    new_tour_id,
+                    **{field: new[field] - old[field] for field in new}
+                )
+            else:
+                apply_stats_delta(old_tour_id, **_negate(old))
+                apply_stats_delta(new_tour_id, **new)
+
+    instance._stats_state = new_state
+
+
+@receiver(post_delete, sender=TourBooking)
+@receiver(post_delete, sender=TourReview)
+@receiver(post_delete, sender=TourWaitlistEntry)
+def update_stats_on_delete(sender, instance, origin=None, **kwargs):
+    if _is_tour_deletion(origin):
+        # The stats row is deleted along with the tour.
+        return
+
+    state = instance._stats_state
+    if state is None:
+        refresh_tour_stats(instance.tour_id)
+        return
+
+    tour_id, old = state
+    apply_stats_delta(tour_id, **_negate(old))
+
+
+# Detail cache invalidation. Versions are bumped after commit so a request
+# racing the write cannot re-cache the old rows under the new version.
+
+def _invalidate_tours(**filters):
+    def invalidate():
+        invalidate_tour_detail(
+            *Tour.objects.filter(**filters).values_list("slug", flat=True)
+        )
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=TourBooking)
+@receiver(post_delete, sender=TourBooking)
+def invalidate_user_bookings(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_booked_tours(user_id))
+
+
+@receiver(post_init, sender=Tour)
+def remember_tour_slug(sender, instance, **kwargs):
+    instance._cached_slug = instance.__dict__.get("slug")
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_delete, sender=Tour)
+def invalidate_tour(sender, instance, **kwargs):
+    slugs = (instance._cached_slug, instance.slug)
+    transaction.on_commit(lambda: invalidate_tour_detail(*slugs))
+    instance._cached_slug = instance.slug
+
+
+@receiver(post_save, sender=TourDay)
+@receiver(post_delete, sender=TourDay)
+@receiver(post_save, sender=TourImage)
+@receiver(post_delete, sender=TourImage)
+@receiver(post_save, sender=TourInclusion)
+@receiver(post_delete, sender=TourInclusion)
+def invalidate_tour_content(sender, instance, **kwargs):
+    _invalidate_tours(pk=instance.tour_id)
+
+
+@receiver(post_save, sender=TourDayActivity)
+@receiver(post_delete, sender=TourDayActivity)
+def invalidate_tour_activity(sender, instance, **kwargs):
+    _invalidate_tours(days=instance.day_id)
+
+
+@receiver(post_save, sender=Division)
+@receiver(post_delete, sender=Division)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+@receiver(post_save, sender=Upazila)
+@receiver(post_delete, sender=Upazila)
+@receiver(post_save, sender=Transport)
+@receiver(post_delete, sender=Transport)
+@receiver(post_save, sender=Stay)
+@receiver(post_delete, sender=Stay)
+def invalidate_reference_tables(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_reference_data)
+
+
+@receiver(post_save, sender=TransportReview)
+@receiver(post_delete, sender=TransportReview)
+@receiver(post_save, sender=StayReview)
+@receiver(post_delete, sender=StayReview)
+@receiver(post_save, sender=TourGuide)
+@receiver(post_delete, sender=TourGuide)
+def invalidate_shared_details(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def invalidate_guide_tours(sender, instance, update_fields=None, **kwargs):
+    # Tour leads show the guide's name and profile picture.
+    if update_fields is not None and not {"full_name", "profile_pic"} & set(update_fields):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    _invalidate_tours(tour_lead__user_id=user_id)
+
+
+# Search documents are refreshed after commit, once per transaction.
+
+@receiver(post_save, sender=Tour)
+def refresh_tour_search_document(sender, instance, **kwargs):
+    schedule_search_refresh(tour_ids=[instance.pk])
+
+
+@receiver(post_save, sender=TourDay)
+@receiver(post_delete, sender=TourDay)
+def refresh_search_on_day_change(sender, instance, **kwargs):
+    schedule_search_refresh(tour_ids=[instance.tour_id])
+
+
+@receiver(post_save, sender=TourDayActivity)
+@receiver(post_delete, sender=TourDayActivity)
+def refresh_search_on_activity_change(sender, instance, **kwargs):
+    schedule_search_refresh(day_ids=[instance.day_id])
+
+
+@receiver(post_save, sender=Division)
+@receiver(post_save, sender=District)
+@receiver(post_save, sender=Upazila)
+def refresh_search_on_location_rename(sender, instance, created, **kwargs):
+    if created:
+        return
+    field = sender.__name__.lower()
+    schedule_search_refresh(
+        tour_ids=Tour.objects.filter(**{field: instance}).values_list("pk", flat=True)
+    )
+
+
+# Waitlist: positions are cached per tour version, and seats freed by a
+# booking or an offer are offered to the next users by promote_waitlist.
+
+@receiver(post_save, sender=TourWaitlistEntry)
+@receiver(post_delete, sender=TourWaitlistEntry)
+def invalidate_waitlist_positions(sender, instance, **kwargs):
+    tour_id = instance.tour_id
+    transaction.on_commit(lambda: invalidate_waitlist(tour_id))
+
+
+def _schedule_promotion(tour_id):
+    transaction.on_commit(lambda: promote_waitlist.delay(str(tour_id)))
+
+
+@receiver(post_init, sender=TourBooking)
+@receiver(post_init, sender=TourWaitlistEntry)
+def remember_loaded_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get("status")
+
+
+def _released(instance, created, released_statuses):
+    # Only the save that moves a row into the released statuses frees
+    # seats; later saves (a note, cancelled -> refunded) free nothing.
+    previous, instance._loaded_status = instance._loaded_status, instance.status
+    return (
+        not created
+        and instance.status in released_statuses
+        and previous not in released_statuses
+    )
+
+
+@receiver(post_save, sender=TourBooking)
+def promote_on_booking_release(sender, instance, created, **kwargs):
+    if _released(instance, created, RELEASED_BOOKING_STATUSES):
+        _schedule_promotion(instance.tour_id)
+
+
+@receiver(post_delete, sender=TourBooking)
+def promote_on_booking_delete(sender, instance, origin=None, **kwargs):
+    if instance.status in BOOKED_STATUSES and not _is_tour_deletion(origin):
+        _schedule_promotion(instance.tour_id)
+
+
+@receiver(post_save, sender=TourBooking)
+def close_waitlist_entry_on_booking(sender, instance, **kwargs):
+    # A user who got seats another way leaves the queue, giving back any
+    # offer, so they are not offered seats they cannot accept.
+    if instance.status not in BOOKED_STATUSES:
+        return
+    entries = TourWaitlistEntry.objects.filter(
+        tour_id=instance.tour_id,
+        user_id=instance.user_id,
+        status__in=OPEN_ENTRY_STATUSES,
+    )
+    for entry in entries:
+        leave_waitlist(entry)
+
+
+@receiver(post_save, sender=TourWaitlistEntry)
+def promote_on_offer_release(sender, instance, created, **kwargs):
+    if _released(instance, created, RELEASED_ENTRY_STATUSES):
+        _schedule_promotion(instance.tour_id)
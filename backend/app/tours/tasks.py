@@ -0,0 +1,185 @@
+try:
+    from celery import shared_task
+except ImportError:
+    def shared_task(func):
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+        wrapper.delay = func
+        return wrapper
+
+from django.conf import settings
+from django.core.mail import send_mail, send_mass_mail
+
+from app.tours.models import Tour, TourBooking
+from app.tours.services import drafts, flash, similar, waiting_room, waitlist
+from app.tours.services.feed import build_feed
+
+
+@shared_task
+def build_tour_feed():
+    """
+    Re-rank the home feed sections; scheduled in CELERY_BEAT_SCHEDULE.
+    """
+    feed = build_feed()
+    return {key: len(ids) for key, ids in feed["sections"].items()}
+
+
+@shared_task
+def build_similar_tours():
+    """
+    Recompute every active tour's neighbours; scheduled in
+    CELERY_BEAT_SCHEDULE.
+    """
+    return similar.build_similar_tours()
+
+
+@shared_task
+def reconcile_flash_sales():
+    """
+    Write flash-sale seat holds to Postgres and re-sync the counters;
+    scheduled in CELERY_BEAT_SCHEDULE.
+    """
+    return flash.reconcile_flash_sales()
+
+
+@shared_task
+def admit_waiting_rooms():
+    """
+    Admit the next users of every tour with a waiting room; scheduled in
+    CELERY_BEAT_SCHEDULE, run by the single waiting-room queue worker.
+    """
+    return {
+        str(pk): waiting_room.admit(pk)
+        for pk in Tour.objects.filter(waiting_room=True).values_list("pk", flat=True)
+    }
+
+
+@shared_task
+def expire_stale_drafts():
+    """
+    Delete abandoned draft bookings; scheduled in CELERY_BEAT_SCHEDULE.
+    The returned sweep metrics land in the result backend.
+    """
+    return drafts.expire_stale_drafts()
+
+
+@shared_task
+def promote_waitlist(tour_id):
+    """
+    Offer the tour's free seats to its next waitlisted users; queued by the
+    booking signals when seats are given back.
+    """
+    return len(waitlist.promote(tour_id))
+
+
+@shared_task
+def promote_waitlists():
+    """
+    Expire lapsed waitlist offers and fill seats a missed promote_waitlist
+    left free; scheduled in CELERY_BEAT_SCHEDULE.
+    """
+    return {
+        str(tour_id): len(waitlist.promote(tour_id))
+        for tour_id in waitlist.tours_to_promote()
+    }
+
+
+@shared_task
+def send_booking_cancelled_email_task(booking_id, refund_due=False):
+    booking = TourBooking.objects.select_related("tour", "user").get(pk=booking_id)
+    subject = f"Booking {booking.booking_reference} cancelled"
+    message = (
+        f"Hello {booking.user.full_name},\n\n"
+        f"Your booking {booking.booking_reference} for {booking.tour.title} has been cancelled."
+        f"{' Your payment will be refunded.' if refund_due else ''}\n\nThank you!"
+    )
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+    send_mail(subject, message, from_email, [booking.user.email], fail_silently=False)
+
+
+@shared_task
+def send_booking_rejected_email_task(booking_id):
+    booking = TourBooking.objects.select_related("tour", "user").get(pk=booking_id)
+    subject = f"Booking for {booking.tour.title} could not be completed"
+    message = (
+        f"Hello {booking.user.full_name},\n\n"
+        f"Sorry, the last seats on {booking.tour.title} were taken before your booking "
+        f"could be completed, so it has not gone through. You have not been charged.\n\nThank you!"
+    )
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+    send_mail(subject, message, from_email, [booking.user.email], fail_silently=False)
+
+
+@shared_task
+def send_booking_refund_due_email_task(booking_id):
+    """
+    Tell the team a paid booking was cancelled; they mark it refunded once
+    the money is back.
+    """
+    booking = TourBooking.objects.select_related("tour", "user").get(pk=booking_id)
+    subject = f"Refund due: {booking.booking_reference}"
+    message = (
+        f"{booking.user.email} cancelled paid booking {booking.booking_reference} "
+        f"({booking.seats} seat(s), {booking.tour.title}).\n"
+        f"Upfront payment: {booking.tour.upfront_payment}"
+    )
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+    send_mail(subject, message, from_email, [settings.BOOKING_REFUNDS_EMAIL], fail_silently=False)
+
+
+@shared_task
+def send_booking_refunds_due_email_task(booking_ids):
+    """
+    One refund-due notice listing the paid bookings an admin cancelled in
+    bulk.
+    """
+    bookings = (
+        TourBooking.objects
+        .select_related("tour", "user")
+        .filter(pk__in=booking_ids)
+        .order_by("booking_reference")
+    )
+    lines = [
+        f"{booking.booking_reference}: {booking.user.email}, {booking.seats} seat(s), "
+        f"{booking.tour.title}, upfront payment {booking.tour.upfront_payment}"
+        for booking in bookings
+    ]
+    if not lines:
+        return
+    subject = f"Refunds due: {len(lines)} booking(s)"
+    message = "Paid bookings cancelled from the admin:\n\n" + "\n".join(lines)
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+    send_mail(subject, message, from_email, [settings.BOOKING_REFUNDS_EMAIL], fail_silently=False)
+
+
+BOOKING_STATUS_MESSAGES = {
+    "paid": "Your booking {reference} for {tour} has been approved.",
+    "cancelled": "Your booking {reference} for {tour} has been cancelled.",
+    "refunded": "Your payment for booking {reference} ({tour}) has been refunded.",
+}
+
+
+@shared_task
+def send_booking_status_emails_task(booking_ids):
+    """
+    Tell each user their booking's new status, over one mail connection.
+    """
+    bookings = TourBooking.objects.select_related("tour", "user").filter(pk__in=booking_ids)
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+    messages = []
+    for booking in bookings:
+        if booking.status not in BOOKING_STATUS_MESSAGES:
+            continue
+        subject = f"Booking {booking.booking_reference} {booking.get_status_display().lower()}"
+        update = BOOKING_STATUS_MESSAGES[booking.status].format(
+            reference=booking.booking_reference, tour=booking.tour.title
+        )
+        message = f"Hello {booking.user.full_name},\n\n{update}\n\nThank you!"
+        messages.append((subject, message, from_email, [booking.user.email]))
+
+    return send_mass_mail(messages, fail_silently=False)
@@ -1,12 +1,53 @@
 from django.urls import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
-from app.tours.models import Tour, TourBooking, Division, Transport, Stay
+from app.guides.models import TourGuide
+from app.tours.serializers import TourListSerializer
+from app.tours.services.images import image_variants
+from app.tours.services.listing import TOUR_LIST_VALUES, list_values, serialize_tour_rows
+from app.tours.services.reference import reference_data
+from app.tours.services.search import tour_facets
+from app.tours.admin import TourBookingAdminForm
+from app.tours.services import bulk, drafts, flash, similar, waiting_room, waitlist
+from app.tours.services.cache import booked_version
+from app.tours.services.references import BLOCK_SIZE, CounterBlocks, allocate_reference, scramble
+from app.tours.services.reservations import BookingStateConflict, SeatsUnavailable, reserve_seats
+from app.tours.services.similar import build_similar_tours, similar_tours
+from app.tours.services.stats import stats_annotations
+from app.tours.tasks import (
+    admit_waiting_rooms, build_tour_feed, expire_stale_drafts, reconcile_flash_sales,
+)
+from app.tours.models import (
+    Tour, TourBooking, TourReview, TourStats, TourImage, TourDay, TourDayActivity, TourInclusion,
+    TourWaitlistEntry,
+    Division, District, Upazila, Transport, Stay, TransportReview,
+)
 from django.utils import timezone
+from django.utils.http import http_date
 from datetime import timedelta
+import base64
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import SkipTest, skipIf, skipUnless
+from unittest.mock import patch
 
 User = get_user_model()
+np = similar.np
 
 class TourIsBookedTests(APITestCase):
     def setUp(self):
@@ -119,3 +160,2013 @@ class UpcomingToursTests(APITestCase):
         response = self.client.get(self.url)
         data = response.data['results'][0]
         self.assertEqual(data['message'], "Your booking is pending approval.")
+
+
+class TourStatsTests(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email=f'stats{i}@example.com', username=f'stats{i}', password='pw'
+            )
+            for i in range(3)
+        ]
+        self.tour = Tour.objects.create(
+            title="Stats Tour",
+            slug="stats-tour",
+            division=Division.objects.create(name="Stats Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() + timedelta(days=2),
+            meeting_point="P", meeting_time="10:00",
+        )
+
+    def stats(self):
+        return TourStats.objects.get(tour=self.tour)
+
+    def test_stats_row_created_with_tour(self):
+        stats = self.stats()
+        self.assertEqual(
+            (stats.confirmed_seats, stats.pending_seats, stats.review_count, stats.rating_sum),
+            (0, 0, 0, 0),
+        )
+
+    def test_booking_status_transitions_update_seats(self):
+        booking = TourBooking.objects.create(tour=self.tour, user=self.users[0], seats=2)
+        self.assertEqual(self.stats().pending_seats, 0)
+
+        booking.status = "pending"
+        booking.save()
+        self.assertEqual((self.stats().confirmed_seats, self.stats().pending_seats), (0, 2))
+
+        booking = TourBooking.objects.get(pk=booking.pk)
+        booking.status = "paid"
+        booking.save()
+        self.assertEqual((self.stats().confirmed_seats, self.stats().pending_seats), (2, 0))
+
+        booking.status = "cancelled"
+        booking.save()
+        self.assertEqual((self.stats().confirmed_seats, self.stats().pending_seats), (0, 0))
+
+        TourBooking.objects.create(tour=self.tour, user=self.users[1], status="paid", seats=3)
+        TourBooking.objects.filter(user=self.users[1]).delete()
+        self.assertEqual(self.stats().confirmed_seats, 0)
+
+    def test_reviews_update_rating_counters(self):
+        TourReview.objects.create(tour=self.tour, user=self.users[0], rating=5)
+        review = TourReview.objects.create(tour=self.tour, user=self.users[1], rating=2)
+        review.rating = 4
+        review.save()
+
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.rating_sum), (2, 9))
+
+        review.delete()
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.rating_sum), (1, 5))
+
+    def test_list_counts_are_not_multiplied_by_reviews(self):
+        for user in self.users:
+            TourBooking.objects.create(tour=self.tour, user=user, status="paid", seats=2)
+            TourReview.objects.create(tour=self.tour, user=user, rating=4)
+
+        response = self.client.get(reverse('tour-list'))
+        data = response.data['results'][0]
+        self.assertEqual(data['joined_count'], 6)
+        self.assertEqual(data['rating_count'], 3)
+        self.assertEqual(data['rating'], "4.00")
+
+    def test_rebuild_command_restores_drifted_counters(self):
+        TourBooking.objects.create(tour=self.tour, user=self.users[0], status="pending", seats=2)
+        TourReview.objects.create(tour=self.tour, user=self.users[0], rating=3)
+        TourStats.objects.filter(tour=self.tour).update(
+            pending_seats=99, review_count=0, rating_sum=0
+        )
+
+        call_command("rebuild_tour_stats", stdout=StringIO())
+
+        stats = self.stats()
+        self.assertEqual(
+            (stats.confirmed_seats, stats.pending_seats, stats.review_count, stats.rating_sum),
+            (0, 2, 1, 3),
+        )
+
+
+class TourListPaginationTests(APITestCase):
+    def setUp(self):
+        division = Division.objects.create(name="Page Div")
+        transport = Transport.objects.create(name="Bus")
+        stay = Stay.objects.create(name="H")
+        self.user = User.objects.create_user(email='pager@example.com', username='pager', password='pw')
+
+        self.tours = []
+        for i in range(7):
+            tour = Tour.objects.create(
+                title=f"Page Tour {i}",
+                slug=f"page-tour-{i}",
+                division=division,
+                transport=transport,
+                stay=stay,
+                duration_days=1, duration_nights=0,
+                # Deliberate ties so the id tie-breaker is exercised.
+                total_cost=1000, upfront_payment=100 * (i % 3),
+                max_capacity=10,
+                start_datetime=timezone.now() + timedelta(days=10 - i),
+                booking_deadline=timezone.now() + timedelta(days=5),
+                meeting_point="P", meeting_time="10:00",
+            )
+            self.tours.append(tour)
+
+        TourBooking.objects.create(tour=self.tours[2], user=self.user, status="paid", seats=8)
+        TourBooking.objects.create(
+            tour=self.tours[4],
+            user=User.objects.create_user(email='pager2@example.com', username='pager2', password='pw'),
+            status="pending",
+            seats=10,
+        )
+
+    def walk(self, sort):
+        url = f"{reverse('tour-list')}?sort={sort}&page_size=3"
+        slugs = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            slugs += [t['slug'] for t in response.data['results']]
+            url = response.data['next']
+        return slugs
+
+    def test_every_sort_pages_through_all_rows_once(self):
+        for sort in ("newest", "starting_soon", "price_low", "top_rated"):
+            slugs = self.walk(sort)
+            self.assertEqual(len(slugs), 7, sort)
+            self.assertEqual(len(set(slugs)), 7, sort)
+
+    def test_sort_orders(self):
+        self.assertEqual(self.walk("newest"), [t.slug for t in reversed(self.tours)])
+        self.assertEqual(self.walk("starting_soon"), [t.slug for t in reversed(self.tours)])
+
+        prices = [
+            Tour.objects.get(slug=slug).upfront_payment
+            for slug in self.walk("price_low")
+        ]
+        self.assertEqual(prices, sorted(prices))
+
+    def test_almost_full_excludes_full_tours(self):
+        slugs = self.walk("almost_full")
+        self.assertEqual(slugs[0], self.tours[2].slug)
+        self.assertNotIn(self.tours[4].slug, slugs)
+        self.assertEqual(len(slugs), 6)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{reverse('tour-list')}?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_from_another_sort_or_tampered(self):
+        url = reverse('tour-list')
+        newest = self.client.get(f"{url}?sort=newest&page_size=3").data['next']
+        cursor = newest.split("cursor=")[1].split("&")[0]
+
+        response = self.client.get(f"{url}?sort=price_low&page_size=3&cursor={cursor}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        def token(payload):
+            raw = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            return raw.rstrip("=")
+
+        for payload in (
+            {"sort": "price_low", "position": ["cheap", "not-a-uuid"]},
+            {"sort": "price_low", "position": [10, None]},
+            {"sort": "price_low", "position": [10]},
+            ["10", "not-a-uuid"],
+        ):
+            response = self.client.get(f"{url}?sort=price_low&cursor={token(payload)}")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, payload)
+
+
+class TourDetailQueryCountTests(APITestCase):
+    def setUp(self):
+        self.guide = TourGuide.objects.create(
+            user=User.objects.create_user(email='guide@example.com', username='guide', password='pw'),
+            rating=4.5,
+        )
+        self.transport = Transport.objects.create(name="Bus")
+        TransportReview.objects.create(transport=self.transport, user=self.guide.user, rating=4)
+        self.tour = Tour.objects.create(
+            title="Detail Tour",
+            slug="detail-tour",
+            division=Division.objects.create(name="Detail Div"),
+            transport=self.transport,
+            stay=Stay.objects.create(name="H"),
+            duration_days=3, duration_nights=2,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() + timedelta(days=2),
+            meeting_point="P", meeting_time="10:00",
+            tour_lead=self.guide,
+        )
+        self.url = reverse('tour-detail', kwargs={'slug': self.tour.slug}) + '?expand=tour_plan,tour_lead'
+
+    def add_itinerary(self, size):
+        start = self.tour.days.count()
+        for d in range(start + 1, start + size + 1):
+            day = TourDay.objects.create(tour=self.tour, day_number=d, title=f"Day {d}")
+            for a in range(size):
+                TourDayActivity.objects.create(day=day, title=f"Activity {a}", order=a)
+            TourImage.objects.create(tour=self.tour, image=f"sample_{d}")
+            TourInclusion.objects.create(tour=self.tour, title=f"In {d}", is_included=True)
+            TourInclusion.objects.create(tour=self.tour, title=f"Out {d}", is_included=False)
+
+    def test_query_count_is_independent_of_itinerary_size(self):
+        # Validator row + main query + images + days + activities + inclusions.
+        for size in (1, 4):
+            self.add_itinerary(size)
+            cache.clear()
+            reference_data()  # a warm process; see TourReferenceDataTests
+            with self.assertNumQueries(6):
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(len(response.data['tour_plan']), 5)
+        self.assertEqual(len(response.data['included']), 5)
+        self.assertEqual(len(response.data['not_included']), 5)
+        self.assertEqual(response.data['tour_lead']['tours_completed'], 1)
+        self.assertEqual(response.data['transport']['rating'], 4)
+
+
+class TourDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.booker = User.objects.create_user(email='booker@example.com', username='booker', password='pw')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='pw')
+        self.tour = Tour.objects.create(
+            title="Cached Tour",
+            slug="cached-tour",
+            division=Division.objects.create(name="Cache Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            max_capacity=10,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() + timedelta(days=2),
+            meeting_point="P", meeting_time="10:00",
+        )
+        self.day = TourDay.objects.create(tour=self.tour, day_number=1, title="Arrival")
+        self.url = reverse('tour-detail', kwargs={'slug': self.tour.slug}) + '?expand=tour_plan'
+
+    def test_cache_hit_costs_one_query(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['tour_plan'][0]['title'], "Arrival")
+
+    def test_is_booked_and_counters_are_live(self):
+        TourBooking.objects.create(tour=self.tour, user=self.booker, status="paid", seats=3)
+
+        self.client.force_authenticate(user=self.booker)
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_booked'])
+        self.assertEqual(response.data['joined_count'], 3)
+
+        TourBooking.objects.create(tour=self.tour, user=self.other, status="pending", seats=2)
+
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_booked'])
+        self.assertEqual(response.data['joined_count'], 5)
+        self.assertEqual(response.data['spots_remaining'], 5)
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertFalse(response.data.get('is_booked', False))
+
+    def test_itinerary_edit_invalidates_payload(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.day.title = "Departure"
+            self.day.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['tour_plan'][0]['title'], "Departure")
+
+    def test_deactivated_tour_is_not_served_from_cache(self):
+        self.client.get(self.url)
+        Tour.objects.filter(pk=self.tour.pk).update(is_active=False)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TourConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='etag@example.com', username='etag', password='pw')
+        self.tour = Tour.objects.create(
+            title="Etag Tour",
+            slug="etag-tour",
+            division=Division.objects.create(name="Etag Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            # Past deadline: no time_left, so validators don't roll over each minute.
+            booking_deadline=timezone.now() - timedelta(days=1),
+            meeting_point="P", meeting_time="10:00",
+        )
+        self.urls = [
+            reverse('tour-list'),
+            reverse('tour-detail', kwargs={'slug': self.tour.slug}),
+        ]
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', response)
+
+            with self.assertNumQueries(1):
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        detail = self.client.get(self.urls[1])
+        cached = self.client.get(self.urls[1], HTTP_IF_MODIFIED_SINCE=detail['Last-Modified'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_has_no_last_modified(self):
+        response = self.client.get(self.urls[0])
+        self.assertNotIn('Last-Modified', response)
+
+        # Deactivating a tour moves no timestamp; the ETag still sees it.
+        etag = response['ETag']
+        Tour.objects.filter(pk=self.tour.pk).update(is_active=False)
+        for headers in (
+            {"HTTP_IF_MODIFIED_SINCE": http_date(time.time() + 3600)},
+            {"HTTP_IF_NONE_MATCH": etag},
+        ):
+            response = self.client.get(self.urls[0], **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['results'], [])
+
+    def test_booking_changes_the_validator(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+
+        TourBooking.objects.create(tour=self.tour, user=self.user, status="paid", seats=1)
+
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_validator_is_per_user(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+
+        self.client.force_authenticate(user=self.user)
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TourSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.dhaka = Division.objects.create(name="Dhaka")
+        self.khulna = Division.objects.create(name="Khulna")
+        self.bus = Transport.objects.create(name="Bus")
+        self.boat = Transport.objects.create(name="Boat")
+        self.hotel = Stay.objects.create(name="Hotel")
+
+        def make(slug, division, transport, days, price, start_in):
+            return Tour.objects.create(
+                title=slug, slug=slug,
+                division=division, transport=transport, stay=self.hotel,
+                duration_days=days, duration_nights=days - 1,
+                total_cost=price * 2, upfront_payment=price,
+                start_datetime=timezone.now() + timedelta(days=start_in),
+                booking_deadline=timezone.now() + timedelta(days=1),
+                meeting_point="P", meeting_time="10:00",
+            )
+
+        make("dhaka-bus", self.dhaka, self.bus, 2, 100, 10)
+        make("dhaka-boat", self.dhaka, self.boat, 3, 300, 20)
+        make("khulna-boat", self.khulna, self.boat, 3, 500, 30)
+        self.url = reverse('tour-search')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def facet(self, data, name):
+        return {item['name']: item['count'] for item in data['facets'][name]}
+
+    def test_filters(self):
+        data = self.search(division=str(self.dhaka.id))
+        self.assertEqual({t['slug'] for t in data['results']}, {"dhaka-bus", "dhaka-boat"})
+
+        data = self.search(min_price="200", max_price="400")
+        self.assertEqual([t['slug'] for t in data['results']], ["dhaka-boat"])
+
+        data = self.search(
+            start_after=(timezone.now() + timedelta(days=15)).isoformat(),
+            min_days=3,
+        )
+        self.assertEqual({t['slug'] for t in data['results']}, {"dhaka-boat", "khulna-boat"})
+
+    def test_facets_exclude_their_own_filter(self):
+        data = self.search(division=str(self.dhaka.id), transport=str(self.boat.id))
+        self.assertEqual([t['slug'] for t in data['results']], ["dhaka-boat"])
+
+        # Divisions are counted with only the transport filter applied, and vice versa.
+        self.assertEqual(self.facet(data, 'division'), {"Dhaka": 1, "Khulna": 1})
+        self.assertEqual(self.facet(data, 'transport'), {"Bus": 1, "Boat": 1})
+        self.assertEqual(data['facets']['duration_days'], [{"value": 3, "count": 1}])
+        self.assertEqual(data['facets']['price'], {"min": "300.00", "max": "300.00"})
+
+    def test_facets_use_one_query(self):
+        with self.assertNumQueries(1):
+            facets = tour_facets(
+                Tour.objects.filter(is_active=True), {"division": [self.dhaka.id]}
+            )
+        self.assertEqual(self.facet({'facets': facets}, 'stay'), {"Hotel": 2})
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {"min_price": "500", "max_price": "100"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"division": "not-a-uuid"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+class TourTextSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tour = Tour.objects.create(
+                title="Sundarbans Explorer",
+                slug="sundarbans-explorer",
+                division=Division.objects.create(name="Khulna"),
+                transport=Transport.objects.create(name="Boat"),
+                stay=Stay.objects.create(name="Houseboat"),
+                duration_days=3, duration_nights=2,
+                total_cost=100, upfront_payment=50,
+                start_datetime=timezone.now() + timedelta(days=5),
+                booking_deadline=timezone.now() + timedelta(days=2),
+                meeting_point="Mongla Port", meeting_time="10:00",
+            )
+            Tour.objects.create(
+                title="Tea Gardens",
+                slug="tea-gardens",
+                division=Division.objects.create(name="Sylhet"),
+                transport=self.tour.transport,
+                stay=self.tour.stay,
+                duration_days=2, duration_nights=1,
+                total_cost=100, upfront_payment=50,
+                start_datetime=timezone.now() + timedelta(days=5),
+                booking_deadline=timezone.now() + timedelta(days=2),
+                meeting_point="Sreemangal", meeting_time="10:00",
+            )
+        self.url = reverse('tour-text-search')
+
+    def slugs(self, q):
+        response = self.client.get(self.url, {"q": q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['mode'], [t['slug'] for t in response.data['results']]
+
+    def test_matches_title_location_and_meeting_point(self):
+        self.assertEqual(self.slugs("sundarbans"), ("fulltext", ["sundarbans-explorer"]))
+        self.assertEqual(self.slugs("khulna"), ("fulltext", ["sundarbans-explorer"]))
+        self.assertEqual(self.slugs("sreemangal"), ("fulltext", ["tea-gardens"]))
+
+    def test_itinerary_changes_refresh_the_document(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            day = TourDay.objects.create(tour=self.tour, day_number=1, title="Into the mangroves")
+            TourDayActivity.objects.create(day=day, title="Crocodile spotting")
+
+        self.assertEqual(self.slugs("crocodiles"), ("fulltext", ["sundarbans-explorer"]))
+        self.assertEqual(self.slugs("mangroves")[1], ["sundarbans-explorer"])
+
+    def test_trigram_fallback_for_typos(self):
+        self.assertEqual(self.slugs("sundarbns"), ("trigram", ["sundarbans-explorer"]))
+
+    def test_query_is_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TourReferenceDataTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.division = Division.objects.create(name="Khulna")
+        self.district = District.objects.create(division=self.division, name="Bagerhat")
+        self.upazila = Upazila.objects.create(district=self.district, name="Mongla")
+        District.objects.create(division=self.division, name="Closed", is_active=False)
+        self.transport = Transport.objects.create(name="Boat", icon="boat")
+        self.stay = Stay.objects.create(name="Houseboat")
+        self.tour = Tour.objects.create(
+            title="Reference Tour",
+            slug="reference-tour",
+            division=self.division,
+            district=self.district,
+            upazila=self.upazila,
+            transport=self.transport,
+            stay=self.stay,
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() - timedelta(days=1),
+            meeting_point="P", meeting_time="10:00",
+        )
+
+    def test_snapshot_is_reused_until_the_version_moves(self):
+        snapshot = reference_data()
+        with self.assertNumQueries(0):
+            self.assertIs(reference_data(), snapshot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.district.name = "Bagerhat Sadar"
+            self.district.save()
+
+        reloaded = reference_data()
+        self.assertIsNot(reloaded, snapshot)
+        self.assertEqual(
+            reloaded.location_text(self.division.pk, self.district.pk, self.upazila.pk),
+            "Khulna, Bagerhat Sadar, Mongla",
+        )
+
+    def test_unknown_id_reloads_the_snapshot(self):
+        snapshot = reference_data()
+        # Committed, but the version bump has not landed yet.
+        stay = Stay.objects.create(name="Resort")
+        self.assertIsNot(reference_data(stays=stay.pk), snapshot)
+        self.assertEqual(reference_data().name("stays", stay.pk), "Resort")
+
+    def test_list_and_detail_names_come_from_the_snapshot(self):
+        reference_data()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tour-list'))
+        for query in queries.captured_queries:
+            self.assertNotIn('"tours_division"', query['sql'])
+            self.assertNotIn('"tours_upazila"', query['sql'])
+        self.assertEqual(response.data['results'][0]['location_text'], "Khulna, Bagerhat, Mongla")
+
+        response = self.client.get(reverse('tour-detail', kwargs={'slug': self.tour.slug}))
+        self.assertEqual(response.data['location_text'], "Khulna, Bagerhat, Mongla")
+        self.assertEqual(response.data['transport']['name'], "Boat")
+        self.assertEqual(response.data['stay']['name'], "Houseboat")
+
+    def test_locations_tree_with_etag(self):
+        url = reverse('tour-locations')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['divisions'], [{
+            "id": self.division.pk,
+            "name": "Khulna",
+            "districts": [{
+                "id": self.district.pk,
+                "name": "Bagerhat",
+                "upazilas": [{"id": self.upazila.pk, "name": "Mongla"}],
+            }],
+        }])
+        self.assertIn(
+            {"id": self.transport.pk, "name": "Boat", "icon": "boat"},
+            response.data['transports'],
+        )
+
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Upazila.objects.create(district=self.district, name="Rampal")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [u['name'] for u in response.data['divisions'][0]['districts'][0]['upazilas']],
+            ["Mongla", "Rampal"],
+        )
+
+
+class TourBookedSetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.booker = User.objects.create_user(email='set@example.com', username='set', password='pw')
+        self.other = User.objects.create_user(email='noset@example.com', username='noset', password='pw')
+        self.tour = Tour.objects.create(
+            title="Booked Set Tour",
+            slug="booked-set-tour",
+            division=Division.objects.create(name="Set Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() - timedelta(days=1),
+            meeting_point="P", meeting_time="10:00",
+        )
+        self.url = reverse('tour-list')
+        reference_data()
+
+    def is_booked(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        return [t['is_booked'] for t in response.data['results']]
+
+    def test_booking_changes_only_that_users_set(self):
+        self.assertEqual(self.is_booked(self.booker), [False])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = TourBooking.objects.create(
+                tour=self.tour, user=self.booker, status="pending", seats=1
+            )
+        self.assertEqual(self.is_booked(self.booker), [True])
+        self.assertEqual(self.is_booked(self.other), [False])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = "cancelled"
+            booking.save()
+        self.assertEqual(self.is_booked(self.booker), [False])
+
+    def test_list_page_is_shared_across_users(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TourBooking.objects.create(tour=self.tour, user=self.booker, status="paid", seats=1)
+        self.assertEqual(self.is_booked(self.booker), [True])
+
+        # Page from the shared cache: list aggregate + this user's bookings.
+        self.client.force_authenticate(user=self.other)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertFalse(response.data['results'][0]['is_booked'])
+
+        # Both warm: the list aggregate only.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['slug'], self.tour.slug)
+
+
+class TourImageVariantTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = Tour.objects.create(
+            title="Gallery Tour",
+            slug="gallery-tour",
+            featured_image="image/upload/v1/cover.jpg",
+            division=Division.objects.create(name="Gallery Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=1, duration_nights=0,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() - timedelta(days=1),
+            meeting_point="P", meeting_time="10:00",
+        )
+        for i in range(6):
+            TourImage.objects.create(tour=self.tour, image=f"image/upload/v1/photo_{i}.jpg")
+
+    def test_list_returns_card_variants_for_a_capped_preview(self):
+        response = self.client.get(reverse('tour-list'))
+        tour = response.data['results'][0]
+
+        self.assertEqual(len(tour['images']), TourListSerializer.gallery_preview_size)
+        self.assertEqual(len(tour['image_variants']), TourListSerializer.gallery_preview_size)
+
+        card = tour['featured_image_variants']['card']
+        self.assertEqual((card['width'], card['height']), (480, 360))
+        self.assertIn("w_480", card['url'])
+        self.assertIn("cover", card['url'])
+        self.assertIn(" 960w", card['srcset'])
+        self.assertEqual(set(tour['image_variants'][0]), {"card"})
+
+    def test_detail_returns_every_image_with_gallery_and_hero_sizes(self):
+        response = self.client.get(reverse('tour-detail', kwargs={'slug': self.tour.slug}))
+        self.assertEqual(len(response.data['images']), 6)
+        self.assertEqual(set(response.data['featured_image_variants']), {"card", "hero"})
+        self.assertEqual(len(response.data['image_variants']), 6)
+        gallery = response.data['image_variants'][0]['gallery']
+        self.assertIn("photo_", gallery['url'])
+        self.assertIn("c_limit", gallery['url'])
+        self.assertIsNone(gallery['height'])
+
+    def test_variants_are_memoized(self):
+        image = Tour.objects.get(pk=self.tour.pk).featured_image
+        first = image_variants(image, ("card",))
+        again = image_variants(Tour.objects.get(pk=self.tour.pk).featured_image, ["card"])
+        self.assertIs(first, again)
+        self.assertIsNone(image_variants(None, ("card",)))
+
+
+class TourListQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.division = Division.objects.create(name="Count Div")
+        self.transport = Transport.objects.create(name="Bus")
+        self.stay = Stay.objects.create(name="H")
+        self.url = reverse('tour-list')
+        self.count = 0
+        reference_data()
+
+    def add_tours(self, count, images=6):
+        for _ in range(count):
+            self.count += 1
+            tour = Tour.objects.create(
+                title=f"Tour {self.count}",
+                slug=f"count-tour-{self.count}",
+                division=self.division,
+                transport=self.transport,
+                stay=self.stay,
+                duration_days=1, duration_nights=0,
+                total_cost=100, upfront_payment=50,
+                start_datetime=timezone.now() + timedelta(days=5),
+                booking_deadline=timezone.now() - timedelta(days=1),
+                meeting_point="P", meeting_time="10:00",
+            )
+            TourImage.objects.bulk_create(
+                TourImage(tour=tour, image=f"image/upload/v1/count_{self.count}_{i}.jpg")
+                for i in range(images)
+            )
+
+    def get(self, **params):
+        # Each call differs in URL or tour count, so never hits a cached page.
+        return self.client.get(self.url, params)
+
+    def test_query_count_is_independent_of_page_size(self):
+        # List aggregate + page + one windowed image prefetch.
+        for tours, page_size in ((20, 20), (180, 100)):
+            self.add_tours(tours)
+            with self.assertNumQueries(3):
+                response = self.get(page_size=page_size)
+            results = response.data['results']
+            self.assertEqual(len(results), page_size)
+            self.assertTrue(all(
+                len(t['images']) == TourListSerializer.gallery_preview_size
+                for t in results
+            ))
+
+    def test_gallery_size_parameter_is_capped(self):
+        self.add_tours(2, images=12)
+
+        response = self.get(images=2)
+        self.assertEqual([len(t['images']) for t in response.data['results']], [2, 2])
+
+        response = self.get(images=50)
+        self.assertEqual([len(t['images']) for t in response.data['results']], [10, 10])
+
+        with self.assertNumQueries(2):
+            response = self.get(images=0)
+        self.assertEqual([t['image_variants'] for t in response.data['results']], [[], []])
+
+
+class TourFastListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        users = [
+            User.objects.create_user(email=f'fast{i}@example.com', username=f'fast{i}', password='pw')
+            for i in range(3)
+        ]
+        division = Division.objects.create(name="Khulna")
+        district = District.objects.create(division=division, name="Bagerhat")
+        upazila = Upazila.objects.create(district=district, name="Mongla")
+        transport = Transport.objects.create(name="Bus")
+        stay = Stay.objects.create(name="H")
+
+        self.tours = []
+        for i, (place, image, deadline) in enumerate([
+            ({}, "image/upload/v3/cover.jpg", timedelta(days=2, hours=5, minutes=7)),
+            ({"district": district}, None, timedelta(days=-1)),
+            ({"district": district, "upazila": upazila}, "plain_id", timedelta(minutes=90)),
+        ]):
+            tour = Tour.objects.create(
+                title=f"Fast Tour {i}",
+                slug=f"fast-tour-{i}",
+                featured_image=image,
+                division=division,
+                transport=transport,
+                stay=stay,
+                duration_days=i + 1, duration_nights=i,
+                total_cost="1234.50", upfront_payment=f"{i}99.99",
+                max_capacity=0 if i == 2 else 16,
+                start_datetime=timezone.now() + timedelta(days=5),
+                booking_deadline=timezone.now() + deadline,
+                meeting_point="P", meeting_time="10:00",
+                **place,
+            )
+            TourImage.objects.bulk_create(
+                TourImage(tour=tour, image=f"image/upload/v1/fast_{i}_{n}.jpg")
+                for n in range(i * 3)
+            )
+            self.tours.append(tour)
+
+        TourBooking.objects.create(tour=self.tours[0], user=users[0], status="paid", seats=3)
+        TourBooking.objects.create(tour=self.tours[0], user=users[1], status="pending", seats=2)
+        for user, rating in zip(users, (5, 4, 4)):
+            TourReview.objects.create(tour=self.tours[0], user=user, rating=rating)
+        TourReview.objects.create(tour=self.tours[2], user=users[0], rating=3)
+
+    def render_both(self, context):
+        qs = (
+            Tour.objects.filter(is_active=True)
+            .annotate(**stats_annotations())
+            .order_by("-created_at", "-id")
+        )
+        slow = TourListSerializer(qs, many=True, context=context).data
+        fast = serialize_tour_rows(list(qs.values(*TOUR_LIST_VALUES)), context)
+        return JSONRenderer().render(slow), JSONRenderer().render(fast)
+
+    def test_fast_list_matches_serializer(self):
+        now = timezone.now()
+        with patch("django.utils.timezone.now", return_value=now):
+            for size in (0, 2, 4, 10):
+                context = {
+                    "booked_tour_ids": frozenset({self.tours[1].pk}),
+                    "gallery_preview_size": size,
+                }
+                slow, fast = self.render_both(context)
+                self.assertEqual(slow, fast)
+
+            slow, fast = self.render_both({})
+            self.assertEqual(slow, fast)
+        self.assertIn(b'"rating":"4.33"', fast)
+        self.assertIn(b'"location_text":"Khulna, Bagerhat, Mongla"', fast)
+
+    def test_sparse_fields_match_serializer(self):
+        fields = frozenset({"id", "title", "images", "location_text", "rating"})
+        context = {"fields": fields}
+        qs = (
+            Tour.objects.filter(is_active=True)
+            .annotate(**stats_annotations())
+            .order_by("-created_at", "-id")
+        )
+        slow = TourListSerializer(qs, many=True, context=context).data
+        fast = serialize_tour_rows(list(qs.values(*list_values(fields))), context)
+        self.assertEqual(JSONRenderer().render(slow), JSONRenderer().render(fast))
+        self.assertEqual(list(fast[0]), ["id", "title", "images", "location_text", "rating"])
+
+    def test_list_view_uses_the_fast_path(self):
+        response = self.client.get(reverse('tour-list'), {"page_size": 2})
+        self.assertEqual(
+            [t['slug'] for t in response.data['results']],
+            ["fast-tour-2", "fast-tour-1"],
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual([t['slug'] for t in response.data['results']], ["fast-tour-0"])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_tour_list", "--repeat", "2", stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+
+
+class TourFieldSelectionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.guide = TourGuide.objects.create(
+            user=User.objects.create_user(email='lead@example.com', username='lead', password='pw'),
+            rating=4.5,
+        )
+        self.tour = Tour.objects.create(
+            title="Sparse Tour",
+            slug="sparse-tour",
+            division=Division.objects.create(name="Sparse Div"),
+            transport=Transport.objects.create(name="Bus"),
+            stay=Stay.objects.create(name="H"),
+            duration_days=2, duration_nights=1,
+            total_cost=100, upfront_payment=50,
+            start_datetime=timezone.now() + timedelta(days=5),
+            booking_deadline=timezone.now() + timedelta(days=2),
+            meeting_point="P", meeting_time="10:00",
+            tour_lead=self.guide,
+        )
+        TourImage.objects.create(tour=self.tour, image="image/upload/v1/sparse.jpg")
+        TourDay.objects.create(tour=self.tour, day_number=1, title="Arrival")
+        self.list_url = reverse('tour-list')
+        self.detail_url = reverse('tour-detail', kwargs={'slug': self.tour.slug})
+        reference_data()
+
+    def test_list_fields_prune_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {"fields": "title,slug"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ["id", "title", "slug"])
+
+        # List aggregate + page: no stats join, no image prefetch.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("tours_tourstats", queries[-1]['sql'])
+
+        response = self.client.get(self.list_url, {"fields": "slug", "page_size": 5})
+        self.assertEqual(response.data['results'], [{"id": str(self.tour.pk), "slug": "sparse-tour"}])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.list_url, {"fields": "title,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", str(response.data['fields']))
+
+        response = self.client.get(self.detail_url, {"expand": "title"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expand", response.data)
+
+    def test_nested_blocks_are_opt_in(self):
+        response = self.client.get(self.detail_url)
+        self.assertNotIn('tour_plan', response.data)
+        self.assertNotIn('tour_lead', response.data)
+        self.assertEqual(response.data['transport']['name'], "Bus")
+
+        response = self.client.get(self.detail_url, {"expand": "tour_plan,tour_lead"})
+        self.assertEqual(response.data['tour_plan'][0]['title'], "Arrival")
+        self.assertEqual(response.data['tour_lead']['tours_completed'], 1)
+
+        response = self.client.get(self.detail_url, {"fields": "title,tour_plan"})
+        self.assertEqual(list(response.data), ["id", "title", "tour_plan"])
+
+    def test_detail_fields_prune_the_query(self):
+        # Validator row + main query; no prefetches or subqueries.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url, {"fields": "title,joined_count"})
+        self.assertEqual(response.data, {"id": str(self.tour.pk), "title": "Sparse Tour", "joined_count": 0})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("tours_tourimage", queries[-1]['sql'])
+        self.assertNotIn("guides_tourguide", queries[-1]['sql'])
+
+    def test_each_selection_is_cached_separately(self):
+        self.client.get(self.detail_url)
+        self.client.get(self.detail_url, {"fields": "title"})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, {"fields": "title"})
+        self.assertEqual(list(response.data), ["id", "title"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url)
+        self.assertIn('image_variants', response.data)
+
+    def test_etag_depends_on_the_selection(self):
+        full = self.client.get(self.detail_url)
+        sparse = self.client.get(self.detail_url, {"fields": "title"})
+        self.assertNotEqual(full['ETag'], sparse['ETag'])
+
+
+class TourFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='feed@example.com', username='feed', password='pw')
+        division = Division.objects.create(name="Feed Div")
+        transport = Transport.objects.create(name="Bus")
+        stay = Stay.objects.create(name="H")
+        now = timezone.now()
+
+        self.tours = {}
+        for slug, start, deadline, capacity in [
+            ("soon", timedelta(days=2), timedelta(hours=20), 10),
+            ("later", timedelta(days=30), timedelta(days=20), 12),
+            ("tight", timedelta(days=10), timedelta(days=5), 4),
+            ("closed", timedelta(days=3), timedelta(hours=-1), 10),
+        ]:
+            self.tours[slug] = Tour.objects.create(
+                title=f"Feed {slug}",
+                slug=f"feed-{slug}",
+                division=division,
+                transport=transport,
+                stay=stay,
+                duration_days=1, duration_nights=0,
+                total_cost=100, upfront_payment=50,
+                max_capacity=capacity,
+                start_datetime=now + start,
+                booking_deadline=now + deadline,
+                meeting_point="P", meeting_time="10:00",
+            )
+        TourBooking.objects.create(tour=self.tours["tight"], user=self.user, status="paid", seats=3)
+        TourReview.objects.create(tour=self.tours["later"], user=self.user, rating=5)
+        TourReview.objects.create(tour=self.tours["soon"], user=self.user, rating=3)
+        reference_data()
+        self.url = reverse('tour-feed')
+
+    def sections(self, response):
+        return {
+            section['key']: [t['slug'].removeprefix("feed-") for t in section['results']]
+            for section in response.data['sections']
+        }
+
+    def test_sections_are_ranked(self):
+        build_tour_feed()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.sections(response), {
+            "starting_soon": ["soon", "tight", "later"],
+            "almost_full": ["tight", "soon", "later"],
+            "top_rated": ["later", "soon"],
+            "new": ["tight", "later", "soon"],
+            "closing_soon": ["soon"],
+        })
+
+    def test_request_path_reads_the_cache(self):
+        self.client.get(self.url)  # no feed yet: built on the spot
+
+        # One live row per tour; rankings and cards come from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['sections']), 5)
+
+    def test_items_match_the_tour_list(self):
+        now = timezone.now()
+        with patch("django.utils.timezone.now", return_value=now):
+            self.client.force_authenticate(user=self.user)
+            feed = self.client.get(self.url).data
+            listed = {t['slug']: t for t in self.client.get(reverse('tour-list')).data['results']}
+
+        for section in feed['sections']:
+            for item in section['results']:
+                self.assertEqual(JSONRenderer().render(item), JSONRenderer().render(listed[item['slug']]))
+        self.assertTrue(listed['feed-tight']['is_booked'])
+
+    def test_live_fields_without_a_rebuild(self):
+        build_tour_feed()
+        self.client.get(self.url)
+
+        other = User.objects.create_user(email='feed2@example.com', username='feed2', password='pw')
+        TourBooking.objects.create(tour=self.tours["soon"], user=other, status="pending", seats=2)
+        Tour.objects.filter(pk=self.tours["later"].pk).update(is_active=False)
+
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        soon = response.data['sections'][0]['results'][0]
+        self.assertEqual((soon['slug'], soon['joined_count'], soon['is_booked']), ("feed-soon", 2, True))
+        self.assertNotIn("later", self.sections(response)["new"])
+
+
+@skipIf(similar.np is None, "NumPy is not installed")
+class TourSimilarToursTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.dhaka = Division.objects.create(name="Dhaka")
+        self.khulna = Division.objects.create(name="Khulna")
+        self.bus = Transport.objects.create(name="Bus")
+        self.boat = Transport.objects.create(name="Boat")
+        self.stay = Stay.objects.create(name="H")
+        reference_data()
+
+    def tour(self, slug, division, transport, days, cost, month=3):
+        start = timezone.now().replace(month=month, day=10) + timedelta(days=365)
+        return Tour.objects.create(
+            title=slug.title(),
+            slug=slug,
+            division=division,
+            transport=transport,
+            stay=self.stay,
+            duration_days=days, duration_nights=days - 1,
+            total_cost=cost, upfront_payment=cost / 2,
+            start_datetime=start,
+            booking_deadline=start - timedelta(days=3),
+            meeting_point="P", meeting_time="10:00",
+        )
+
+    def test_neighbours_follow_the_features(self):
+        self.tour("city-walk", self.dhaka, self.bus, 2, 3000)
+        self.tour("city-food", self.dhaka, self.bus, 2, 3500)
+        self.tour("city-night", self.dhaka, self.bus, 3, 4000, month=4)
+        self.tour("river-cruise", self.khulna, self.boat, 7, 60000, month=11)
+        self.tour("mangrove", self.khulna, self.boat, 6, 50000, month=12)
+
+        self.assertEqual(build_similar_tours(), 5)
+        slugs = lambda slug: [t['slug'] for t in similar_tours(Tour.objects.get(slug=slug).pk)]
+
+        self.assertEqual(slugs("city-walk")[:2], ["city-food", "city-night"])
+        self.assertEqual(slugs("river-cruise")[0], "mangrove")
+        self.assertNotIn("city-walk", slugs("city-walk"))
+
+    def test_blocked_search_matches_a_full_sort(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.random((600, 12), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        scores = matrix @ matrix.T
+        np.fill_diagonal(scores, -np.inf)
+        expected = np.argsort(-scores, axis=1)[:, :5]
+        self.assertTrue((similar.nearest_neighbours(matrix, 5) == expected).all())
+
+    def test_detail_serves_the_latest_neighbours(self):
+        walk = self.tour("city-walk", self.dhaka, self.bus, 2, 3000)
+        self.tour("city-food", self.dhaka, self.bus, 2, 3500)
+        url = reverse('tour-detail', kwargs={'slug': walk.slug})
+
+        first = self.client.get(url)
+        self.assertEqual(first.data['similar_tours'], [])
+
+        build_similar_tours()
+        response = self.client.get(url)
+        self.assertEqual([t['slug'] for t in response.data['similar_tours']], ["city-food"])
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_deactivated_neighbours_drop_out_before_the_next_build(self):
+        walk = self.tour("city-walk", self.dhaka, self.bus, 2, 3000)
+        food = self.tour("city-food", self.dhaka, self.bus, 2, 3500)
+        self.tour("city-night", self.dhaka, self.bus, 3, 4000, month=4)
+        build_similar_tours()
+        url = reverse('tour-detail', kwargs={'slug': walk.slug})
+        before = self.client.get(url)
+        self.assertIn("city-food", [t['slug'] for t in before.data['similar_tours']])
+
+        food.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            food.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['slug'] for t in response.data['similar_tours']], ["city-night"])
+        self.assertNotIn('joined_count', response.data['similar_tours'][0])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_similar_tours", "--tours", "300", "--repeat", "1", stdout=out)
+        self.assertIn("neighbours", out.getvalue())
+
+
+def seat_tour(slug, capacity):
+    return Tour.objects.create(
+        title="Seat Tour",
+        slug=slug,
+        division=Division.objects.create(name=f"{slug} div"),
+        transport=Transport.objects.create(name="Bus"),
+        stay=Stay.objects.create(name="H"),
+        duration_days=1, duration_nights=0,
+        total_cost=100, upfront_payment=50,
+        max_capacity=capacity,
+        start_datetime=timezone.now() + timedelta(days=5),
+        booking_deadline=timezone.now() + timedelta(days=2),
+        meeting_point="P", meeting_time="10:00",
+    )
+
+
+class TourSeatReservationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("seat-tour", capacity=3)
+        self.users = [
+            User.objects.create_user(email=f'seat{i}@example.com', username=f'seat{i}', password='pw')
+            for i in range(3)
+        ]
+
+    def draft(self, user, seats=1):
+        return TourBooking.objects.create(tour=self.tour, user=user, seats=seats)
+
+    def stats(self):
+        return TourStats.objects.get(tour=self.tour)
+
+    def test_reserve_until_full(self):
+        first = reserve_seats(self.draft(self.users[0], seats=2), "pending")
+        self.assertEqual(first.status, "pending")
+
+        with self.assertRaises(SeatsUnavailable) as raised:
+            reserve_seats(self.draft(self.users[1], seats=2), "pending")
+        self.assertEqual(raised.exception.seats_remaining, 1)
+
+        # Held seats count towards the booking.
+        self.assertEqual(reserve_seats(first, "paid").status, "paid")
+        self.assertEqual(
+            (self.stats().confirmed_seats, self.stats().pending_seats, self.stats().seats_remaining),
+            (2, 0, 1),
+        )
+
+        with self.assertRaises(BookingStateConflict):
+            reserve_seats(first, "pending", from_statuses=("draft",))
+        with self.assertRaises(ValueError):
+            reserve_seats(first, "cancelled")
+
+    def test_confirm_view_answers_409_when_full(self):
+        TourBooking.objects.create(tour=self.tour, user=self.users[0], seats=3, status="paid")
+        booking = self.draft(self.users[1])
+
+        self.client.force_authenticate(user=self.users[1])
+        url = reverse('confirm-booking', kwargs={'booking_id': booking.pk})
+        response = self.client.post(url, {"accepted_terms": True})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['seats_remaining'], 0)
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "draft")
+
+        response = self.client.post(reverse('join-tour', kwargs={'slug': self.tour.slug}), {})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_join_on_a_full_tour_leaves_no_draft(self):
+        TourBooking.objects.create(tour=self.tour, user=self.users[0], seats=3, status="paid")
+        self.client.force_authenticate(user=self.users[1])
+        url = reverse('join-tour', kwargs={'slug': self.tour.slug})
+
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(response.data['waitlist'])
+        self.assertFalse(TourBooking.objects.filter(user=self.users[1]).exists())
+
+    def test_join_without_a_stats_row(self):
+        TourStats.objects.filter(tour=self.tour).delete()
+        self.client.force_authenticate(user=self.users[1])
+
+        response = self.client.post(reverse('join-tour', kwargs={'slug': self.tour.slug}), {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stats().seats_remaining, 3)
+
+    def test_confirm_view_reserves_seats(self):
+        booking = self.draft(self.users[0])
+        self.client.force_authenticate(user=self.users[0])
+        url = reverse('confirm-booking', kwargs={'booking_id': booking.pk})
+
+        response = self.client.post(url, {"accepted_terms": True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], "pending")
+        self.assertTrue(response.data['booking_reference'])
+        self.assertEqual(self.stats().pending_seats, 1)
+
+        response = self.client.post(url, {"accepted_terms": True})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_form_checks_capacity(self):
+        TourBooking.objects.create(tour=self.tour, user=self.users[0], seats=2, status="pending")
+        data = {"tour": self.tour.pk, "user": self.users[1].pk, "seats": 2, "status": "paid"}
+
+        form = TourBookingAdminForm(data=data)
+        self.assertFalse(form.is_valid())
+        self.assertIn("Only 1 seat(s) left", str(form.errors))
+
+        form = TourBookingAdminForm(data={**data, "seats": 1})
+        self.assertTrue(form.is_valid())
+
+
+@skipUnless(connection.vendor == "postgresql", "needs SELECT ... FOR UPDATE")
+class TourSeatReservationConcurrencyTests(TransactionTestCase):
+    capacity = 25
+    bookings = 200
+    threads = 32
+
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("rush-tour", capacity=self.capacity)
+        users = User.objects.bulk_create(
+            User(email=f'rush{i}@example.com', username=f'rush{i}', password='!')
+            for i in range(self.bookings)
+        )
+        self.drafts = TourBooking.objects.bulk_create(
+            TourBooking(tour=self.tour, user=user, seats=1 + i % 3)
+            for i, user in enumerate(users)
+        )
+
+    def run_concurrently(self, calls):
+        """
+        reserve_seats() for every (booking, status, from_statuses) on a
+        thread pool; returns the pks that got their seats. Any other error,
+        a deadlock included, fails the test.
+        """
+        calls = list(calls)
+        barrier = threading.Barrier(min(self.threads, len(calls)))
+        local = threading.local()
+
+        def run(call):
+            if not getattr(local, "started", False):
+                # Line every worker up before its first call.
+                local.started = True
+                barrier.wait(timeout=10)
+
+            booking, status, from_statuses = call
+            try:
+                reserve_seats(booking, status, from_statuses=from_statuses)
+                return booking.pk
+            except SeatsUnavailable:
+                return None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            return [pk for pk in pool.map(run, calls) if pk is not None]
+
+    def assert_counters_match_bookings(self):
+        stats = TourStats.objects.get(tour=self.tour)
+        held = TourBooking.objects.filter(tour=self.tour).aggregate(
+            pending=Coalesce(Sum("seats", filter=Q(status="pending")), 0),
+            paid=Coalesce(Sum("seats", filter=Q(status="paid")), 0),
+        )
+        self.assertEqual((stats.pending_seats, stats.confirmed_seats), (held["pending"], held["paid"]))
+        self.assertEqual(stats.seats_remaining, self.capacity - held["pending"] - held["paid"])
+        self.assertGreaterEqual(stats.seats_remaining, 0)
+        return stats
+
+    def test_concurrent_confirms_never_oversell(self):
+        reserved = self.run_concurrently(
+            (booking, "pending", ("draft",)) for booking in self.drafts
+        )
+        stats = self.assert_counters_match_bookings()
+        self.assertTrue(reserved)
+        # Every refused booking was bigger than what was left.
+        smallest_refused = min(b.seats for b in self.drafts if b.pk not in set(reserved))
+        self.assertLess(stats.seats_remaining, smallest_refused)
+
+        # Promotions never fail on capacity, even while the rest retry.
+        pending = [b for b in self.drafts if b.pk in set(reserved)]
+        rest = [b for b in self.drafts if b.pk not in set(reserved)]
+        calls = [(b, "paid", ("pending",)) for b in pending] + [(b, "pending", ("draft",)) for b in rest]
+        promoted = self.run_concurrently(calls)
+
+        self.assertEqual(set(promoted), set(reserved))
+        self.assertEqual(
+            TourBooking.objects.filter(tour=self.tour, status="paid").count(), len(reserved)
+        )
+        self.assert_counters_match_bookings()
+
+
+@override_settings(FLASH_SALE_REDIS_URL="")
+class TourFlashSaleTests(APITestCase):
+    """
+    Runs on the in-process store; TourFlashSaleRedisTests repeats it on
+    Redis when FLASH_SALE_TEST_REDIS_URL is set.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("flash-tour", capacity=3)
+        self.tour.flash_sale = True
+        self.tour.save()
+        self.users = [
+            User.objects.create_user(email=f'flash{i}@example.com', username=f'flash{i}', password='pw')
+            for i in range(3)
+        ]
+        self.store = flash.seat_store()
+
+    def draft(self, user, seats=1):
+        return TourBooking.objects.create(tour=self.tour, user=user, seats=seats)
+
+    def confirm(self, booking):
+        self.client.force_authenticate(user=booking.user)
+        url = reverse('confirm-booking', kwargs={'booking_id': booking.pk})
+        return self.client.post(url, {"accepted_terms": True})
+
+    def stats(self):
+        return TourStats.objects.get(tour=self.tour)
+
+    def test_confirms_hold_seats_until_reconciled(self):
+        first, second = self.draft(self.users[0]), self.draft(self.users[1], seats=2)
+        for booking in (first, second):
+            response = self.confirm(booking)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['status'], "pending")
+
+        # Postgres is untouched until the reconciler runs.
+        first.refresh_from_db()
+        self.assertEqual((first.status, self.stats().pending_seats), ("draft", 0))
+        self.assertEqual(self.store.seats_left(self.tour.pk), 0)
+
+        response = self.confirm(self.draft(self.users[2]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['seats_remaining'], 0)
+        self.assertEqual(self.confirm(first).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(reconcile_flash_sales(), 2)
+        first.refresh_from_db()
+        self.assertEqual(first.status, "pending")
+        self.assertTrue(first.booking_reference)
+        self.assertIsNotNone(first.confirmed_at)
+        self.assertEqual(self.stats().pending_seats, 3)
+        self.assertNotIn(str(self.tour.pk), self.store.pending_tours())
+
+    def test_reconcile_keeps_postgres_authoritative(self):
+        booking = self.draft(self.users[0], seats=2)
+        flash.hold_seats(booking, "FL-1", timezone.now())
+        # Seats sold outside the counter fill the tour first.
+        paid = TourBooking.objects.create(tour=self.tour, user=self.users[1], seats=2, status="paid")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_flash_sales()
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "rejected")
+        self.assertEqual(self.store.seats_left(self.tour.pk), 1)
+
+        # Cancellations reach the counter on the next run.
+        paid.status = "cancelled"
+        paid.save()
+        reconcile_flash_sales()
+        self.assertEqual(self.store.seats_left(self.tour.pk), 3)
+
+    def test_rejected_confirm_is_recorded_and_user_told(self):
+        booking = self.draft(self.users[0], seats=2)
+        self.assertEqual(self.confirm(booking).data['status'], "pending")
+        TourBooking.objects.create(tour=self.tour, user=self.users[1], seats=2, status="paid")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_flash_sales()
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "rejected")
+        self.assertEqual([m.to for m in mail.outbox], [[self.users[0].email]])
+        self.assertEqual(self.stats().seats_remaining, 1)
+
+        # Kept as a record rather than swept with the stale drafts.
+        self.assertEqual(drafts.expire_stale_drafts(ttl=-1)["swept"], 0)
+
+    def test_lost_counter_is_rebuilt_from_postgres_and_holds(self):
+        flash.hold_seats(self.draft(self.users[0]), "FL-1", timezone.now())
+        self.store.reset(self.tour.pk)
+        self.assertIsNone(self.store.seats_left(self.tour.pk))
+
+        # 3 in Postgres, less the hold not yet written.
+        self.assertEqual(flash.hold_seats(self.draft(self.users[1]), "FL-2", timezone.now()), 1)
+        with self.assertRaises(SeatsUnavailable):
+            flash.hold_seats(self.draft(self.users[2], seats=2), "FL-3", timezone.now())
+
+        self.assertEqual(reconcile_flash_sales(), 2)
+        self.assertEqual(self.stats().pending_seats, 2)
+
+    def test_concurrent_holds_never_oversell(self):
+        capacity, bookings = 25, 200
+        tour = seat_tour("flash-rush", capacity=capacity)
+        users = User.objects.bulk_create(
+            User(email=f'flashrush{i}@example.com', username=f'flashrush{i}', password='!')
+            for i in range(bookings)
+        )
+        drafts = TourBooking.objects.bulk_create(
+            TourBooking(tour=tour, user=user, seats=1 + i % 3) for i, user in enumerate(users)
+        )
+        # Loaded here: the workers' own connections cannot see this test's rows.
+        self.store.load(tour.pk, capacity)
+
+        def hold(booking):
+            try:
+                flash.hold_seats(booking, booking.pk.hex[:8], timezone.now())
+                return booking.seats
+            except SeatsUnavailable:
+                return 0
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            held = sum(pool.map(hold, drafts))
+
+        self.assertEqual(held + self.store.seats_left(tour.pk), capacity)
+        self.assertEqual(sum(h["seats"] for _, h in self.store.holds(tour.pk, bookings)), held)
+        # Every refused booking was bigger than what was left.
+        self.assertLess(self.store.seats_left(tour.pk), 3)
+
+        reconcile_flash_sales()
+        self.assertEqual(TourStats.objects.get(tour=tour).pending_seats, held)
+        self.assertEqual(self.store.seats_left(tour.pk), capacity - held)
+
+
+@override_settings(FLASH_SALE_REDIS_URL=settings.FLASH_SALE_TEST_REDIS_URL)
+class TourFlashSaleRedisTests(TourFlashSaleTests):
+    """
+    TourFlashSaleTests against the Lua scripts on a real Redis. Opt-in:
+    reconcile_flash_sales drains every held counter in the database, so
+    it only runs on FLASH_SALE_TEST_REDIS_URL.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        url = settings.FLASH_SALE_TEST_REDIS_URL
+        if flash.redis is None or not url:
+            raise SkipTest("FLASH_SALE_TEST_REDIS_URL is not set")
+        if url == settings.FLASH_SALE_REDIS_URL:
+            raise SkipTest("FLASH_SALE_TEST_REDIS_URL is the live flash-sale store")
+        try:
+            flash.redis.Redis.from_url(url, socket_connect_timeout=0.5).ping()
+        except flash.redis.RedisError:
+            raise SkipTest("Redis is not reachable")
+        super().setUpClass()
+
+    def tearDown(self):
+        for pk in Tour.objects.values_list("pk", flat=True):
+            self.store.client.delete(*self.store._keys(pk))
+            self.store.client.srem(self.store.pending_key, str(pk))
+
+
+@override_settings(WAITING_ROOM_ADMIT_RATE=2, WAITING_ROOM_ADMIT_INTERVAL=1)
+class TourWaitingRoomTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("queue-tour", capacity=10)
+        self.tour.waiting_room = True
+        self.tour.save()
+        self.users = [
+            User.objects.create_user(email=f'queue{i}@example.com', username=f'queue{i}', password='pw')
+            for i in range(4)
+        ]
+
+    def queue(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse('waiting-room-join', kwargs={'slug': self.tour.slug}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def poll(self, token):
+        self.client.force_authenticate(user=None)
+        return self.client.get(reverse('waiting-room-status'), {"token": token})
+
+    def test_admits_at_the_configured_rate(self):
+        tokens = [self.queue(user)["token"] for user in self.users]
+        self.assertEqual(self.queue(self.users[0])["token"], tokens[0])
+
+        status_ = self.poll(tokens[3]).data
+        self.assertEqual((status_["admitted"], status_["ahead"], status_["estimated_wait"]), (False, 3, 2))
+
+        waiting_room.admit(self.tour.pk, now=100.0)
+        self.assertEqual(waiting_room.admit(self.tour.pk, now=101.0), 2)
+        self.assertTrue(self.poll(tokens[1]).data["admitted"])
+        self.assertFalse(self.poll(tokens[2]).data["admitted"])
+
+        # A stalled run catches up by at most two intervals, and never
+        # past the last place handed out.
+        self.assertEqual(waiting_room.admit(self.tour.pk, now=200.0), 4)
+        self.assertTrue(self.poll(tokens[3]).data["admitted"])
+        self.assertEqual(admit_waiting_rooms(), {str(self.tour.pk): 4})
+
+    def test_status_endpoint_reads_no_database(self):
+        token = self.queue(self.users[0])["token"]
+        self.client.force_authenticate(user=None)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('waiting-room-status'), {"token": token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.poll(token[:-2] + "xx")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_booking_flow_needs_an_admission_pass(self):
+        url = reverse('join-tour', kwargs={'slug': self.tour.slug})
+        first = self.queue(self.users[0])
+        second = self.queue(self.users[1])
+        waiting_room.admit(self.tour.pk, now=0.0)
+        waiting_room.admit(self.tour.pk, now=0.5)
+        admission = self.poll(first["token"]).data["pass"]
+        self.assertFalse(self.poll(second["token"]).data["admitted"])
+
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(response.data["waiting_room"])
+
+        response = self.client.post(url, {}, HTTP_X_ADMISSION_PASS=admission)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        confirm = reverse('confirm-booking', kwargs={'booking_id': response.data["booking_id"]})
+        response = self.client.post(confirm, {"accepted_terms": True}, HTTP_X_ADMISSION_PASS=admission)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Passes are per user.
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.post(url, {}, HTTP_X_ADMISSION_PASS=admission)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_tours_without_a_waiting_room(self):
+        self.tour.waiting_room = False
+        self.tour.save()
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(reverse('waiting-room-join', kwargs={'slug': self.tour.slug}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('join-tour', kwargs={'slug': self.tour.slug}), {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TourBookingReferenceTests(APITestCase):
+    def test_scramble_is_a_permutation_over_millions(self):
+        count = 2_000_000
+        digits = [scramble(counter) for counter in range(count)]
+        self.assertEqual(len(set(digits)), count)
+        self.assertLess(max(digits), 10 ** 8)
+        # Neighbouring counters give unrelated digits.
+        close = sum(abs(a - b) < 1000 for a, b in zip(digits, digits[1:]))
+        self.assertLess(close, count // 1000)
+
+        with self.assertRaises(OverflowError):
+            scramble(10 ** 8)
+
+    def test_concurrent_allocation_from_blocks(self):
+        blocks = itertools.count(0, BLOCK_SIZE)
+        fetch_lock = threading.Lock()
+
+        def fetch_block():
+            with fetch_lock:
+                return next(blocks)
+
+        counters = CounterBlocks(fetch_block, BLOCK_SIZE)
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            batches = list(pool.map(lambda _: [counters.next() for _ in range(25_000)], range(16)))
+
+        allocated = [counter for batch in batches for counter in batch]
+        self.assertEqual(len(set(allocated)), len(allocated))
+        # Blocks are handed out whole: nothing is skipped but the tail of
+        # the last one.
+        self.assertLess(max(allocated), len(allocated) + BLOCK_SIZE * 16)
+
+    def test_confirm_uses_allocated_reference(self):
+        tour = seat_tour("ref-tour", capacity=5)
+        user = User.objects.create_user(email='ref@example.com', username='ref', password='pw')
+        booking = TourBooking.objects.create(tour=tour, user=user)
+
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse('confirm-booking', kwargs={'booking_id': booking.pk}), {"accepted_terms": True}
+        )
+        self.assertRegex(response.data['booking_reference'], r"^ST-\d{8}$")
+        self.assertNotEqual(booking.generate_reference(), response.data['booking_reference'])
+
+
+@skipUnless(connection.vendor == "postgresql", "needs the reference sequence")
+class TourBookingReferenceConcurrencyTests(TransactionTestCase):
+    def test_concurrent_allocation_from_the_sequence(self):
+        def allocate(_):
+            try:
+                return [allocate_reference("CON") for _ in range(2_000)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            references = [ref for batch in pool.map(allocate, range(16)) for ref in batch]
+        self.assertEqual(len(set(references)), len(references))
+
+
+@override_settings(DRAFT_BOOKING_TTL=60 * 60)
+class TourDraftSweepTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("sweep-tour", capacity=10)
+        self.users = [
+            User.objects.create_user(email=f'sweep{i}@example.com', username=f'sweep{i}', password='pw')
+            for i in range(6)
+        ]
+
+    def booking(self, user, status="draft", age=timedelta(hours=2)):
+        booking = TourBooking.objects.create(tour=self.tour, user=user, status=status, seats=2)
+        # created_at is auto_now_add.
+        TourBooking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - age)
+        return booking
+
+    def test_sweeps_stale_drafts_in_batches(self):
+        stale = [self.booking(user) for user in self.users[:4]]
+        fresh = self.booking(self.users[4], age=timedelta(minutes=5))
+        pending = self.booking(self.users[5], status="pending")
+        stats_before = TourStats.objects.filter(tour=self.tour).values().get()
+        version = booked_version(self.users[0].pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            metrics = drafts.expire_stale_drafts(batch_size=3, max_batches=1)
+        self.assertEqual(metrics, {"swept": 3, "batches": 1, "remaining": 1})
+        # Their booked sets (and the ETags built on them) move on.
+        self.assertNotEqual(booked_version(self.users[0].pk), version)
+
+        self.assertEqual(expire_stale_drafts(), {"swept": 1, "batches": 1, "remaining": 0})
+        self.assertFalse(TourBooking.objects.filter(pk__in=[b.pk for b in stale]).exists())
+        self.assertEqual(
+            set(TourBooking.objects.values_list("pk", flat=True)), {fresh.pk, pending.pk}
+        )
+
+        stats = TourStats.objects.filter(tour=self.tour).values().get()
+        self.assertEqual(
+            (stats["pending_seats"], stats["seats_remaining"]),
+            (stats_before["pending_seats"], stats_before["seats_remaining"]),
+        )
+
+    def test_swept_user_can_join_again(self):
+        self.booking(self.users[0])
+        drafts.expire_stale_drafts()
+
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(reverse('join-tour', kwargs={'slug': self.tour.slug}), {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(TourBooking.objects.get(pk=response.data["booking_id"]).status, "draft")
+
+
+class TourWaitlistTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("waitlist-tour", capacity=2)
+        self.users = [
+            User.objects.create_user(email=f'wait{i}@example.com', username=f'wait{i}', password='pw')
+            for i in range(5)
+        ]
+        self.paid = [
+            TourBooking.objects.create(tour=self.tour, user=user, status="paid")
+            for user in self.users[:2]
+        ]
+        self.url = reverse('tour-waitlist', kwargs={'slug': self.tour.slug})
+
+    def join(self, user, seats=1):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {"seats": seats})
+
+    def entry(self, user):
+        return TourWaitlistEntry.objects.get(tour=self.tour, user=user)
+
+    def stats(self):
+        return TourStats.objects.get(tour=self.tour)
+
+    def cancel(self, booking):
+        booking.status = "cancelled"
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+
+    def test_freed_seats_are_offered_in_order(self):
+        for user in self.users[2:]:
+            self.assertEqual(self.join(user).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.join(self.users[3]).data["position"], 2)
+
+        self.cancel(self.paid[0])
+        self.assertEqual(self.entry(self.users[2]).status, "offered")
+        self.assertEqual(self.entry(self.users[3]).status, "waiting")
+        self.assertEqual((self.stats().held_seats, self.stats().seats_remaining), (1, 0))
+
+        # Nobody else can take the held seat.
+        self.assertEqual(self.join(self.users[3]).data["position"], 1)
+        with self.assertRaises(SeatsUnavailable):
+            reserve_seats(TourBooking.objects.create(tour=self.tour, user=self.users[4]), "pending")
+
+        self.client.force_authenticate(user=self.users[2])
+        accept = reverse('waitlist-accept', kwargs={'slug': self.tour.slug})
+        response = self.client.post(accept, {"accepted_terms": True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertEqual(
+            (self.stats().held_seats, self.stats().pending_seats, self.stats().seats_remaining),
+            (0, 1, 0),
+        )
+        self.assertEqual(self.client.post(accept, {"accepted_terms": True}).status_code, 400)
+
+        before = TourStats.objects.filter(tour=self.tour).values("held_seats", "seats_remaining").get()
+        call_command("rebuild_tour_stats", stdout=StringIO())
+        self.assertEqual(
+            TourStats.objects.filter(tour=self.tour).values("held_seats", "seats_remaining").get(),
+            before,
+        )
+
+    def test_lapsed_offer_moves_to_the_next_user(self):
+        self.join(self.users[2])
+        self.join(self.users[3])
+        self.cancel(self.paid[0])
+
+        later = timezone.now() + timedelta(seconds=settings.WAITLIST_OFFER_TTL + 1)
+        self.assertEqual(waitlist.tours_to_promote(now=later), {self.tour.pk})
+        offered = waitlist.promote(self.tour.pk, now=later)
+        self.assertEqual([entry.user_id for entry in offered], [self.users[3].pk])
+        self.assertEqual(self.entry(self.users[2]).status, "expired")
+        self.assertEqual(self.stats().held_seats, 1)
+
+        with self.assertRaises(BookingStateConflict):
+            waitlist.accept(self.entry(self.users[2]))
+
+        # Leaving gives the offer back; with nobody waiting the seat is free.
+        self.client.force_authenticate(user=self.users[3])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual((self.stats().held_seats, self.stats().seats_remaining), (0, 1))
+
+    def test_only_the_release_schedules_a_promotion(self):
+        booking = self.paid[0]
+        with patch("app.tours.signals.promote_waitlist") as promote:
+            self.cancel(booking)
+            self.assertEqual(promote.delay.call_count, 1)
+
+            # Saving the cancelled booking again, or refunding it, frees no
+            # more seats.
+            self.cancel(booking)
+            booking.status = "refunded"
+            with self.captureOnCommitCallbacks(execute=True):
+                booking.save()
+            reloaded = TourBooking.objects.get(pk=booking.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                reloaded.save()
+            self.assertEqual(promote.delay.call_count, 1)
+
+    def test_held_seats_are_not_shown_as_free(self):
+        self.join(self.users[2])
+        self.cancel(self.paid[0])
+        self.assertEqual(self.entry(self.users[2]).status, "offered")
+
+        cache.clear()
+        detail = self.client.get(reverse('tour-detail', kwargs={'slug': self.tour.slug})).data
+        listed = next(
+            item for item in self.client.get(reverse('tour-list')).data["results"]
+            if item["slug"] == self.tour.slug
+        )
+        for payload in (detail, listed):
+            self.assertEqual((payload["spots_remaining"], payload["progress_percent"]), (0, 100))
+
+    def test_booking_normally_closes_the_waitlist_entry(self):
+        self.join(self.users[2])
+        self.join(self.users[3])
+        # Seats free up before the promoter has run.
+        for booking in self.paid:
+            booking.status = "cancelled"
+            booking.save()
+
+        # The first in line books one of them directly instead.
+        draft = TourBooking.objects.create(tour=self.tour, user=self.users[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_seats(draft, "pending")
+        self.assertEqual(self.entry(self.users[2]).status, "left")
+
+        # Leaving queued the promoter; the other free seat goes to the next user.
+        self.assertEqual(self.entry(self.users[3]).status, "offered")
+        self.assertEqual((self.stats().held_seats, self.stats().seats_remaining), (1, 0))
+
+    def test_first_in_line_is_not_skipped(self):
+        self.join(self.users[2], seats=2)
+        self.join(self.users[3])
+        self.cancel(self.paid[0])
+        self.assertEqual(self.entry(self.users[2]).status, "waiting")
+        self.assertEqual(self.entry(self.users[3]).status, "waiting")
+        self.assertEqual(self.stats().seats_remaining, 1)
+
+    def test_position_reads_no_waitlist_rows(self):
+        for user in self.users[2:]:
+            self.join(user)
+        self.client.force_authenticate(user=self.users[4])
+        self.assertEqual(self.client.get(self.url).data["position"], 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).data["position"], 3)
+        waitlist_queries = [q["sql"] for q in queries if "tourwaitlistentry" in q["sql"]]
+        # Only the user's own entry; the position comes from the cache.
+        self.assertEqual(len(waitlist_queries), 1)
+        self.assertNotIn("COUNT", waitlist_queries[0])
+
+    def test_join_rules(self):
+        self.assertEqual(self.join(self.users[2], seats=3).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.join(self.users[0]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.cancel(self.paid[0])
+        self.assertEqual(self.join(self.users[2]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.users[3])
+        response = self.client.post(reverse('join-tour', kwargs={'slug': self.tour.slug}), {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TourCancellationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tour = seat_tour("cancel-tour", capacity=2)
+        self.user = User.objects.create_user(email='cancel@example.com', username='cancel', password='pw')
+        self.other = User.objects.create_user(email='cancel2@example.com', username='cancel2', password='pw')
+        self.booking = TourBooking.objects.create(
+            tour=self.tour, user=self.user, status="pending", booking_reference="SUN-1"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def cancel(self, booking=None):
+        url = reverse('cancel-booking', kwargs={'booking_id': (booking or self.booking).pk})
+        return self.client.post(url)
+
+    def test_cancel_releases_seats_in_the_same_transaction(self):
+        version = booked_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.cancel()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["status"], "cancelled")
+            self.assertFalse(response.data["refund_due"])
+
+            stats = TourStats.objects.get(tour=self.tour)
+            self.assertEqual((stats.pending_seats, stats.seats_remaining), (0, 2))
+            # Nothing slow ran inside the transaction.
+            self.assertEqual(len(mail.outbox), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(booked_version(self.user.pk), version)
+        self.assertEqual([m.to for m in mail.outbox], [[self.user.email]])
+
+        self.assertEqual(self.cancel().status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BOOKING_REFUNDS_EMAIL="refunds@example.com")
+    def test_paid_cancel_queues_refund_notice(self):
+        self.booking.status = "paid"
+        self.booking.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.cancel()
+        self.assertTrue(response.data["refund_due"])
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            ["cancel@example.com", "refunds@example.com"],
+        )
+        customer = next(m for m in mail.outbox if m.to == ["cancel@example.com"])
+        self.assertIn("will be refunded", customer.body)
+
+    def test_freed_seat_goes_to_the_waitlist(self):
+        TourBooking.objects.create(tour=self.tour, user=self.other, status="paid")
+        waiter = User.objects.create_user(email='cancel3@example.com', username='cancel3', password='pw')
+        waitlist.join(self.tour, waiter, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cancel()
+        entry = TourWaitlistEntry.objects.get(tour=self.tour, user=waiter)
+        self.assertEqual(entry.status, "offered")
+
+    def test_cancel_rules(self):
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.cancel().status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.user)
+        draft = TourBooking.objects.create(tour=seat_tour("cancel-draft", capacity=1), user=self.user)
+        self.assertEqual(self.cancel(draft).status_code, status.HTTP_400_BAD_REQUEST)
+
+        Tour.objects.filter(pk=self.tour.pk).update(start_datetime=timezone.now())
+        self.assertEqual(self.cancel().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(TourBooking.objects.get(pk=self.booking.pk).status, "pending")
+
+
+class TourBulkBookingActionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tours = [seat_tour(f"bulk-tour-{i}", capacity=3) for i in range(2)]
+        self.users = [
+            User.objects.create_user(email=f'bulk{i}@example.com', username=f'bulk{i}', password='pw')
+            for i in range(3)
+        ]
+        self.bookings = [
+            TourBooking.objects.create(tour=tour, user=user, status="pending", booking_reference=f"B-{i}{j}")
+            for i, tour in enumerate(self.tours)
+            for j, user in enumerate(self.users)
+        ]
+
+    def stats(self, tour):
+        return TourStats.objects.get(tour=tour)
+
+    def test_approve_is_one_update_with_one_notification_job(self):
+        self.bookings[0].status = "cancelled"
+        self.bookings[0].save()
+        versions = [booked_version(user.pk) for user in self.users]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                moved = bulk.bulk_transition(TourBooking.objects.all(), "paid")
+        self.assertEqual(moved, 5)
+
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "tours_tourbooking"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(TourBooking.objects.filter(status="paid", paid_at__isnull=False).count(), 5)
+        self.assertEqual(TourBooking.objects.get(pk=self.bookings[0].pk).status, "cancelled")
+
+        self.assertEqual(
+            [(self.stats(t).confirmed_seats, self.stats(t).pending_seats) for t in self.tours],
+            [(2, 0), (3, 0)],
+        )
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(
+            booked_version(user.pk) != version for user, version in zip(self.users, versions)
+        ))
+
+    def test_cancel_frees_seats_for_the_waitlist_and_refund_needs_payment(self):
+        bulk.bulk_transition(TourBooking.objects.filter(pk=self.bookings[0].pk), "paid")
+        waiter = User.objects.create_user(email='bulkwait@example.com', username='bulkwait', password='pw')
+        waitlist.join(self.tours[0], waiter, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = bulk.bulk_transition(TourBooking.objects.filter(tour=self.tours[0]), "cancelled")
+        self.assertEqual(moved, 3)
+        self.assertEqual(self.stats(self.tours[0]).seats_remaining, 1)
+        self.assertEqual(self.stats(self.tours[0]).held_seats, 2)
+        self.assertEqual(TourWaitlistEntry.objects.get(user=waiter).status, "offered")
+
+        # Only the booking that was paid is refunded.
+        self.assertEqual(bulk.bulk_transition(TourBooking.objects.all(), "refunded"), 1)
+        self.assertEqual(TourBooking.objects.get(pk=self.bookings[0].pk).status, "refunded")
+
+    @override_settings(BOOKING_REFUNDS_EMAIL="refunds@example.com")
+    def test_cancelling_paid_bookings_queues_one_refund_notice(self):
+        paid = TourBooking.objects.filter(pk__in=[self.bookings[0].pk, self.bookings[4].pk])
+        bulk.bulk_transition(paid, "paid")
+        mail.outbox.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(bulk.bulk_transition(TourBooking.objects.all(), "cancelled"), 6)
+
+        notices = [m for m in mail.outbox if m.to == ["refunds@example.com"]]
+        self.assertEqual(len(notices), 1)
+        self.assertIn("B-00", notices[0].body)
+        self.assertIn("B-11", notices[0].body)
+        self.assertNotIn("B-01", notices[0].body)
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_refund_paid_booking_without_paid_at(self):
+        booking = self.bookings[3]
+        TourBooking.objects.filter(pk=booking.pk).update(status="paid", paid_at=None)
+        # Cancelled without ever being paid: nothing to refund.
+        TourBooking.objects.filter(pk=self.bookings[4].pk).update(status="cancelled")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = bulk.bulk_transition(TourBooking.objects.filter(tour=self.tours[1]), "refunded")
+        self.assertEqual(moved, 1)
+        self.assertEqual(TourBooking.objects.get(pk=booking.pk).status, "refunded")
+        self.assertEqual(TourBooking.objects.get(pk=self.bookings[4].pk).status, "cancelled")
+
+    def test_moving_to_paid_stamps_paid_at(self):
+        booking = reserve_seats(self.bookings[0], "paid")
+        self.assertIsNotNone(booking.paid_at)
+
+    def test_admin_action(self):
+        admin_user = User.objects.create_superuser(
+            email='bulkadmin@example.com', username='bulkadmin', password='pw'
+        )
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('admin:tours_tourbooking_changelist'),
+                {"action": "approve_bookings", "_selected_action": [b.pk for b in self.bookings[:3]]},
+            )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(TourBooking.objects.filter(status="paid").count(), 3)
+        self.assertEqual(self.stats(self.tours[0]).confirmed_seats, 3)
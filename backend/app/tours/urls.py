@@ -1,18 +1,36 @@
 from django.urls import path
 from .views import (
     TourListView,
+    TourSearchView,
+    TourTextSearchView,
     TourDetailView,
+    TourLocationsView,
+    TourFeedView,
+    WaitingRoomJoinView,
+    WaitingRoomStatusView,
     JoinTourView,
     ConfirmBookingInfoView,
+    CancelBookingView,
+    TourWaitlistView,
+    AcceptWaitlistOfferView,
     UpcomingToursView,
     PastToursView,
 )
 
 urlpatterns = [
     path("list/", TourListView.as_view(), name="tour-list"),
+    path("search/", TourSearchView.as_view(), name="tour-search"),
+    path("search/text/", TourTextSearchView.as_view(), name="tour-text-search"),
+    path("locations/", TourLocationsView.as_view(), name="tour-locations"),
+    path("feed/", TourFeedView.as_view(), name="tour-feed"),
     path("detail/<slug:slug>/", TourDetailView.as_view(), name="tour-detail"),
+    path("queue/join/<slug:slug>/", WaitingRoomJoinView.as_view(), name="waiting-room-join"),
+    path("queue/status/", WaitingRoomStatusView.as_view(), name="waiting-room-status"),
     path("join/<slug:slug>/", JoinTourView.as_view(), name="join-tour"),
     path("confirm/<uuid:booking_id>/", ConfirmBookingInfoView.as_view(), name="confirm-booking"),
+    path("cancel/<uuid:booking_id>/", CancelBookingView.as_view(), name="cancel-booking"),
+    path("waitlist/<slug:slug>/", TourWaitlistView.as_view(), name="tour-waitlist"),
+    path("waitlist/<slug:slug>/accept/", AcceptWaitlistOfferView.as_view(), name="waitlist-accept"),
     path("upcoming/", UpcomingToursView.as_view(), name="Upcoming Tour"),
     path("past/", PastToursView.as_view(), name="Past Tour"),
 ]
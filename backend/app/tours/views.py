@@ -1,93 +1,383 @@
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 
-from django.db.models import Count, Sum, Avg, Exists, OuterRef, Value, Subquery, IntegerField
+from django.core import signing
+from django.db.models import Avg, Count, F, OuterRef, Prefetch, Subquery
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-
-from .models import Tour, TourBooking
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .models import Tour, TourBooking, TourDay, TourImage, TourWaitlistEntry, TransportReview, StayReview
+from .pagination import TourKeysetPagination
+from .services import waiting_room, waitlist
+from .services.booked import BOOKED_STATUSES
+from .services.cache import (
+    detail_versions,
+    get_cached_detail,
+    get_cached_list_page,
+    set_cached_detail,
+    set_cached_list_page,
+)
+from .services.cancellation import TourAlreadyStarted, cancel_booking
+from .services.conditional import (
+    get_booked_tours,
+    get_live_tour,
+    get_reference_data,
+    shared_list_key,
+    tour_detail_etag,
+    tour_detail_last_modified,
+    tour_list_etag,
+    tour_locations_etag,
+)
+from .services.feed import feed_payload
+from .services.fieldsets import field_selection, stats_annotations_for, wants
+from .services.flash import hold_seats
+from .services.listing import list_values, serialize_tour_rows
+from .services.reservations import (
+    REJECTED_STATUS,
+    BookingStateConflict,
+    SeatsUnavailable,
+    reserve_seats,
+    seats_available,
+)
+from .services.search import filter_tours, search_tours, tour_facets
+from .services.stats import PENDING_STATUS
 from .serializers import (
     TourListSerializer,
     TourDetailSerializer,
+    TourLiveSerializer,
+    TourSearchParamsSerializer,
     JoinTourSerializer,
     MyTourSerializer,
+    TourWaitlistSerializer,
+    WaitlistJoinSerializer,
 )
 
 import uuid
 
-class TourListView(generics.ListAPIView):
+
+class FieldSelectionMixin:
+    """
+    The `?fields=` / `?expand=` selection for this request, validated
+    against the serializer (services.fieldsets).
+    """
+
+    def get_fields(self):
+        if not hasattr(self, "_fields"):
+            self._fields = field_selection(self.request, self.get_serializer_class())
+        return self._fields
+
+
+@method_decorator(
+    condition(etag_func=tour_list_etag),
+    name="get",
+)
+class TourListView(FieldSelectionMixin, generics.ListAPIView):
+    """
+    Active tours, cursor-paginated. `?sort=` picks one of
+    TourKeysetPagination.sorts; ordering is applied by the paginator.
+    `?fields=` limits the fields of each tour (services.fieldsets).
+    """
     permission_classes = [permissions.AllowAny]
     serializer_class = TourListSerializer
+    pagination_class = TourKeysetPagination
+    gallery_query_param = "images"
+    max_gallery_preview_size = 10
+
+    def get_gallery_preview_size(self):
+        """
+        Gallery images per tour (`?images=`), capped at
+        max_gallery_preview_size; defaults to the serializer's preview size.
+        """
+        default = TourListSerializer.gallery_preview_size
+        try:
+            size = int(self.request.query_params.get(self.gallery_query_param, default))
+        except ValueError:
+            return default
+        return min(max(size, 0), self.max_gallery_preview_size)
 
     def get_queryset(self):
+        # Location names come from the reference snapshot, not joins.
+        fields = self.get_fields()
         qs = (
             Tour.objects
             .filter(is_active=True)
-            .select_related(
-                "division",
-                "district",
-                "upazila",
-            )
-            .annotate(
-                joined_count=Sum("bookings__seats"),
-                rating_avg=Avg("reviews__rating"),
-                rating_count=Count("reviews"),
-            )
-            .order_by("-created_at")
+            .annotate(**stats_annotations_for(fields))
         )
 
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_booked=Exists(
-                    TourBooking.objects.filter(
-                        tour=OuterRef("pk"),
-                        user=self.request.user,
-                        status__in=("pending", "paid"),
-                    )
+        if self.paginator.get_sort(self.request) == "almost_full":
+            # Full tours are not "almost" full.
+            qs = qs.filter(stats__seats_remaining__gt=0)
+
+        return qs
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["booked_tour_ids"] = get_booked_tours(self.request)[0]
+        context["gallery_preview_size"] = self.get_gallery_preview_size()
+        context["fields"] = self.get_fields()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """
+        Pages are cached once for all users; the requesting user's booked
+        set is overlaid on every response.
+        """
+        key = shared_list_key(request)
+        payload = get_cached_list_page(key)
+        if payload is None:
+            payload = self.get_page_payload()
+            set_cached_list_page(key, payload)
+
+        if "is_booked" in self.get_fields():
+            booked = {str(pk) for pk in get_booked_tours(request)[0]}
+            for item in payload["results"]:
+                item["is_booked"] = item["id"] in booked
+        return Response(payload)
+
+    def get_page_payload(self):
+        """
+        The paginated page as TourListSerializer renders it, built from
+        values() rows by services.listing.
+        """
+        # Gallery previews are fetched per page by services.listing.
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(queryset.values(*list_values(self.get_fields())))
+        data = serialize_tour_rows(rows, self.get_serializer_context())
+        return self.get_paginated_response(data).data
+
+
+class TourSearchView(TourListView):
+    """
+    Tour list filtered by location, price, start window, duration, transport
+    and stay (see TourSearchParamsSerializer). The first page also carries
+    facet counts for every filter value.
+    """
+
+    def get_search_params(self):
+        if not hasattr(self, "_search_params"):
+            params = TourSearchParamsSerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            self._search_params = params.validated_data
+        return self._search_params
+
+    def get_queryset(self):
+        return filter_tours(super().get_queryset(), self.get_search_params())
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            response.data["facets"] = tour_facets(
+                Tour.objects.filter(is_active=True),
+                self.get_search_params(),
+            )
+        return response
+
+
+class TourTextSearchView(TourListView):
+    """
+    Ranked full-text search over tours and their itineraries (`?q=`), with
+    a trigram fallback on the title. Returns the best `limit` matches.
+    """
+    default_limit = 20
+    max_limit = 50
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def get_queryset(self):
+        # Matches are rendered by TourListSerializer from model instances.
+        qs = super().get_queryset()
+        preview_size = self.get_gallery_preview_size()
+        if preview_size and wants(self.get_fields(), "images", "image_variants"):
+            # A sliced prefetch is one query for the whole page, numbering
+            # each tour's images with ROW_NUMBER() OVER (PARTITION BY tour).
+            qs = qs.prefetch_related(
+                Prefetch(
+                    "images",
+                    queryset=TourImage.objects.all()[:preview_size],
+                    to_attr="gallery_preview",
                 )
             )
-        
         return qs
 
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This field is required."})
+
+        tours, mode = search_tours(self.get_queryset(), text, self.get_limit())
+        serializer = self.get_serializer(tours, many=True)
+        return Response({
+            "mode": mode,
+            "results": serializer.data,
+        })
+
 
-class TourDetailView(generics.RetrieveAPIView):
+@method_decorator(
+    condition(etag_func=tour_detail_etag, last_modified_func=tour_detail_last_modified),
+    name="get",
+)
+class TourDetailView(FieldSelectionMixin, generics.RetrieveAPIView):
+    """
+    One active tour. `?fields=` limits the payload and `?expand=tour_plan,
+    tour_lead` adds the nested blocks (services.fieldsets).
+    """
     permission_classes = [permissions.AllowAny]
     serializer_class = TourDetailSerializer
     lookup_field = "slug"
 
     def get_queryset(self):
-        qs = (
-            Tour.objects
-            .filter(is_active=True)
-            .select_related(
-                "tour_lead__user",
-                "division",
-                "district",
-                "upazila",
+        # Fixed query plan regardless of itinerary size: one main query plus
+        # one prefetch each for images, days, activities and inclusions.
+        # Only what the selected fields read is joined or prefetched.
+        fields = self.get_fields()
+        qs = Tour.objects.filter(is_active=True)
+        annotations = stats_annotations_for(fields)
+
+        if wants(fields, "images", "image_variants"):
+            qs = qs.prefetch_related("images")
+        if "tour_plan" in fields:
+            qs = qs.prefetch_related(
+                Prefetch(
+                    "days",
+                    queryset=TourDay.objects.prefetch_related("activities"),
+                )
             )
-            .annotate(
-                joined_count=Sum("bookings__seats"),
-                rating_avg=Avg("reviews__rating"),
-                rating_count=Count("reviews", distinct=True),
-                transport_rating=Avg("transport__reviews__rating"),
-                stay_rating=Avg("stay__reviews__rating"),
+        if wants(fields, "included", "not_included"):
+            qs = qs.prefetch_related("inclusions")
+
+        if "transport" in fields:
+            annotations["transport_rating"] = Subquery(
+                TransportReview.objects
+                .filter(transport=OuterRef("transport"))
+                .values("transport")
+                .annotate(avg=Avg("rating"))
+                .values("avg")
             )
+        if "stay" in fields:
+            annotations["stay_rating"] = Subquery(
+                StayReview.objects
+                .filter(stay=OuterRef("stay"))
+                .values("stay")
+                .annotate(avg=Avg("rating"))
+                .values("avg")
+            )
+        if "tour_lead" in fields:
+            qs = qs.select_related("tour_lead__user__profile")
+            annotations["tour_lead_tours_completed"] = Subquery(
+                Tour.objects
+                .filter(tour_lead=OuterRef("tour_lead"))
+                .values("tour_lead")
+                .annotate(count=Count("pk"))
+                .values("count")
+            )
+
+        return qs.annotate(**annotations)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["booked_tour_ids"] = get_booked_tours(self.request)[0]
+        context["fields"] = self.get_fields()
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the shared part of the payload from the versioned cache and
+        overlay the live counters and the user's is_booked.
+        """
+        slug = self.kwargs[self.lookup_field]
+        versions = detail_versions(slug)
+        fields = self.get_fields()
+
+        payload = get_cached_detail(slug, versions, fields)
+        live = None
+        if payload is not None:
+            # Usually already loaded by the conditional GET validators.
+            live = get_live_tour(request, slug)
+            if live is not None and str(live.pk) != payload["id"]:
+                live = None
+
+        if live is None:
+            # Cache miss, or the cached tour is gone: take the full path,
+            # which also produces the 404.
+            instance = self.get_object()
+            data = self.get_serializer(instance).data
+            set_cached_detail(slug, versions, fields, dict(data))
+            return Response(data)
+
+        payload.update(
+            TourLiveSerializer(live, context=self.get_serializer_context()).data
         )
+        return Response(payload)
 
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_booked=Exists(
-                    TourBooking.objects.filter(
-                        tour=OuterRef("pk"),
-                        user=self.request.user,
-                        status__in=("pending", "paid"),
-                    )
-                )
-            )
 
-        return qs
+@method_decorator(condition(etag_func=tour_locations_etag), name="get")
+class TourLocationsView(APIView):
+    """
+    Active divisions > districts > upazilas, transports and stays, for the
+    app's filter pickers. Served from the reference snapshot.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(get_reference_data(request).tree)
+
+
+class TourFeedView(APIView):
+    """
+    The app's home screen: ranked sections (starting soon, almost full, top
+    rated, new, closing soon) of tour list items, in one response. Rankings
+    are precomputed by the build_tour_feed task (services.feed).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(feed_payload(get_booked_tours(request)[0]))
+
+
+class WaitingRoomJoinView(APIView):
+    """
+    A place in the tour's waiting room: a queue token to poll at
+    waiting-room-status, and the admission pass once it is admitted.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, slug):
+        tour = get_object_or_404(Tour, slug=slug, is_active=True)
+        if not tour.waiting_room:
+            return Response({"detail": "This tour has no waiting room"}, status=400)
+        return Response(waiting_room.join(tour.pk, request.user.pk))
+
+
+class WaitingRoomStatusView(APIView):
+    """
+    Polled by everyone in a waiting room, so it reads only the cache: the
+    signed token is the credential and no user row is loaded.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            return Response(waiting_room.poll(request.query_params.get("token", "")))
+        except signing.BadSignature:
+            return Response({"detail": "Invalid queue token"}, status=400)
+
+
+def waiting_room_closed():
+    return Response(
+        {"detail": "Join the waiting room first", "waiting_room": True},
+        status=403
+    )
 
 
 class JoinTourView(APIView):
@@ -125,6 +415,9 @@ class JoinTourView(APIView):
         tour = get_object_or_404(Tour, slug=slug, is_active=True)
         user = request.user
 
+        if tour.waiting_room and not waiting_room.is_admitted(request, tour):
+            return waiting_room_closed()
+
         if tour.booking_deadline < timezone.now():
             return Response({"detail": "Booking closed"}, status=400)
 
@@ -155,6 +448,14 @@ class JoinTourView(APIView):
             profile.profile_updated_at = timezone.now()
             profile.save()
 
+        # Early answer only; seats are taken when the booking is confirmed.
+        # Checked before any draft is created, so a full tour leaves none.
+        booking = TourBooking.objects.filter(tour=tour, user=user).first()
+        if booking is None or booking.status not in BOOKED_STATUSES:
+            seats = booking.seats if booking else 1
+            if seats_available(tour.pk) < seats:
+                return Response({"detail": "Tour is full", "waitlist": True}, status=409)
+
         # Get or create a draft booking — if one already exists (user went back),
         # reuse it rather than creating a duplicate.
         booking, created = TourBooking.objects.get_or_create(
@@ -163,8 +464,8 @@ class JoinTourView(APIView):
             defaults={"status": "draft"}
         )
 
-        # If the booking exists but was cancelled/refunded, reset it to draft
-        if not created and booking.status in ("cancelled", "refunded"):
+        # If the booking exists but was cancelled/refunded/rejected, reset it to draft
+        if not created and booking.status in ("cancelled", "refunded", REJECTED_STATUS):
             booking.status = "draft"
             booking.booking_reference = None
             booking.accepted_terms_at = None
@@ -221,6 +522,9 @@ class ConfirmBookingInfoView(APIView):
             user=request.user
         )
 
+        if booking.tour.waiting_room and not waiting_room.is_admitted(request, booking.tour):
+            return waiting_room_closed()
+
         if booking.status != "draft":
             return Response(
                 {"detail": "Booking already submitted"},
@@ -234,16 +538,162 @@ class ConfirmBookingInfoView(APIView):
             )
 
         # Generate booking reference ONCE
-        if not booking.booking_reference:
-            booking.booking_reference = booking.generate_reference()
-
-        booking.status = "pending"
-        booking.accepted_terms_at = timezone.now()
-        booking.confirmed_at = timezone.now()
-        booking.save()
+        reference = booking.booking_reference or booking.generate_reference()
 
+        now = timezone.now()
         tour = booking.tour
+        try:
+            if tour.flash_sale:
+                # The seats are taken now; the booking turns pending when
+                # reconcile_flash_sales writes the hold.
+                hold_seats(booking, reference, now)
+            else:
+                reserve_seats(
+                    booking,
+                    PENDING_STATUS,
+                    from_statuses=("draft",),
+                    booking_reference=reference,
+                    accepted_terms_at=now,
+                    confirmed_at=now,
+                )
+        except BookingStateConflict:
+            return Response(
+                {"detail": "Booking already submitted"},
+                status=400
+            )
+        except SeatsUnavailable as exc:
+            return Response(
+                {
+                    "detail": "Not enough seats left on this tour",
+                    "seats_remaining": exc.seats_remaining,
+                },
+                status=409
+            )
+
+        return Response({
+            "booking_reference": reference,
+            "status": PENDING_STATUS,
+            "tour": {
+                "title": tour.title,
+                "location": tour.division.name,
+                "duration_text": tour.duration_text,
+            },
+            "message": "Booking request submitted"
+        })
+
+
+class CancelBookingView(APIView):
+    """
+    Cancel the user's pending or paid booking before the tour starts. The
+    seats go back to the tour at once; the emails, and the refund notice
+    for a paid booking, are sent in the background.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, booking_id):
+        booking = get_object_or_404(
+            TourBooking.objects.select_related("tour"),
+            id=booking_id,
+            user=request.user
+        )
+
+        try:
+            booking, refund_due = cancel_booking(booking)
+        except TourAlreadyStarted:
+            return Response({"detail": "Tour has already started"}, status=400)
+        except BookingStateConflict:
+            return Response({"detail": "Booking cannot be cancelled"}, status=400)
+
+        return Response({
+            "booking_reference": booking.booking_reference,
+            "status": booking.status,
+            "refund_due": refund_due,
+            "message": "Booking cancelled"
+        })
+
+
+class TourWaitlistView(APIView):
+    """
+    The user's place on a full tour's waitlist: GET to poll it, POST to
+    join, DELETE to leave. Offers are accepted at waitlist-accept.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_entry(self, slug):
+        return get_object_or_404(
+            TourWaitlistEntry, tour__slug=slug, user=self.request.user
+        )
+
+    def get(self, request, slug):
+        return Response(TourWaitlistSerializer(self.get_entry(slug)).data)
+
+    def post(self, request, slug):
+        tour = get_object_or_404(Tour, slug=slug, is_active=True)
 
+        if tour.booking_deadline < timezone.now():
+            return Response({"detail": "Booking closed"}, status=400)
+
+        serializer = WaitlistJoinSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        seats = serializer.validated_data["seats"]
+
+        if seats > tour.max_capacity:
+            return Response(
+                {"detail": f"This tour takes at most {tour.max_capacity} seat(s)"},
+                status=400
+            )
+        if seats_available(tour.pk) >= seats:
+            return Response(
+                {"detail": "Seats are available, book the tour instead"},
+                status=400
+            )
+
+        try:
+            entry = waitlist.join(tour, request.user, seats)
+        except BookingStateConflict:
+            return Response(
+                {"detail": "You already have seats or an offer on this tour"},
+                status=400
+            )
+        return Response(TourWaitlistSerializer(entry).data, status=201)
+
+    def delete(self, request, slug):
+        entry = self.get_entry(slug)
+        if entry.status in waitlist.OPEN_ENTRY_STATUSES:
+            waitlist.leave(entry)
+        return Response(status=204)
+
+
+class AcceptWaitlistOfferView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, slug):
+        entry = get_object_or_404(
+            TourWaitlistEntry.objects.select_related("tour", "tour__division"),
+            tour__slug=slug,
+            user=request.user,
+        )
+
+        if not request.data.get("accepted_terms"):
+            return Response(
+                {"detail": "You must accept terms and refund policy"},
+                status=400
+            )
+
+        try:
+            booking = waitlist.accept(entry)
+        except BookingStateConflict:
+            return Response({"detail": "No open offer on this tour"}, status=400)
+        except SeatsUnavailable as exc:
+            return Response(
+                {
+                    "detail": "Not enough seats left on this tour",
+                    "seats_remaining": exc.seats_remaining,
+                },
+                status=409
+            )
+
+        tour = entry.tour
         return Response({
             "booking_reference": booking.booking_reference,
             "status": booking.status,
@@ -261,12 +711,6 @@ class UpcomingToursView(generics.ListAPIView):
     serializer_class = MyTourSerializer
 
     def get_queryset(self):
-        tour_bookings_sum = TourBooking.objects.filter(
-            tour=OuterRef('tour')
-        ).values('tour').annotate(
-            total_seats=Sum('seats')
-        ).values('total_seats')
-
         return (
             TourBooking.objects
             .filter(
@@ -281,7 +725,9 @@ class UpcomingToursView(generics.ListAPIView):
                 "tour__upazila",
             )
             .annotate(
-                tour_joined_count=Coalesce(Subquery(tour_bookings_sum, output_field=IntegerField()), 0)
+                tour_joined_count=Coalesce(
+                    F("tour__stats__confirmed_seats") + F("tour__stats__pending_seats"), 0
+                )
             )
             .order_by("tour__start_datetime")
         )
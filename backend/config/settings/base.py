@@ -65,6 +65,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 # Local apps
@@ -88,6 +89,7 @@ INSTALLED_APPS += [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     "corsheaders.middleware.CorsMiddleware",
+    "app.common.middleware.CompressionMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -185,6 +187,16 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS":
         "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
+    # orjson-backed when installed, otherwise the stock JSON classes.
+    "DEFAULT_RENDERER_CLASSES": (
+        "app.common.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "app.common.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
 }
 
 # JWT
@@ -202,6 +214,78 @@ SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = "None"
 SESSION_COOKIE_SAMESITE = "None"
 
+# Cache. Deployments set CACHE_URL to a Redis shared by all workers so
+# invalidation is seen everywhere; without it (local runs, tests) each
+# process keeps its own in-memory cache.
+CACHE_URL = env("CACHE_URL", default="")
+CACHES = {
+    "default": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+        if CACHE_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
+# Rendered TourDetailSerializer payloads; entries are also invalidated on edit.
+TOUR_DETAIL_CACHE_TIMEOUT = env.int("TOUR_DETAIL_CACHE_TIMEOUT", default=60 * 60)
+# Shared tour list pages; their keys change with every list validator input.
+TOUR_LIST_CACHE_TIMEOUT = env.int("TOUR_LIST_CACHE_TIMEOUT", default=5 * 60)
+
+# Home feed (/tour/feed/): tours per section, and how often the
+# build_tour_feed task re-ranks them. The cached ranking outlives a few
+# missed runs.
+TOUR_FEED_SECTION_SIZE = env.int("TOUR_FEED_SECTION_SIZE", default=10)
+TOUR_FEED_REFRESH_INTERVAL = env.int("TOUR_FEED_REFRESH_INTERVAL", default=5 * 60)
+TOUR_FEED_CACHE_TIMEOUT = env.int("TOUR_FEED_CACHE_TIMEOUT", default=30 * 60)
+
+# "You may also like" on the tour detail: neighbours per tour, and how
+# often the build_similar_tours task recomputes them.
+TOUR_SIMILAR_COUNT = env.int("TOUR_SIMILAR_COUNT", default=8)
+TOUR_SIMILAR_REFRESH_INTERVAL = env.int("TOUR_SIMILAR_REFRESH_INTERVAL", default=60 * 60)
+TOUR_SIMILAR_CACHE_TIMEOUT = env.int("TOUR_SIMILAR_CACHE_TIMEOUT", default=24 * 60 * 60)
+
+# Keys the permutation behind booking references
+# (app.tours.services.references). Changing it once bookings exist can
+# repeat earlier references.
+BOOKING_REFERENCE_KEY = env("BOOKING_REFERENCE_KEY", default=SECRET_KEY)
+
+# Flash-sale seat counters (app.tours.services.flash): the Redis they live
+# in (empty: process memory, single-process only), and how often and in
+# what batches reconcile_flash_sales writes held seats to Postgres.
+FLASH_SALE_REDIS_URL = env("FLASH_SALE_REDIS_URL", default="redis://localhost:6379/2")
+FLASH_SALE_RECONCILE_INTERVAL = env.int("FLASH_SALE_RECONCILE_INTERVAL", default=5)
+FLASH_SALE_RECONCILE_BATCH_SIZE = env.int("FLASH_SALE_RECONCILE_BATCH_SIZE", default=200)
+# Redis that TourFlashSaleRedisTests may flush keys in; unset skips them.
+# Point it at a scratch database, never at FLASH_SALE_REDIS_URL.
+FLASH_SALE_TEST_REDIS_URL = env("FLASH_SALE_TEST_REDIS_URL", default="")
+
+# Stale draft bookings (app.tours.services.drafts): age at which an
+# unconfirmed draft is deleted, and how often and in what batches the
+# expire_stale_drafts task sweeps them.
+DRAFT_BOOKING_TTL = env.int("DRAFT_BOOKING_TTL", default=24 * 60 * 60)
+DRAFT_SWEEP_INTERVAL = env.int("DRAFT_SWEEP_INTERVAL", default=15 * 60)
+DRAFT_SWEEP_BATCH_SIZE = env.int("DRAFT_SWEEP_BATCH_SIZE", default=500)
+DRAFT_SWEEP_MAX_BATCHES = env.int("DRAFT_SWEEP_MAX_BATCHES", default=20)
+
+# Waitlist (app.tours.services.waitlist): how long an offer holds its
+# seats, and how often promote_waitlists expires lapsed offers.
+WAITLIST_OFFER_TTL = env.int("WAITLIST_OFFER_TTL", default=30 * 60)
+WAITLIST_PROMOTE_INTERVAL = env.int("WAITLIST_PROMOTE_INTERVAL", default=60)
+
+# Waiting room (app.tours.services.waiting_room): users admitted to join and
+# confirm per second, how often admit_waiting_rooms advances the queues,
+# and how long an admission pass stays valid.
+WAITING_ROOM_ADMIT_RATE = env.int("WAITING_ROOM_ADMIT_RATE", default=20)
+WAITING_ROOM_ADMIT_INTERVAL = env.int("WAITING_ROOM_ADMIT_INTERVAL", default=1)
+WAITING_ROOM_PASS_TTL = env.int("WAITING_ROOM_PASS_TTL", default=15 * 60)
+
+# JSON response compression (app.common.middleware.CompressionMiddleware)
+RESPONSE_COMPRESSION_MIN_SIZE = env.int("RESPONSE_COMPRESSION_MIN_SIZE", default=1024)
+RESPONSE_COMPRESSION_BROTLI_QUALITY = env.int("RESPONSE_COMPRESSION_BROTLI_QUALITY", default=5)
+
 # Celery
 CELERY_BROKER_URL = env("CELERY_BROKER_URL", default="redis://localhost:6379/0")  # override in prod .env
 CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND", default=CELERY_BROKER_URL)
@@ -209,6 +293,43 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+# Waiting-room admission ticks every second; it has its own queue and
+# worker (ecosystem.config.cjs) so slow email tasks cannot stall it.
+CELERY_TASK_ROUTES = {
+    "app.tours.tasks.admit_waiting_rooms": {"queue": "waiting-room"},
+}
+# Run by the celery-beat process in ecosystem.config.cjs (default file
+# scheduler). Flash-sale confirms stay drafts until reconcile_flash_sales
+# runs, so beat is required, not optional.
+CELERY_BEAT_SCHEDULE = {
+    "build-tour-feed": {
+        "task": "app.tours.tasks.build_tour_feed",
+        "schedule": TOUR_FEED_REFRESH_INTERVAL,
+    },
+    "build-similar-tours": {
+        "task": "app.tours.tasks.build_similar_tours",
+        "schedule": TOUR_SIMILAR_REFRESH_INTERVAL,
+    },
+    "reconcile-flash-sales": {
+        "task": "app.tours.tasks.reconcile_flash_sales",
+        "schedule": FLASH_SALE_RECONCILE_INTERVAL,
+        # A late run is superseded by the next one.
+        "options": {"expires": FLASH_SALE_RECONCILE_INTERVAL},
+    },
+    "admit-waiting-rooms": {
+        "task": "app.tours.tasks.admit_waiting_rooms",
+        "schedule": WAITING_ROOM_ADMIT_INTERVAL,
+        "options": {"expires": WAITING_ROOM_ADMIT_INTERVAL},
+    },
+    "expire-stale-drafts": {
+        "task": "app.tours.tasks.expire_stale_drafts",
+        "schedule": DRAFT_SWEEP_INTERVAL,
+    },
+    "promote-waitlists": {
+        "task": "app.tours.tasks.promote_waitlists",
+        "schedule": WAITLIST_PROMOTE_INTERVAL,
+    },
+}
 
 # Email
 EMAIL_HOST = env("EMAIL_HOST", default="smtp.hostinger.com")
@@ -217,6 +338,8 @@ EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=True)
 EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default=EMAIL_HOST_USER)
+# Where refunds due on cancelled paid bookings are reported.
+BOOKING_REFUNDS_EMAIL = env("BOOKING_REFUNDS_EMAIL", default=DEFAULT_FROM_EMAIL)
 
 # cloudinary setup
 import cloudinary
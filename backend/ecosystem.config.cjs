@@ -4,6 +4,7 @@
 //   pm2 restart ecosystem.config.cjs        # restart all
 //   pm2 stop ecosystem.config.cjs           # stop all
 //   pm2 logs celery-worker                  # tail logs
+//   pm2 logs celery-beat                    # periodic tasks
 
 const BACKEND = "/home/thatsayon/travenor/backend";
 const PYTHON = `${BACKEND}/venv/bin/python`;
@@ -21,6 +22,7 @@ module.exports = {
                 DJANGO_SETTINGS_MODULE: "config.settings.prod",
                 CELERY_BROKER_URL: "redis://127.0.0.1:6379/0",
                 CELERY_RESULT_BACKEND: "redis://127.0.0.1:6379/0",
+                CACHE_URL: "redis://127.0.0.1:6379/1",
             },
             autorestart: true,
             watch: false,
@@ -37,24 +39,51 @@ module.exports = {
                 DJANGO_SETTINGS_MODULE: "config.settings.prod",
                 CELERY_BROKER_URL: "redis://127.0.0.1:6379/0",
                 CELERY_RESULT_BACKEND: "redis://127.0.0.1:6379/0",
+                CACHE_URL: "redis://127.0.0.1:6379/1",
             },
             autorestart: true,
             watch: false,
             max_memory_restart: "300M",
         },
 
-        // ── Celery Beat (scheduled tasks – add if you need periodic tasks) ─
-        // {
-        //   name: "celery-beat",
-        //   cwd: BACKEND,
-        //   interpreter: PYTHON,
-        //   script: "-m",
-        //   args: "celery -A config beat --loglevel=info --scheduler django_celery_beat.schedulers:DatabaseScheduler",
-        //   env: {
-        //     DJANGO_SETTINGS_MODULE: "config.settings.prod",
-        //   },
-        //   autorestart: true,
-        //   watch: false,
-        // },
+        // ── Celery Worker: waiting-room admission ─────────────────────────
+        // admit_waiting_rooms runs every second; a worker of its own keeps
+        // it on time when email tasks fill the main worker.
+        {
+            name: "celery-worker-waiting-room",
+            cwd: BACKEND,
+            interpreter: PYTHON,
+            script: `${BACKEND}/venv/bin/celery`,
+            args: "-A config worker --loglevel=info --concurrency=1 -Q waiting-room -n waiting-room@%h",
+            env: {
+                DJANGO_SETTINGS_MODULE: "config.settings.prod",
+                CELERY_BROKER_URL: "redis://127.0.0.1:6379/0",
+                CELERY_RESULT_BACKEND: "redis://127.0.0.1:6379/0",
+                CACHE_URL: "redis://127.0.0.1:6379/1",
+            },
+            autorestart: true,
+            watch: false,
+            max_memory_restart: "300M",
+        },
+
+        // ── Celery Beat ────────────────────────────────────────────────────
+        // Runs CELERY_BEAT_SCHEDULE (config/settings/base.py) with the default
+        // file scheduler. Exactly one beat process, or tasks run twice.
+        {
+            name: "celery-beat",
+            cwd: BACKEND,
+            interpreter: PYTHON,
+            script: `${BACKEND}/venv/bin/celery`,
+            args: `-A config beat --loglevel=info --schedule ${BACKEND}/celerybeat-schedule`,
+            env: {
+                DJANGO_SETTINGS_MODULE: "config.settings.prod",
+                CELERY_BROKER_URL: "redis://127.0.0.1:6379/0",
+                CELERY_RESULT_BACKEND: "redis://127.0.0.1:6379/0",
+                CACHE_URL: "redis://127.0.0.1:6379/1",
+            },
+            autorestart: true,
+            watch: false,
+            instances: 1,
+        },
     ],
 };